@@ -0,0 +1,78 @@
+"""
+Benchmark the targeted result table parser against the BeautifulSoup parser
+
+Usage:
+    address_parser.py [--rounds=<n>] [<fixture>...]
+
+Options:
+    --rounds=<n>    Parses per fixture per parser [default: 200]
+"""
+
+import glob
+import os
+import time
+from bs4 import BeautifulSoup
+from docopt import docopt
+from prospector.parsers import parse_owner_records, parse_result_table
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'addresscheck*.html')
+
+# a table nested in a cell must not close the outer row
+NESTED_TABLE = ('<table class="Tableresultborder"><tr><td>A</td>'
+                '<td><table><tr><td>x</td></tr><tr><td>y</td></tr></table></td><td>B</td></tr>'
+                '<tr><td>C</td><td>D</td></tr></table>')
+NESTED_ROWS = [['A', 'xy', 'B'], ['C', 'D']]
+
+
+def parse_address_loopkup_soup(doc):
+    """
+    The original tasks.parse_address_loopkup, kept as the baseline
+    Cell text is joined by a space, as parse_result_table joins the lines of a cell
+    """
+    soup = BeautifulSoup(doc, 'html.parser')
+    data = []
+    table = soup.find('table', attrs={'class': 'Tableresultborder'})
+    rows = table.find_all('tr')
+
+    for row in rows:
+        cols = row.find_all('td')
+        cols = [ele.get_text(' ').strip() for ele in cols]
+        data.append([ele for ele in cols if cols])
+
+    return data
+
+
+def timed(func, doc, rounds):
+    started = time.perf_counter()
+    for i in range(rounds):
+        func(doc)
+    return (time.perf_counter() - started) / rounds
+
+
+def main():
+    args = docopt(__doc__)
+    rounds = int(args['--rounds'])
+    fixtures = args['<fixture>'] or sorted(glob.glob(FIXTURES))
+
+    nested = parse_result_table(NESTED_TABLE)
+    if nested != NESTED_ROWS:
+        raise AssertionError('Nested table parsed as {}, expected {}'.format(nested, NESTED_ROWS))
+
+    for path in fixtures:
+        with open(path, 'rb') as fp:
+            doc = fp.read()
+
+        same = parse_address_loopkup_soup(doc) == parse_result_table(doc)
+        soup = timed(parse_address_loopkup_soup, doc, rounds)
+        table = timed(parse_result_table, doc, rounds)
+        owners = timed(parse_owner_records, doc, rounds)
+
+        print('{} ({} bytes), same rows: {}'.format(os.path.basename(path), len(doc), same))
+        print('  beautifulsoup:      {:8.3f} ms'.format(soup * 1000))
+        print('  parse_result_table: {:8.3f} ms ({:.1f}x)'.format(table * 1000, soup / table))
+        print('  parse_owner_records: {:7.3f} ms ({:.1f}x)'.format(owners * 1000, soup / owners))
+        print('  owners: {}'.format(parse_owner_records(doc)))
+
+
+if __name__ == '__main__':
+    main()
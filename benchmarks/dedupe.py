@@ -0,0 +1,131 @@
+"""
+Time ingest with and without the fingerprint dedupe stage
+
+Generates OpenAddresses style records where a share of them repeat an
+earlier address with its street suffix and unit spelled differently, and
+loads them into a fresh address table: without dedupe, with the Bloom
+filter dedupe, and with a database lookup for every row.
+
+Usage:
+    dedupe.py [--connection=<url>] [--rows=<n>] [--duplicates=<f>] [--lookup-rows=<n>] [--output=<path>]
+              [--force]
+
+Options:
+    --connection=<url>  Database to load [default: sqlite:///benchmarks/bench.db]
+    --rows=<n>          Records to load [default: 1000000]
+    --duplicates=<f>    Share of records repeating an earlier address [default: 0.2]
+    --lookup-rows=<n>   Records loaded with a lookup per row, it is slow [default: 50000]
+    --output=<path>     Also write the results as JSON
+    --force             Drop the tables of a database that isn't a throwaway
+"""
+
+import json
+import os
+import random
+import tempfile
+import time
+from docopt import docopt
+from benchmarks.seed import STATES, STREETS, check_throwaway
+from prospector.db.manager import DBManager
+from prospector.db.models import Address
+from prospector.ingest import Checkpoint, Deduplicator, ingest_stream
+
+SUFFIXES = {'St': 'Street', 'Ave': 'Avenue', 'Rd': 'Road', 'Dr': 'Drive', 'Ln': 'Lane', 'Blvd': 'Boulevard'}
+
+
+def records(count, duplicates, rng):
+    """
+    :return: tuple: (list of records, distinct addresses)
+    """
+    found = []
+    distinct = 0
+
+    for i in range(count):
+        if found and rng.random() < duplicates:
+            record = dict(rng.choice(found))
+            name, suffix = record['street'].rsplit(' ', 1)
+            record['street'] = '{} {}'.format(name, SUFFIXES.get(suffix, suffix)).upper()
+            record['unit'] = record['unit'].replace('Apt ', '#')
+        else:
+            distinct += 1
+            record = {
+                'lon': str(rng.uniform(-124.0, -67.0)), 'lat': str(rng.uniform(25.0, 49.0)),
+                'number': str(rng.randint(1, 99999)), 'street': rng.choice(STREETS),
+                'unit': 'Apt {}'.format(rng.randint(1, 40)) if rng.random() < 0.3 else '',
+                'city': 'City{}'.format(rng.randrange(5000)), 'district': '', 'region': rng.choice(STATES),
+                'postcode': '{:05d}'.format(rng.randrange(42000)), 'id': '', 'hash': '{:016x}'.format(i)
+            }
+
+        found.append(record)
+
+    return found, distinct
+
+
+class LookupDeduplicator(object):
+    """
+    The baseline: one database lookup per row
+    """
+
+    def screen(self, mgr, rows):
+        fresh = []
+        seen = set()
+
+        for row in rows:
+            if row['fingerprint'] in seen or Address.get_existing_fingerprints([row['fingerprint']], mgr.session):
+                continue
+            seen.add(row['fingerprint'])
+            fresh.append(row)
+
+        return fresh
+
+
+def load(mgr, data, deduplicator):
+    Address.__table__.drop(mgr.engine, checkfirst=True)
+    mgr.setup()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint = Checkpoint(os.path.join(tmp, 'checkpoint.json'))
+        started = time.perf_counter()
+        inserted, skipped = ingest_stream(mgr, 'bench', lambda skip: data[skip:], checkpoint, 5000, deduplicator)
+        elapsed = time.perf_counter() - started
+
+    return inserted, elapsed
+
+
+def main():
+    args = docopt(__doc__)
+    rows = int(args['--rows'])
+    mgr = DBManager(args['--connection'])
+    check_throwaway(mgr, args['--force'])
+    data, distinct = records(rows, float(args['--duplicates']), random.Random(1))
+    lookup_rows = min(rows, int(args['--lookup-rows']))
+    results = []
+
+    for name, deduplicator, count in (('no dedupe', None, rows),
+                                      ('bloom filter', Deduplicator(rows, 0.001), rows),
+                                      ('lookup per row', LookupDeduplicator(), lookup_rows)):
+        inserted, elapsed = load(mgr, data[:count], deduplicator)
+        result = {
+            'variant': name,
+            'records': count,
+            'inserted': inserted,
+            'seconds': round(elapsed, 3),
+            'records_per_sec': round(count / elapsed),
+            'db_lookups': getattr(deduplicator, 'checked', count if deduplicator is not None else 0),
+            'filter_mb': round(deduplicator.filter.memory / 2 ** 20, 2) if hasattr(deduplicator, 'filter') else None
+        }
+        results.append(result)
+
+    for result in results:
+        print('{variant:<15} {records:>8} records  {inserted:>8} inserted  {seconds:>8.2f}s  '
+              '{records_per_sec:>7} records/s  {db_lookups:>8} db lookups  filter {filter_mb} MB'.format(**result))
+
+    print('{} distinct addresses in {} records'.format(distinct, rows))
+
+    if args['--output']:
+        with open(args['--output'], 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
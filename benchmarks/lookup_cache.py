@@ -0,0 +1,109 @@
+"""
+Compare per-process lookup caches against the two tier lookup cache
+
+Simulates worker processes, each with its own LookupCache, looking up keys
+drawn from a skewed distribution like repeated IPs and coordinates. Every
+lookup computed costs --lookup-ms. With --redis the workers share that
+Redis, without it an in-memory fakeredis server (pip install fakeredis).
+
+Usage:
+    lookup_cache.py [--workers=<n>] [--lookups=<n>] [--keys=<n>] [--lookup-ms=<ms>] [--redis=<url>]
+                    [--output=<path>]
+
+Options:
+    --workers=<n>       Worker processes simulated, one thread each [default: 8]
+    --lookups=<n>       Lookups per worker [default: 20000]
+    --keys=<n>          Distinct lookup inputs [default: 50000]
+    --lookup-ms=<ms>    Cost of a lookup computed [default: 1.0]
+    --redis=<url>       Shared Redis, cleared of prospector:lookup:* keys first
+    --output=<path>     Also write the results as JSON
+"""
+
+import json
+import random
+import threading
+import time
+from docopt import docopt
+from prospector.cache import LookupCache, RedisCache, TTLCache
+
+
+def redis_client(url):
+    if url:
+        import redis
+        client = redis.Redis.from_url(url)
+        for key in client.scan_iter('prospector:lookup:*'):
+            client.delete(key)
+        return lambda: client
+
+    import fakeredis
+    server = fakeredis.FakeServer()
+    return lambda: fakeredis.FakeRedis(server=server)
+
+
+def workload(lookups, keys, seed):
+    rng = random.Random(seed)
+    return [int(keys * rng.paretovariate(1.2)) % keys for _ in range(lookups)]
+
+
+def run(caches, workloads, lookup_ms):
+    def compute(values):
+        time.sleep(lookup_ms / 1000.0 * len(values))
+        return [None if value % 10 == 0 else {'key': value} for value in values]
+
+    def work(cache, keys):
+        for key in keys:
+            cache.get('bench', key, lambda value: compute([value])[0])
+
+    threads = [threading.Thread(target=work, args=(cache, keys)) for cache, keys in zip(caches, workloads)]
+    started = time.perf_counter()
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.perf_counter() - started
+    counts = {}
+
+    for cache in caches:
+        for name, n in cache.stats.get('bench', {}).items():
+            counts[name] = counts.get(name, 0) + n
+
+    return elapsed, counts
+
+
+def main():
+    args = docopt(__doc__)
+    workers = int(args['--workers'])
+    lookups = int(args['--lookups'])
+    keys = int(args['--keys'])
+    lookup_ms = float(args['--lookup-ms'])
+    workloads = [workload(lookups, keys, seed) for seed in range(workers)]
+    client = redis_client(args['--redis'])
+    results = []
+
+    for name, shared in (('local only', lambda: None), ('local + shared', lambda: RedisCache(client()))):
+        caches = [LookupCache(TTLCache(maxsize=keys), shared()) for _ in range(workers)]
+        elapsed, counts = run(caches, workloads, lookup_ms)
+        total = workers * lookups
+        results.append({
+            'variant': name,
+            'lookups': total,
+            'computed': counts.get('computed', 0),
+            'local_hits': counts.get('local', 0),
+            'shared_hits': counts.get('shared', 0) + counts.get('waited', 0),
+            'seconds': round(elapsed, 3),
+            'lookups_per_sec': round(total / elapsed)
+        })
+
+    for result in results:
+        print('{variant:<15} {lookups:>8} lookups  {computed:>8} computed  {local_hits:>8} local hits  '
+              '{shared_hits:>8} shared hits  {seconds:>7.2f}s  {lookups_per_sec:>8} lookups/s'.format(**result))
+
+    if args['--output']:
+        with open(args['--output'], 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Time the person to address to IP address matching job
+
+Seeds addresses, persons written from a known address with the spelling
+varied, IP addresses seen around each person's created date and as many
+unrelated IP addresses again, then runs prospector.matching and checks the
+links against the known answers.
+
+Usage:
+    matching.py [--connection=<url>] [--rows=<n>] [--block-size=<n>] [--output=<path>] [--force]
+
+Options:
+    --connection=<url>  Database to seed and match [default: sqlite:///benchmarks/bench.db]
+    --rows=<n>          Addresses to seed, half as many persons [default: 200000]
+    --block-size=<n>    Zip codes matched per batch [default: 100]
+    --output=<path>     Also write the results as JSON
+    --force             Drop the tables of a database that isn't a throwaway
+"""
+
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from docopt import docopt
+from benchmarks.seed import STATES, STREETS, check_throwaway, city_name, insert_rows
+from prospector.db.manager import DBManager
+from prospector.db.models import Address, IPAddress, MatchLink, Person
+from prospector.matching import Matcher, match_persons
+
+SUFFIXES = {'St': 'Street', 'Ave': 'Avenue', 'Rd': 'Road', 'Dr': 'Drive', 'Ln': 'Lane', 'Blvd': 'Boulevard'}
+ADDRESSES_PER_ZIP = 25
+
+
+def spelling(number, street, rng):
+    name, suffix = street.rsplit(' ', 1)
+    suffix = SUFFIXES.get(suffix, suffix) if rng.random() < 0.5 else suffix + '.'
+    line = '{} {} {}'.format(number, name, suffix)
+    return line.upper() if rng.random() < 0.3 else line
+
+
+def generate(rows, rng):
+    """
+    :return: tuple: (address rows, person rows, ipaddress rows, expected links)
+    """
+    zip_count = max(1, rows // ADDRESSES_PER_ZIP)
+    started = datetime(2019, 1, 1)
+    addresses, persons, ipaddresses, expected = [], [], [], {}
+
+    for i in range(rows):
+        zip_index = rng.randrange(zip_count)
+        addresses.append({
+            'lat': rng.uniform(25.0, 49.0), 'lon': rng.uniform(-124.0, -67.0),
+            'number': rng.randint(1, 9999), 'street': rng.choice(STREETS), 'unit': None,
+            'city': city_name(zip_index // 4), 'district': None, 'region': STATES[zip_index % len(STATES)],
+            'postcode': '{:05d}'.format(zip_index), 'unique_id': '{:016x}'.format(i), 'processed': 1
+        })
+
+    for i, address_index in enumerate(rng.sample(range(rows), rows // 2)):
+        address = addresses[address_index]
+        created = started + timedelta(seconds=rng.randrange(365 * 86400))
+        persons.append({
+            'created_date': created, 'first_name': 'First{}'.format(i), 'last_name': 'Last{}'.format(i),
+            'email': 'person{}@example.com'.format(i), 'cell_phone': '555{:07d}'.format(i),
+            'address1': spelling(address['number'], address['street'], rng),
+            'city': address['city'], 'state': address['region'], 'zip_code': address['postcode']
+        })
+        ipaddresses.append(ip_row(len(ipaddresses), created + timedelta(minutes=rng.randint(-120, 120)),
+                                  address['city'], address['region'], address['postcode']))
+        expected[i + 1] = (address_index + 1, len(ipaddresses))
+
+    for i in range(len(persons)):
+        zip_index = rng.randrange(zip_count)
+        ipaddresses.append(ip_row(len(ipaddresses), started + timedelta(seconds=rng.randrange(365 * 86400)),
+                                  city_name(zip_index // 4), STATES[zip_index % len(STATES)],
+                                  '{:05d}'.format(zip_index)))
+
+    return addresses, persons, ipaddresses, expected
+
+
+def ip_row(i, created, city, state, postal_code):
+    ip = '{}.{}.{}.{}'.format(1 + (i >> 24) % 223, (i >> 16) & 255, (i >> 8) & 255, i & 255)
+    return {
+        'created_date': created, 'ip': ip, 'ip_packed': ip, 'city': city, 'time_zone': 'America/New_York',
+        'longitude': None, 'latitude': None, 'metro_code': None, 'dma_code': None, 'area_code': None,
+        'postal_code': postal_code, 'region': state, 'region_name': state
+    }
+
+
+def main():
+    args = docopt(__doc__)
+    rows = int(args['--rows'])
+    mgr = DBManager(args['--connection'])
+    check_throwaway(mgr, args['--force'])
+    addresses, persons, ipaddresses, expected = generate(rows, random.Random(1))
+
+    for model in (MatchLink, Person, Address, IPAddress):
+        model.__table__.drop(mgr.engine, checkfirst=True)
+    mgr.setup()
+
+    started = time.perf_counter()
+    insert_rows(mgr, Address, addresses)
+    insert_rows(mgr, IPAddress, ipaddresses)
+    insert_rows(mgr, Person, persons)
+    print('Seeded {} addresses, {} persons, {} IP addresses in {:.1f}s'.format(
+        len(addresses), len(persons), len(ipaddresses), time.perf_counter() - started))
+
+    started = time.perf_counter()
+    stats = match_persons(mgr, Matcher(), int(args['--block-size']))
+    elapsed = time.perf_counter() - started
+
+    links = MatchLink.select_rows(mgr.session, columns=('person_id', 'address_id', 'ipaddress_id'))
+    address_hits = sum(1 for link in links if link.address_id == expected[link.person_id][0])
+    ip_hits = sum(1 for link in links if link.ipaddress_id == expected[link.person_id][1])
+
+    result = dict(stats)
+    result.update({
+        'rows': rows,
+        'total_s': round(elapsed, 3),
+        'persons_per_sec': round(stats['persons'] / elapsed),
+        'address_precision': round(address_hits / float(stats['addresses_linked'] or 1), 4),
+        'address_recall': round(address_hits / float(len(persons)), 4),
+        'ip_precision': round(ip_hits / float(stats['ipaddresses_linked'] or 1), 4),
+        'ip_recall': round(ip_hits / float(len(persons)), 4)
+    })
+
+    print('{} persons in {:.2f}s ({} persons/s), load {:.2f}s, match {:.2f}s, write {:.2f}s'.format(
+        stats['persons'], elapsed, result['persons_per_sec'], stats['load_s'], stats['match_s'], stats['write_s']))
+    print('{} candidates, {:.2f}s matching per million candidates'.format(
+        stats['candidates'], stats['match_s_per_million_candidates'] or 0))
+    print('address precision {address_precision} recall {address_recall}, '
+          'ip precision {ip_precision} recall {ip_recall}'.format(**result))
+
+    if args['--output']:
+        with open(args['--output'], 'w') as fp:
+            json.dump(result, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Compare the ORM and Core read paths by time and memory per 100k rows
+
+Seeds a database, then loads the same rows as ORM instances and as Core
+namedtuple rows. Memory is traced with tracemalloc: peak while loading and
+what the loaded result still holds.
+
+Usage:
+    read_path.py [--connection=<url>] [--rows=<n>] [--repeat=<n>] [--output=<path>] [--force]
+
+Options:
+    --connection=<url>  Database to seed and read [default: sqlite:///benchmarks/bench.db]
+    --rows=<n>          Rows to seed and read [default: 100000]
+    --repeat=<n>        Runs per variant, the fastest is reported [default: 3]
+    --output=<path>     Also write the results as JSON
+    --force             Drop the tables of a database that isn't a throwaway
+"""
+
+import gc
+import json
+import time
+import tracemalloc
+from docopt import docopt
+from benchmarks.seed import seed
+from prospector.db.manager import DBManager
+from prospector.db.models import Address, IPAddress, Person
+
+
+def orm_update_list(session, limit):
+    with session.begin():
+        return session.query(Address).filter(
+            Address.postcode.is_(None), Address.processed == 0
+        ).limit(limit).all()
+
+
+def core_update_list(session, limit):
+    return Address.select_rows(
+        session,
+        (Address.postcode.is_(None), Address.processed == 0),
+        columns=('id', 'city', 'region', 'postcode'),
+        limit=limit
+    )
+
+
+def cases(rows):
+    return [
+        ('IPAddress page', 'orm', lambda mgr: IPAddress.get_page(mgr.session, limit=rows)),
+        ('IPAddress page', 'core', lambda mgr: IPAddress.get_page_rows(mgr.session, limit=rows)),
+        ('Person page', 'orm', lambda mgr: Person.get_page(mgr.session, limit=rows)),
+        ('Person page', 'core', lambda mgr: Person.get_page_rows(mgr.session, limit=rows)),
+        ('Address update list', 'orm', lambda mgr: orm_update_list(mgr.session, rows)),
+        ('Address update list', 'core', lambda mgr: core_update_list(mgr.session, rows))
+    ]
+
+
+def measure(mgr, load, repeat):
+    """
+    :return: tuple: (rows loaded, best seconds, peak bytes, retained bytes)
+    """
+    best = None
+
+    for i in range(repeat):
+        mgr.DBSession.remove()
+        gc.collect()
+        started = time.perf_counter()
+        result = load(mgr)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+        del result
+
+    mgr.DBSession.remove()
+    gc.collect()
+    tracemalloc.start()
+    result = load(mgr)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return len(result), best, peak, retained
+
+
+def main():
+    args = docopt(__doc__)
+    rows = int(args['--rows'])
+    mgr = DBManager(args['--connection'])
+    seed(mgr, rows, force=args['--force'])
+    results = []
+
+    for name, path, load in cases(rows):
+        count, elapsed, peak, retained = measure(mgr, load, int(args['--repeat']))
+        per_100k = 100000.0 / count if count else 0
+        result = {
+            'query': name,
+            'path': path,
+            'rows': count,
+            'best_s': round(elapsed, 4),
+            'ms_per_100k': round(elapsed * per_100k * 1000, 1),
+            'peak_mb_per_100k': round(peak * per_100k / 2 ** 20, 2),
+            'retained_mb_per_100k': round(retained * per_100k / 2 ** 20, 2)
+        }
+        results.append(result)
+        print('{:<20} {:<5} {:>8} rows {:>9.1f} ms/100k  peak {:>8.2f} MB/100k  held {:>8.2f} MB/100k'.format(
+            name, path, count, result['ms_per_100k'], result['peak_mb_per_100k'], result['retained_mb_per_100k']
+        ))
+
+    if args['--output']:
+        with open(args['--output'], 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
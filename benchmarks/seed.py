@@ -0,0 +1,194 @@
+"""
+Seed a database with synthetic Address, ZipCode, IPAddress and Person rows
+
+Usage:
+    seed.py [--connection=<url>] [--rows=<n>] [--random-seed=<n>] [--force]
+
+Options:
+    --connection=<url>   Database to seed [default: sqlite:///benchmarks/bench.db]
+    --rows=<n>           Address, IPAddress and Person rows [default: 10000]
+    --random-seed=<n>    Seed for reproducible data [default: 1]
+    --force              Drop the tables of a database that isn't a throwaway
+"""
+
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from docopt import docopt
+from prospector.db.manager import DBManager
+from prospector.db.models import Address, IPAddress, Person, ZipCode
+
+# roughly the size of the US zip code table
+MAX_ZIPCODES = 42000
+CHUNK_SIZE = 10000
+
+STATES = ['AL', 'AZ', 'CA', 'CO', 'FL', 'GA', 'IL', 'MA', 'MI', 'NC', 'NJ', 'NY', 'OH', 'PA', 'TN', 'TX',
+          'VA', 'WA']
+STREETS = ['Main St', 'Oak Ave', 'Pine Rd', 'Maple Dr', 'Cedar Ln', 'Elm St', 'Park Blvd', 'Lake Way']
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis']
+
+
+def city_name(i):
+    return 'City{}'.format(i)
+
+
+def zipcode_rows(count, rng):
+    for i in range(count):
+        yield {
+            'country_code': 'US',
+            'postal_code': '{:05d}'.format(i),
+            'city_name': city_name(i % (count // 4 or 1)),
+            'state': STATES[i % len(STATES)],
+            'state_abbr': STATES[i % len(STATES)],
+            'county': 'County{}'.format(i % 500),
+            'county_code': str(i % 500),
+            'community': '',
+            'community_code': '',
+            'latitude': rng.uniform(25.0, 49.0),
+            'longitude': rng.uniform(-124.0, -67.0),
+            'accuracy': 4
+        }
+
+
+def address_rows(count, zip_count, rng):
+    for i in range(count):
+        city = rng.randrange(zip_count // 4 or 1)
+        # a third of the rows arrive without a city, like OpenAddresses
+        has_city = i % 3 != 0
+        yield {
+            'lon': rng.uniform(-124.0, -67.0),
+            'lat': rng.uniform(25.0, 49.0),
+            'number': rng.randint(1, 9999),
+            'street': rng.choice(STREETS),
+            'unit': None,
+            'city': city_name(city) if has_city else '',
+            'district': None,
+            'region': STATES[city % len(STATES)] if has_city else None,
+            'postcode': None,
+            'unique_id': '{:016x}'.format(i),
+            'processed': 0
+        }
+
+
+def ipaddress_rows(count, rng):
+    created = datetime(2019, 1, 1)
+    for i in range(count):
+        ip = '{}.{}.{}.{}'.format(1 + (i >> 24) % 223, (i >> 16) & 255, (i >> 8) & 255, i & 255)
+        yield {
+            'created_date': created + timedelta(seconds=i),
+            'ip': ip,
+            'ip_packed': ip,
+            'city': city_name(rng.randrange(1000)),
+            'time_zone': 'America/New_York',
+            'longitude': str(rng.uniform(-124.0, -67.0)),
+            'latitude': str(rng.uniform(25.0, 49.0)),
+            'metro_code': str(rng.randint(500, 881)),
+            'dma_code': str(rng.randint(500, 881)),
+            'area_code': str(rng.randint(201, 989)),
+            'postal_code': '{:05d}'.format(rng.randrange(MAX_ZIPCODES)),
+            'region': rng.choice(STATES),
+            'region_name': rng.choice(STATES)
+        }
+
+
+def person_rows(count, rng):
+    created = datetime(2019, 1, 1)
+    for i in range(count):
+        yield {
+            'ipaddress_id': i + 1,
+            'created_date': created + timedelta(seconds=i),
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'email': 'person{}@example.com'.format(i),
+            'cell_phone': '555{:07d}'.format(i % 10000000),
+            'address1': '{} {}'.format(rng.randint(1, 9999), rng.choice(STREETS)),
+            'city': city_name(rng.randrange(1000)),
+            'state': rng.choice(STATES),
+            'zip_code': '{:05d}'.format(rng.randrange(MAX_ZIPCODES))
+        }
+
+
+def insert_rows(mgr, model, rows):
+    """
+    Insert generated rows in CHUNK_SIZE executemany batches
+    :return: int: rows inserted
+    """
+    table = model.__table__
+    chunk = []
+    total = 0
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            with mgr.engine.begin() as conn:
+                conn.execute(table.insert(), chunk)
+            total += len(chunk)
+            chunk = []
+
+    if chunk:
+        with mgr.engine.begin() as conn:
+            conn.execute(table.insert(), chunk)
+        total += len(chunk)
+
+    return total
+
+
+def check_throwaway(mgr, force=False):
+    """
+    Refuse to drop the tables of a database that may hold real data
+    In-memory SQLite and databases or files named bench* are throwaways
+    :param mgr: DBManager
+    :param force: drop them anyway
+    :return: none
+    :raises ValueError: not a throwaway database
+    """
+    url = mgr.engine.url
+    database = url.database or ''
+
+    if force or os.path.basename(database).startswith('bench'):
+        return
+
+    if url.get_backend_name() == 'sqlite' and database in ('', ':memory:'):
+        return
+
+    raise ValueError('Refusing to drop the tables of {}, it is not a bench database, pass --force to drop '
+                     'them anyway'.format(url.render_as_string(hide_password=True)))
+
+
+def seed(mgr, rows, random_seed=1, force=False):
+    """
+    Recreate the tables and fill them with reproducible synthetic data
+    :param mgr: DBManager
+    :param rows: Address, IPAddress and Person row count
+    :param force: see check_throwaway
+    :return: dict: rows per table
+    """
+    check_throwaway(mgr, force)
+    rng = random.Random(random_seed)
+    zip_count = min(rows, MAX_ZIPCODES)
+
+    for model in (Person, Address, IPAddress, ZipCode):
+        model.__table__.drop(mgr.engine, checkfirst=True)
+    mgr.setup()
+
+    return {
+        'zipcodes': insert_rows(mgr, ZipCode, zipcode_rows(zip_count, rng)),
+        'address': insert_rows(mgr, Address, address_rows(rows, zip_count, rng)),
+        'ipaddress': insert_rows(mgr, IPAddress, ipaddress_rows(rows, rng)),
+        'persons': insert_rows(mgr, Person, person_rows(rows, rng))
+    }
+
+
+def main():
+    args = docopt(__doc__)
+    mgr = DBManager(args['--connection'])
+
+    started = time.time()
+    counts = seed(mgr, int(args['--rows']), int(args['--random-seed']), args['--force'])
+    print('Seeded {} in {:.1f}s'.format(counts, time.time() - started))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Time JSON serialization of large list responses
+
+Compares the hand written as_dict dicts the models used to build with the
+precompiled serializers, on the stdlib json encoder and on orjson when it
+is installed, for IPAddress and Person lists of each size. Models are built
+in memory with every column set, like rows loaded from the database.
+
+Usage:
+    serialization.py [--rows=<n>...] [--repeat=<n>] [--output=<path>]
+
+Options:
+    --rows=<n>       List sizes, repeat for several [default: 1000 10000 100000]
+    --repeat=<n>     Runs per variant, the best run is reported [default: 5]
+    --output=<path>  Also write the results as JSON
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+from docopt import docopt
+from prospector.db.models import IPAddress, Person
+from prospector.serializers import json_functions, orjson
+
+
+def ipaddresses(count):
+    models = []
+
+    for i in range(count):
+        model = IPAddress(datetime(2019, 1, 1), '10.{}.{}.{}'.format((i >> 16) & 255, (i >> 8) & 255, i & 255),
+                          'City{}'.format(i % 1000), 'America/New_York', '-81.3', '28.5', '534', '534', '407',
+                          '32801', 'FL', 'Florida')
+        model.id = i + 1
+        models.append(model)
+
+    return models
+
+
+def legacy_ipaddress(m):
+    return {
+        'id': m.id,
+        'ip': m.ip,
+        'city': m.city,
+        'metro_code': m.metro_code,
+        'dma_code': m.dma_code,
+        'postal_code': m.postal_code,
+        'region_name': m.region_name,
+        'latitude': m.latitude,
+        'longitude': m.longitude
+    }
+
+
+def legacy_person(m):
+    return {
+        'id': m.id,
+        'created_date': m.created_date,
+        'first_name': m.first_name,
+        'last_name': m.last_name,
+        'email': m.email,
+        'cell_phone': m.cell_phone,
+        'address': m.address1,
+        'city': m.city,
+        'state': m.state,
+        'zip_code': m.zip_code,
+        'credit_range': m.credit_range,
+        'car_year': m.car_year,
+        'car_make': m.car_make,
+        'car_mode': m.car_model
+    }
+
+
+LEGACY = {IPAddress: legacy_ipaddress, Person: legacy_person}
+
+
+def persons(count):
+    models = []
+
+    for i in range(count):
+        model = Person(None, datetime(2019, 1, 1) + timedelta(minutes=i), 'First{}'.format(i), 'Last{}'.format(i),
+                       'person{}@example.com'.format(i), '5550000000', '{} Main St'.format(i), None,
+                       'City{}'.format(i % 1000), 'FL', '32801')
+        model.id = i + 1
+        model.home_phone = '5550000001'
+        model.zip_4 = None
+        model.credit_range = 'A'
+        model.car_year = '2015'
+        model.car_make = 'Ford'
+        model.car_model = 'F150'
+        models.append(model)
+
+    return models
+
+
+def variants():
+    stdlib_dumps = json_functions('json')[0]
+    found = [
+        ('legacy as_dict + json',
+         lambda model, models: json.dumps({'result': [LEGACY[model](m) for m in models]},
+                                          default=str).encode('utf-8')),
+        ('serializer + json',
+         lambda model, models: stdlib_dumps({'result': model.serializer().to_dicts(models)}))
+    ]
+
+    if orjson is not None:
+        orjson_dumps = json_functions('orjson')[0]
+        found.append(('serializer + orjson',
+                      lambda model, models: orjson_dumps({'result': model.serializer().to_dicts(models)})))
+
+    return found
+
+
+def best_of(repeat, func):
+    best = None
+
+    for i in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main():
+    args = docopt(__doc__)
+    repeat = int(args['--repeat'])
+    results = []
+
+    for rows in [int(n) for n in args['--rows']]:
+        for model, build in ((IPAddress, ipaddresses), (Person, persons)):
+            models = build(rows)
+            baseline = None
+
+            for name, serialize in variants():
+                size = len(serialize(model, models))
+                elapsed = best_of(repeat, lambda: serialize(model, models))
+                baseline = baseline or elapsed
+                results.append({
+                    'model': model.__name__,
+                    'rows': rows,
+                    'variant': name,
+                    'best_s': round(elapsed, 6),
+                    'rows_per_sec': round(rows / elapsed),
+                    'bytes': size,
+                    'speedup': round(baseline / elapsed, 2)
+                })
+                print('{:>9} {:>8} rows  {:<28} {:>9.2f} ms  {:>10} rows/s  x{:.2f}'.format(
+                    model.__name__, rows, name, elapsed * 1000, round(rows / elapsed), baseline / elapsed
+                ))
+
+    if args['--output']:
+        with open(args['--output'], 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Compare throughput and tail latency of the sync and async serving modes
+
+Seeds a database, starts the service under gunicorn in each server mode and
+drives it with many concurrent HTTP clients. The response cache is shrunk to
+a single entry so every request reaches the resources and the database.
+
+Usage:
+    serving.py [--connection=<url>] [--rows=<n>] [--workers=<n>] [--concurrency=<n>...]
+               [--requests=<n>] [--port=<n>] [--output=<path>] [--mode=<mode>...] [--force]
+
+Options:
+    --connection=<url>   Database to seed and serve [default: sqlite:///benchmarks/bench.db]
+    --rows=<n>           Rows to seed [default: 10000]
+    --workers=<n>        Gunicorn workers per mode [default: 2]
+    --concurrency=<n>    Concurrent clients, repeat for several [default: 256]
+    --requests=<n>       Requests per run [default: 5000]
+    --port=<n>           Port to serve on [default: 8899]
+    --output=<path>      Results file [default: benchmarks/serving.json]
+    --mode=<mode>        Server modes to compare [default: sync async]
+    --force              Drop the tables of a database that isn't a throwaway
+"""
+
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import yaml
+from docopt import docopt
+from benchmarks.seed import seed
+from benchmarks.suite import git_revision, percentile
+from prospector.db.manager import DBManager
+
+SERVE = 'from prospector.__main__ import main; main()'
+
+
+def write_config(path, connection, mode, port, workers):
+    config = {
+        'db': {'connection': connection},
+        'server': {'mode': mode},
+        'gunicorn': {'bind': '127.0.0.1:{}'.format(port), 'workers': workers, 'timeout': 120},
+        'cache': {'ttl': 60, 'maxsize': 1}
+    }
+
+    with open(path, 'w') as fp:
+        yaml.safe_dump(config, fp)
+
+
+def wait_for_port(server, port, timeout=30.0):
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('Service exited with {}'.format(server.returncode))
+
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+
+    raise RuntimeError('Service did not listen on port {} within {}s'.format(port, timeout))
+
+
+def request_paths(rows, count, rng):
+    paths = []
+
+    for i in range(count):
+        pk = rng.randint(1, rows)
+        paths.append(rng.choice([
+            '/person/{}'.format(pk),
+            '/ipaddress/1.{}.{}.{}'.format((pk >> 16) & 255, (pk >> 8) & 255, pk & 255),
+            '/ipaddress?limit=50&after={}'.format(pk)
+        ]))
+
+    return paths
+
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+    try:
+        writer.write('GET {} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.format(path).encode('ascii'))
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+
+    return response[9:12].decode('ascii') if response else 'closed'
+
+
+async def drive(port, paths, concurrency):
+    """
+    Fire the paths from concurrency clients
+    :return: (latencies, status counts, wall seconds)
+    """
+    queue = list(reversed(paths))
+    latencies = []
+    statuses = {}
+
+    async def client():
+        while queue:
+            path = queue.pop()
+            started = time.perf_counter()
+
+            try:
+                status = await fetch(port, path)
+            except OSError as err:
+                status = type(err).__name__
+
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for i in range(concurrency)])
+    return latencies, statuses, time.perf_counter() - started
+
+
+def run_mode(mode, args, paths):
+    port = int(args['--port'])
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, 'config.yaml')
+        write_config(config_path, args['--connection'], mode, port, int(args['--workers']))
+        server = subprocess.Popen([sys.executable, '-c', SERVE, '--config', config_path])
+
+        try:
+            wait_for_port(server, port)
+            # warm up every worker before timing
+            asyncio.run(drive(port, paths[:200], 8))
+
+            for concurrency in [int(n) for n in args['--concurrency']]:
+                latencies, statuses, wall = asyncio.run(drive(port, paths, concurrency))
+                result = {
+                    'mode': mode,
+                    'concurrency': concurrency,
+                    'requests': len(latencies),
+                    'statuses': statuses,
+                    'wall_s': round(wall, 4),
+                    'requests_per_sec': round(len(latencies) / wall, 2),
+                    'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+                    'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+                    'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+                    'max_ms': round(max(latencies) * 1000, 3)
+                }
+                results.append(result)
+                print('{:>6}  c={:<5} {:>9.1f} req/s  p50 {:>8.2f} ms  p99 {:>8.2f} ms  {}'.format(
+                    mode, concurrency, result['requests_per_sec'], result['p50_ms'], result['p99_ms'], statuses
+                ))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    return results
+
+
+def main():
+    args = docopt(__doc__)
+    rows = int(args['--rows'])
+
+    counts = seed(DBManager(args['--connection']), rows, force=args['--force'])
+    paths = request_paths(rows, int(args['--requests']), random.Random(rows))
+    results = []
+
+    for mode in args['--mode']:
+        results.extend(run_mode(mode, args, paths))
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': sys.version.split()[0],
+        'connection': DBManager(args['--connection']).engine.dialect.name,
+        'seeded': counts,
+        'workers': int(args['--workers']),
+        'results': results
+    }
+
+    with open(args['--output'], 'w') as fp:
+        json.dump(report, fp, indent=2)
+
+    print('Results written to {}'.format(args['--output']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Time radius and bounding box address searches on the geohash index
+
+Seeds only the address table, then runs the same random searches through
+the geohash index and as a full table scan filtered on lat and lon, and
+checks both return the same addresses.
+
+Usage:
+    spatial.py [--connection=<url>] [--rows=<n>] [--queries=<n>] [--radius=<km>...] [--output=<path>]
+               [--force]
+
+Options:
+    --connection=<url>  Database to seed and search [default: sqlite:///benchmarks/bench.db]
+    --rows=<n>          Addresses to seed [default: 1000000]
+    --queries=<n>       Searches per case [default: 50]
+    --radius=<km>       Search radii, repeat for several [default: 1 10 50]
+    --output=<path>     Also write the results as JSON
+    --force             Drop the tables of a database that isn't a throwaway
+"""
+
+import json
+import random
+import time
+from docopt import docopt
+from benchmarks.seed import MAX_ZIPCODES, address_rows, check_throwaway, insert_rows
+from prospector.db.manager import DBManager
+from prospector.db.models import Address
+from prospector.db.spatial import haversine_km, radius_bbox
+
+
+def seed_addresses(mgr, rows, rng):
+    Address.__table__.drop(mgr.engine, checkfirst=True)
+    mgr.setup()
+    return insert_rows(mgr, Address, address_rows(rows, MAX_ZIPCODES, rng))
+
+
+def scan_bbox(session, south, west, north, east):
+    return Address.select_rows(session, (Address.lat.between(south, north), Address.lon.between(west, east)),
+                               ('id', 'lat', 'lon'))
+
+
+def scan_radius(session, lat, lon, radius_km):
+    rows = scan_bbox(session, *radius_bbox(lat, lon, radius_km))
+    return [row for row in rows if haversine_km(lat, lon, row.lat, row.lon) <= radius_km]
+
+
+def index_bbox(session, south, west, north, east):
+    return Address.within_bbox(south, west, north, east, session, columns=('id', 'lat', 'lon'))
+
+
+def index_radius(session, lat, lon, radius_km):
+    return [row for row, distance in Address.within_radius(lat, lon, radius_km, session, columns=('id',))]
+
+
+def run(session, search, queries):
+    """
+    :return: tuple: (seconds per search, found ids per search)
+    """
+    found = []
+    started = time.perf_counter()
+
+    for query in queries:
+        found.append(search(session, *query))
+
+    elapsed = time.perf_counter() - started
+    return elapsed / len(queries), [sorted(row.id for row in result) for result in found]
+
+
+def cases(rng, count, radii):
+    points = [(rng.uniform(26.0, 48.0), rng.uniform(-122.0, -69.0)) for i in range(count)]
+
+    for radius in radii:
+        yield 'radius {:g} km'.format(radius), scan_radius, index_radius, \
+            [(lat, lon, radius) for lat, lon in points]
+
+    for radius in radii:
+        yield 'bbox {:g} km'.format(radius), scan_bbox, index_bbox, \
+            [radius_bbox(lat, lon, radius) for lat, lon in points]
+
+
+def main():
+    args = docopt(__doc__)
+    rows = int(args['--rows'])
+    rng = random.Random(1)
+    mgr = DBManager(args['--connection'])
+    check_throwaway(mgr, args['--force'])
+
+    started = time.perf_counter()
+    seed_addresses(mgr, rows, rng)
+    print('Seeded {} addresses in {:.1f}s'.format(rows, time.perf_counter() - started))
+
+    results = []
+
+    for name, scan, index, queries in cases(rng, int(args['--queries']), [float(r) for r in args['--radius']]):
+        scan_s, scan_ids = run(mgr.session, scan, queries)
+        index_s, index_ids = run(mgr.session, index, queries)
+        found = sum(len(ids) for ids in index_ids) / float(len(queries))
+        result = {
+            'case': name,
+            'rows': rows,
+            'queries': len(queries),
+            'mean_found': round(found, 1),
+            'scan_ms': round(scan_s * 1000, 3),
+            'index_ms': round(index_s * 1000, 3),
+            'speedup': round(scan_s / index_s, 1),
+            'same_results': scan_ids == index_ids
+        }
+        results.append(result)
+        print('{:<16} {:>9.1f} found  scan {:>9.2f} ms  index {:>8.2f} ms  x{:<7.1f} same results: {}'.format(
+            name, found, result['scan_ms'], result['index_ms'], result['speedup'], result['same_results']
+        ))
+
+    if args['--output']:
+        with open(args['--output'], 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Report cold start time of the API and the Celery task module
+
+Each target is imported in a fresh interpreter with -X importtime, and the
+self time of every imported module is rolled up to its top level package.
+
+Usage:
+    startup.py [--top=<n>] [--output=<path>] [<module>...]
+
+Options:
+    --top=<n>         Packages listed per target [default: 15]
+    --output=<path>   Also write the report as JSON
+"""
+
+import json
+import subprocess
+import sys
+import time
+from docopt import docopt
+
+TARGETS = ['prospector.app', 'prospector.tasks', 'prospector.__main__']
+
+
+def import_profile(module):
+    """
+    Import a module in a fresh interpreter
+    :param module: dotted module name
+    :return: dict: wall clock seconds and self microseconds per top level package
+    """
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+    wall = time.perf_counter() - started
+    packages = {}
+
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, cumulative_us, name = [field.strip() for field in line[len('import time:'):].split('|')]
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+
+    return {
+        'module': module,
+        'ok': proc.returncode == 0,
+        'error': proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+        'wall_s': round(wall, 4),
+        'import_us': sum(packages.values()),
+        'packages': sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    }
+
+
+def main():
+    args = docopt(__doc__)
+    top = int(args['--top'])
+    report = [import_profile(module) for module in args['<module>'] or TARGETS]
+
+    for profile in report:
+        print('{}: {:.3f}s wall, {:.1f} ms importing{}'.format(
+            profile['module'],
+            profile['wall_s'],
+            profile['import_us'] / 1000.0,
+            '' if profile['ok'] else ' (failed: {})'.format(profile['error'])
+        ))
+        for package, self_us in profile['packages'][:top]:
+            print('    {:<28} {:>9.1f} ms'.format(package, self_us / 1000.0))
+
+    if args['--output']:
+        with open(args['--output'], 'w') as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
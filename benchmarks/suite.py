@@ -0,0 +1,260 @@
+"""
+Time the service and task hot paths against a seeded database
+
+Seeds a fresh database for every row count, runs each benchmark and writes
+the results as JSON so runs can be compared over time. Celery tasks run
+eagerly in process, no broker is needed.
+
+Usage:
+    suite.py [--connection=<url>] [--rows=<n>...] [--repeat=<n>] [--output=<path>] [--only=<name>...]
+             [--force]
+
+Options:
+    --connection=<url>  Database to seed and time [default: sqlite:///benchmarks/bench.db]
+    --rows=<n>          Row counts to seed, repeat for several [default: 10000]
+    --repeat=<n>        Calls per benchmark [default: 200]
+    --output=<path>     Results file [default: benchmarks/results.json]
+    --only=<name>       Run only the named benchmarks
+    --force             Drop the tables of a database that isn't a throwaway
+"""
+
+import json
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime
+import falcon.testing
+from docopt import docopt
+from benchmarks.seed import seed, city_name, STATES
+from prospector.config import AppConfig
+from prospector.db.manager import DBManager
+from prospector.db.models import ZipCode
+
+BENCHMARKS = []
+
+
+def benchmark(func):
+    BENCHMARKS.append(func)
+    return func
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+def timed(name, func, args_list):
+    """
+    Call func once per args tuple and summarize the per-call latency
+    :return: dict
+    """
+    samples = []
+    started = time.perf_counter()
+
+    for args in args_list:
+        call_started = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - call_started)
+
+    total = time.perf_counter() - started
+    return {
+        'name': name,
+        'calls': len(samples),
+        'total_s': round(total, 6),
+        'mean_ms': round(total / len(samples) * 1000, 4),
+        'p50_ms': round(percentile(samples, 50) * 1000, 4),
+        'p95_ms': round(percentile(samples, 95) * 1000, 4),
+        'p99_ms': round(percentile(samples, 99) * 1000, 4),
+        'ops_per_sec': round(len(samples) / total, 2) if total else None
+    }
+
+
+def expect(status, request):
+    """
+    Fail the run when a simulated request answers another status, an
+    error page must not pass for a fast response
+    :param status: expected status code
+    :param request: callable returning a falcon.testing.Result
+    :return: callable
+    """
+    def call(*args):
+        result = request(*args)
+        if result.status_code != status:
+            raise AssertionError('Expected {}, got {}: {}'.format(status, result.status, result.text[:200]))
+        return result
+
+    return call
+
+
+class Context(object):
+    def __init__(self, mgr, connection, rows, repeat, rng):
+        self.mgr = mgr
+        self.connection = connection
+        self.rows = rows
+        self.repeat = repeat
+        self.rng = rng
+
+    def ids(self, count=None):
+        return [(self.rng.randint(1, self.rows),) for i in range(count or self.repeat)]
+
+    @property
+    def client(self):
+        from prospector.app import ProspectorService
+        cfg = AppConfig()
+        cfg.db.connection = self.connection
+        return falcon.testing.TestClient(ProspectorService(cfg))
+
+    @property
+    def tasks(self):
+        from prospector import tasks
+        tasks.res.mgr = self.mgr
+        tasks.app.conf.task_always_eager = True
+        return tasks
+
+
+@benchmark
+def service_get_ipaddress(ctx):
+    client = ctx.client
+    # row id i was seeded with ip number i - 1
+    ips = [('{}.{}.{}.{}'.format(1, ((i - 1) >> 16) & 255, ((i - 1) >> 8) & 255, (i - 1) & 255),)
+           for (i,) in ctx.ids()]
+    return timed('service_get_ipaddress', expect(200, lambda ip: client.simulate_get('/ipaddress/' + ip)), ips)
+
+
+@benchmark
+def service_get_ipaddress_page(ctx):
+    client = ctx.client
+    return timed('service_get_ipaddress_page',
+                 expect(200, lambda after: client.simulate_get('/ipaddress', params={'limit': 100, 'after': after})),
+                 ctx.ids())
+
+
+@benchmark
+def service_get_person(ctx):
+    client = ctx.client
+    return timed('service_get_person', expect(200, lambda pk: client.simulate_get('/person/{}'.format(pk))),
+                 ctx.ids())
+
+
+@benchmark
+def service_post_person(ctx):
+    client = ctx.client
+    body = {
+        'created_date': '2019-01-01T00:00:00',
+        'first_name': 'Bench',
+        'last_name': 'Mark',
+        'email': 'bench@example.com',
+        'home_phone': '5550000000',
+        'cell_phone': '5550000001',
+        'address1': '1 Main St',
+        'city': city_name(1),
+        'state': STATES[1],
+        'zip_code': '00001'
+    }
+    return timed('service_post_person', expect(201, lambda: client.simulate_post('/person', json=body)),
+                 [()] * ctx.repeat)
+
+
+@benchmark
+def service_post_ipaddress(ctx):
+    client = ctx.client
+    bodies = []
+    for i in range(ctx.repeat):
+        bodies.append(({
+            'ip': '240.0.{}.{}'.format((i >> 8) & 255, i & 255),
+            'created_date': '2019-01-01T00:00:00',
+            'city': city_name(1),
+            'time_zone': 'America/New_York',
+            'latitude': '28.5',
+            'longitude': '-81.3',
+            'metro_code': '534',
+            'dma_code': '534',
+            'area_code': '407',
+            'postal_code': '32801',
+            'region': 'FL',
+            'region_name': 'Florida'
+        },))
+    return timed('service_post_ipaddress', expect(201, lambda body: client.simulate_post('/ipaddress', json=body)),
+                 bodies)
+
+
+@benchmark
+def zipcode_query_for_code(ctx):
+    pairs = []
+    for i in range(ctx.repeat):
+        city = ctx.rng.randrange(1000)
+        pairs.append((city_name(city), STATES[city % len(STATES)], ctx.mgr.session))
+    return timed('zipcode_query_for_code', ZipCode.query_for_code, pairs)
+
+
+@benchmark
+def task_update_zipcode(ctx):
+    return timed('task_update_zipcode', ctx.tasks.update_zipcode, ctx.ids())
+
+
+@benchmark
+def task_coordinates_to_address(ctx):
+    return timed('task_coordinates_to_address', ctx.tasks.coordinates_to_address, ctx.ids())
+
+
+@benchmark
+def task_get_addr_for_update(ctx):
+    return timed('task_get_addr_for_update', ctx.tasks.get_addr_for_update, [()] * max(1, ctx.repeat // 20))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD']).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = docopt(__doc__)
+    repeat = int(args['--repeat'])
+    selected = set(args['--only'])
+    runs = []
+
+    for rows in [int(n) for n in args['--rows']]:
+        mgr = DBManager(args['--connection'])
+        started = time.time()
+        counts = seed(mgr, rows, force=args['--force'])
+        run = {
+            'rows': rows,
+            'seeded': counts,
+            'seed_s': round(time.time() - started, 3),
+            'results': []
+        }
+
+        for bench in BENCHMARKS:
+            if selected and bench.__name__ not in selected:
+                continue
+
+            ctx = Context(mgr, args['--connection'], rows, repeat, random.Random(rows))
+            result = bench(ctx)
+            run['results'].append(result)
+            print('{:>10} rows  {:<32} {:>10.3f} ms/call  p95 {:>9.3f} ms'.format(
+                rows, result['name'], result['mean_ms'], result['p95_ms']
+            ))
+
+        runs.append(run)
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'connection': DBManager(args['--connection']).engine.dialect.name,
+        'repeat': repeat,
+        'runs': runs
+    }
+
+    with open(args['--output'], 'w') as fp:
+        json.dump(report, fp, indent=2)
+
+    print('Results written to {}'.format(args['--output']))
+
+
+if __name__ == '__main__':
+    main()
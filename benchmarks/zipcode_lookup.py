@@ -0,0 +1,83 @@
+"""
+Benchmark the in-process ZipCodeIndex against ZipCode.query_for_code
+
+Usage:
+    zipcode_lookup.py [--connection=<url>] [--zipcodes=<n>] [--lookups=<n>]
+
+Options:
+    --connection=<url>  Database to seed [default: sqlite://]
+    --zipcodes=<n>      Synthetic zipcodes rows to seed [default: 40000]
+    --lookups=<n>       (city, state) lookups to time [default: 5000]
+"""
+
+import random
+import time
+from docopt import docopt
+from prospector.db.lookups import ZipCodeIndex
+from prospector.db.manager import DBManager
+from prospector.db.models import ZipCode
+
+STATES = ['AL', 'AZ', 'CA', 'CO', 'FL', 'GA', 'IL', 'NC', 'NY', 'OH', 'PA', 'TX', 'VA', 'WA']
+
+
+def seed_zipcodes(mgr, count):
+    rows = []
+    for i in range(count):
+        rows.append({
+            'country_code': 'US',
+            'postal_code': '{:05d}'.format(i),
+            'city_name': 'City{}'.format(random.randint(0, count // 4)),
+            'state': random.choice(STATES),
+            'state_abbr': '',
+            'county': '',
+            'county_code': '',
+            'community': '',
+            'community_code': '',
+            'latitude': random.uniform(25.0, 49.0),
+            'longitude': random.uniform(-124.0, -67.0),
+            'accuracy': 4
+        })
+
+    session = mgr.session
+    with session.begin():
+        session.execute(ZipCode.__table__.insert(), rows)
+
+
+def main():
+    args = docopt(__doc__)
+    mgr = DBManager(args['--connection'])
+    mgr.setup()
+    seed_zipcodes(mgr, int(args['--zipcodes']))
+
+    lookups = [
+        ('City{}'.format(random.randint(0, int(args['--zipcodes']) // 4)), random.choice(STATES))
+        for i in range(int(args['--lookups']))
+    ]
+
+    started = time.time()
+    sql_codes = []
+    for city, state in lookups:
+        data = ZipCode.query_for_code(city, state, mgr.session)
+        sql_codes.append(data.postal_code if data else None)
+    sql_elapsed = time.time() - started
+
+    index = ZipCodeIndex()
+    started = time.time()
+    index.refresh(mgr.session)
+    build_elapsed = time.time() - started
+
+    started = time.time()
+    index_codes = [index.lookup(city, state) for city, state in lookups]
+    index_elapsed = time.time() - started
+
+    mismatches = sum(1 for a, b in zip(sql_codes, index_codes) if a != b)
+
+    print('sql path:   {} lookups in {:.3f}s ({:.0f}/sec)'.format(
+        len(lookups), sql_elapsed, len(lookups) / sql_elapsed))
+    print('index path: {} lookups in {:.3f}s ({:.0f}/sec), built in {:.3f}s'.format(
+        len(lookups), index_elapsed, len(lookups) / index_elapsed, build_elapsed))
+    print('mismatches: {}'.format(mismatches))
+
+
+if __name__ == '__main__':
+    main()
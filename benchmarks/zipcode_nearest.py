@@ -0,0 +1,85 @@
+"""
+Benchmark nearest zip code assignment with ZipCentroidIndex
+
+Seeds the zipcodes table, assigns the nearest centroid to a batch of
+random points in one query, and checks a sample of them against a brute
+force haversine scan over every centroid.
+
+Usage:
+    zipcode_nearest.py [--connection=<url>] [--zipcodes=<n>] [--points=<n>] [--max-distance=<km>] [--check=<n>]
+
+Options:
+    --connection=<url>    Database to seed [default: sqlite://]
+    --zipcodes=<n>        Synthetic zipcodes rows to seed [default: 42000]
+    --points=<n>          Points to assign in one batch [default: 1000000]
+    --max-distance=<km>   No code past this distance [default: 25]
+    --check=<n>           Points checked against the brute force scan [default: 200]
+"""
+
+import random
+import time
+import numpy as np
+from docopt import docopt
+from benchmarks.seed import insert_rows, zipcode_rows
+from prospector.db.lookups import ZipCentroidIndex
+from prospector.db.manager import DBManager
+from prospector.db.models import ZipCode
+from prospector.db.spatial import EARTH_RADIUS_KM
+
+
+def brute_force(lat, lon, centroids, max_distance_km):
+    lats = np.radians(centroids[:, 0])
+    lons = np.radians(centroids[:, 1])
+    phi = np.radians(lat)
+    a = np.sin((lats - phi) / 2) ** 2 + np.cos(phi) * np.cos(lats) * np.sin((lons - np.radians(lon)) / 2) ** 2
+    km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+    nearest = int(np.argmin(km))
+    return nearest if km[nearest] <= max_distance_km else None
+
+
+def main():
+    args = docopt(__doc__)
+    rng = random.Random(1)
+    max_distance_km = float(args['--max-distance'])
+    mgr = DBManager(args['--connection'])
+    mgr.setup()
+    insert_rows(mgr, ZipCode, zipcode_rows(int(args['--zipcodes']), rng))
+
+    index = ZipCentroidIndex(max_distance_km=max_distance_km)
+    started = time.perf_counter()
+    index.refresh(mgr.session)
+    build_elapsed = time.perf_counter() - started
+
+    count = int(args['--points'])
+    lats = np.array([rng.uniform(25.0, 49.0) for i in range(count)])
+    lons = np.array([rng.uniform(-124.0, -67.0) for i in range(count)])
+
+    started = time.perf_counter()
+    codes, distances, confidences = index.nearest(lats, lons)
+    elapsed = time.perf_counter() - started
+
+    rows = ZipCode.get_centroid_rows(mgr.session)
+    centroids = np.array([(row.latitude, row.longitude) for row in rows])
+    sample = rng.sample(range(count), min(count, int(args['--check'])))
+
+    started = time.perf_counter()
+    expected = [brute_force(lats[i], lons[i], centroids, max_distance_km) for i in sample]
+    brute_elapsed = time.perf_counter() - started
+
+    mismatches = sum(
+        1 for i, nearest in zip(sample, expected)
+        if codes[i] != (rows[nearest].postal_code if nearest is not None else None)
+    )
+    assigned = np.isfinite(distances)
+    median_confidence = float(np.median(confidences[assigned])) if assigned.any() else 0.0
+
+    print('index built from {} centroids in {:.3f}s'.format(len(index), build_elapsed))
+    print('kd-tree:     {} points in {:.3f}s ({:.0f}/sec), {} assigned, median confidence {:.3f}'.format(
+        count, elapsed, count / elapsed, int(assigned.sum()), median_confidence))
+    print('brute force: {} points in {:.3f}s ({:.0f}/sec)'.format(
+        len(sample), brute_elapsed, len(sample) / brute_elapsed))
+    print('mismatches:  {} of {}'.format(mismatches, len(sample)))
+
+
+if __name__ == '__main__':
+    main()
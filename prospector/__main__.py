@@ -1,13 +1,25 @@
 #!.env/bin/python
 # -*- code: utf-8 -*-
 # prospector/__main__.py
+"""
+Run the Prospector service under gunicorn
+
+server.mode in the config picks the app: sync serves the WSGI app on sync
+workers, async serves the ASGI app on server.async_worker_class
+
+Usage:
+    prospector [--config=<path>]
+
+Options:
+    --config=<path>   Config file, defaults to PROSPECTOR_CONFIG or config/config.yaml
+"""
 
-import aumbry
 from docopt import docopt
 from gunicorn.app.base import BaseApplication
 from gunicorn.workers.sync import SyncWorker
 from prospector.app import ProspectorService
-from prospector.config import AppConfig
+from prospector.config import load_config
+from prospector.middleware.metrics import child_exit
 
 
 class CustomWorker(SyncWorker):
@@ -25,37 +37,52 @@ class CustomWorker(SyncWorker):
         super(CustomWorker, self).run()
 
 
+def post_fork(server, worker):
+    """
+    Gunicorn hook, async workers don't go through CustomWorker.run()
+    """
+    worker.app.application.start()
+
+
 class GunicornApp(BaseApplication):
     """
     Load Gunicorn settings from an external resource
     """
 
-    def __init__(self, app, options=None):
+    def __init__(self, app, options=None, worker_class=None):
         self.options = options or {}
         self.application = app
+        self.worker_class = worker_class
         super(GunicornApp, self).__init__()
 
     def load_config(self):
         for key, value in self.options.items():
             self.cfg.set(key.lower(), value)
 
-        self.cfg.set('worker_class', 'prospector.__main__.CustomWorker')
+        if self.worker_class:
+            self.cfg.set('worker_class', self.worker_class)
+            self.cfg.set('post_fork', post_fork)
+        else:
+            self.cfg.set('worker_class', 'prospector.__main__.CustomWorker')
+
+        self.cfg.set('child_exit', child_exit)
 
     def load(self):
         return self.application
 
 
 def main():
-    docopt(__doc__)
-
-    cfg = aumbry.load(
-        aumbry.FILE,
-        AppConfig,
-        {
-            'CONFIG_FILE_PATH': 'config/config.yaml'
-        }
-    )
-
-    api_app = ProspectorService(cfg)
-    gunicorn_app = GunicornApp(api_app, cfg.gunicorn)
+    args = docopt(__doc__)
+    cfg = load_config(args['--config'])
+
+    if cfg.server.mode == 'async':
+        from prospector.asgi import ProspectorAsyncService
+        api_app = ProspectorAsyncService(cfg)
+        gunicorn_app = GunicornApp(api_app, cfg.gunicorn, cfg.server.async_worker_class)
+    elif cfg.server.mode == 'sync':
+        api_app = ProspectorService(cfg)
+        gunicorn_app = GunicornApp(api_app, cfg.gunicorn)
+    else:
+        raise SystemExit('Unknown server mode {}, use sync or async'.format(cfg.server.mode))
+
     gunicorn_app.run()
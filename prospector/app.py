@@ -4,11 +4,44 @@
 
 import json
 import falcon
-from celery.result import AsyncResult
-from prospector.tasks import get_ip_for_geo_locate
 from prospector.db.manager import DBManager
+from prospector.db.timing import instrument_engine
+from prospector.cache import build_cache, build_lookup_cache
+from prospector.media import install_json_handler
+from prospector.middleware.cache import ResponseCacheMiddleware
 from prospector.middleware.context import ContextMiddleware
-from prospector.resources import ipaddresses, persons
+from prospector.middleware.metrics import MetricsMiddleware, MetricsResource
+from prospector.geo import GeoIPCache, LazyGeoIP
+from prospector.resources import addresses, geolocate, ipaddresses, persons
+
+
+def build_routes(cfg, mgr, cache):
+    """
+    Routes of the service, shared by the WSGI and ASGI apps
+    :return: list of (uri template, resource)
+    """
+    ipaddress_resource = ipaddresses.IPAddressResource(mgr, cache)
+    person_resource = persons.PersonResource(mgr, cache)
+    geolocate_resource = geolocate.GeoLocateResource(
+        GeoIPCache(LazyGeoIP(), lookups=build_lookup_cache(cfg.tasks))
+    )
+
+    return [
+        ('/address', addresses.AddressResource(mgr, cache)),
+        ('/ipaddress', ipaddress_resource),
+        ('/ipaddress/bulk', ipaddresses.IPAddressBulkResource(mgr, cache)),
+        ('/ipaddress/{ip}', ipaddress_resource),
+        ('/person', person_resource),
+        ('/person/bulk', persons.PersonBulkResource(mgr, cache)),
+        ('/person/{person_id}', person_resource),
+        ('/geolocate', geolocate_resource),
+        ('/geolocate/{ip}', geolocate_resource),
+        ('/metrics', MetricsResource())
+    ]
+
+
+def build_middleware(mgr, cache, executor=None):
+    return [MetricsMiddleware(mgr), ContextMiddleware(), ResponseCacheMiddleware(cache, executor)]
 
 
 class ProspectorService(falcon.API):
@@ -17,27 +50,30 @@ class ProspectorService(falcon.API):
     :return service
     """
     def __init__(self, cfg):
+        self.cache = build_cache(cfg.cache)
+
+        mgr = DBManager.from_config(cfg.db)
+        mgr.setup()
+        instrument_engine(mgr.engine)
+
         super(ProspectorService, self).__init__(
-            middleware=[ContextMiddleware()]
+            middleware=build_middleware(mgr, self.cache)
         )
 
         self.cfg = cfg
+        self.mgr = mgr
+        install_json_handler(self, cfg.server.json_library)
 
-        mgr = DBManager(self.cfg.db.connection)
-        mgr.setup()
-
-        ipaddress_resource = ipaddresses.IPAddressResource(mgr)
-        person_resource = persons.PersonResource(mgr)
-
-        self.add_route('/ipaddress/<:string>', ipaddress_resource)
-        self.add_route('/person/<:string>', person_resource)
+        for uri_template, resource in build_routes(self.cfg, mgr, self.cache):
+            self.add_route(uri_template, resource)
 
     def start(self):
         """
         Convenience method when Gunicorn calls run()
+        Runs in the forked worker, which gets its own connection pool
         :return: custom worker
         """
-        pass
+        self.mgr.after_fork()
 
     def stop(self):
         """
@@ -54,6 +90,8 @@ class StartTask(object):
     """
 
     def on_get(self, req, resp, *, ip):
+        from prospector.tasks import get_ip_for_geo_locate
+
         # start task
         task = get_ip_for_geo_locate.delay(ip)
         resp.status = falcon.HTTP_200
@@ -69,6 +107,8 @@ class TaskStatus(object):
     """
 
     def on_get(self, req, resp, *, task_id):
+        from celery.result import AsyncResult
+
         # get result of task by task_id and generate content to client
         task_result = AsyncResult(task_id)
         result = {'status': task_result.status, 'result': task_result.result}
@@ -0,0 +1,176 @@
+#!.env/bin/python
+# -*- code: utf-8 -*-
+# prospector/asgi.py
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+import falcon
+import falcon.asgi
+from falcon.constants import COMBINED_METHODS
+from prospector.app import build_middleware, build_routes
+from prospector.cache import build_cache
+from prospector.media import install_json_handler
+from prospector.db.manager import DBManager
+from prospector.db.timing import instrument_engine, start_db_timer, stop_db_timer
+
+# NDJSON lines pulled off the cursor per executor call
+STREAM_BATCH = 500
+
+
+class SyncStream(object):
+    """
+    Blocking reads of the ASGI body stream from an executor thread
+    """
+
+    def __init__(self, stream, loop):
+        self.stream = stream
+        self.loop = loop
+
+    def read(self, size=None):
+        return asyncio.run_coroutine_threadsafe(self.stream.read(size), self.loop).result()
+
+
+class MediaRequest(object):
+    """
+    ASGI request as seen by a sync responder
+    JSON bodies are read on the loop before the responder runs, so req.media
+    is a plain value again, other bodies are read through bounded_stream
+    """
+
+    def __init__(self, req, media, stream):
+        self._req = req
+        self.media = media
+        self.bounded_stream = self.stream = stream
+
+    def get_media(self, default_when_empty=None):
+        return self.media if self.media is not None else default_when_empty
+
+    def __getattr__(self, name):
+        return getattr(self._req, name)
+
+
+async def iterate_in_executor(executor, iterator, batch=STREAM_BATCH):
+    """
+    Async stream over a blocking iterator, each batch is pulled on the executor
+    :param executor: concurrent.futures.Executor
+    :param iterator: iterable of bytes
+    :return: async generator of bytes
+    """
+    loop = asyncio.get_running_loop()
+    iterator = iter(iterator)
+
+    while True:
+        chunk = await loop.run_in_executor(executor, lambda: list(islice(iterator, batch)))
+
+        if not chunk:
+            break
+
+        yield b''.join(chunk)
+
+
+class AsyncResource(object):
+    """
+    Serve a sync resource from the ASGI app
+    Responders run on the DB executor, the event loop only parses bodies,
+    runs middleware and writes responses
+    """
+
+    def __init__(self, resource, db_manager, executor):
+        self.resource = resource
+        self.db = db_manager
+        self.executor = executor
+
+        for method in COMBINED_METHODS:
+            name = 'on_' + method.lower()
+            responder = getattr(resource, name, None)
+
+            if responder is not None:
+                setattr(self, name, self.wrap(responder))
+
+    def __getattr__(self, name):
+        # cache_namespace and friends, read by the middleware
+        return getattr(self.__dict__['resource'], name)
+
+    def wrap(self, responder):
+        async def respond(req, resp, **params):
+            loop = asyncio.get_running_loop()
+            media = None
+
+            if (req.content_length and not getattr(self.resource, 'streams_body', False) and
+                    (req.content_type or falcon.MEDIA_JSON).startswith(falcon.MEDIA_JSON)):
+                media = await req.get_media()
+
+            await loop.run_in_executor(
+                self.executor,
+                partial(self.call, responder, MediaRequest(req, media, SyncStream(req.stream, loop)), resp, params)
+            )
+
+            if resp.stream is not None and not hasattr(resp.stream, '__aiter__'):
+                resp.stream = iterate_in_executor(self.executor, resp.stream)
+
+        return respond
+
+    def call(self, responder, req, resp, params):
+        start_db_timer()
+
+        try:
+            responder(req, resp, **params)
+        finally:
+            req.context['db_time'] = req.context.get('db_time', 0.0) + stop_db_timer()
+
+            if resp.stream is not None:
+                # the stream keeps using this session, just detach it from the thread
+                self.db.DBSession.registry.clear()
+            else:
+                self.db.DBSession.remove()
+
+
+class ProspectorAsyncService(falcon.asgi.App):
+    """
+    The Prospector Service as an ASGI app
+    Same routes and middleware as ProspectorService, for async servers
+    :return service
+    """
+    def __init__(self, cfg):
+        self.cache = build_cache(cfg.cache)
+
+        mgr = DBManager.from_config(cfg.db)
+        mgr.setup()
+        instrument_engine(mgr.engine)
+
+        # one thread per pooled connection, so queries never queue inside the pool
+        self.executor = ThreadPoolExecutor(
+            max_workers=cfg.db.pool_size + cfg.db.max_overflow,
+            thread_name_prefix='prospector-db'
+        )
+
+        super(ProspectorAsyncService, self).__init__(
+            middleware=build_middleware(mgr, self.cache, self.executor)
+        )
+
+        self.cfg = cfg
+        self.mgr = mgr
+        install_json_handler(self, cfg.server.json_library)
+        adapters = {}
+
+        for uri_template, resource in build_routes(self.cfg, mgr, self.cache):
+            if id(resource) not in adapters:
+                adapters[id(resource)] = AsyncResource(resource, mgr, self.executor)
+
+            self.add_route(uri_template, adapters[id(resource)])
+
+    def start(self):
+        """
+        Called in each forked worker before it serves requests
+        :return: none
+        """
+        self.mgr.after_fork()
+
+    def stop(self):
+        """
+        Convenience method for stopping all Gunicorn workers
+        :return: none
+        """
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,90 @@
+import hashlib
+import math
+import numpy as np
+
+
+def key_digest(key):
+    """
+    128 bit digest of a key, read as two 64 bit hashes
+    :param key: str or bytes
+    :return: bytes
+    """
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+
+    return hashlib.blake2b(key, digest_size=16).digest()
+
+
+class BloomFilter(object):
+    """
+    Probabilistic set of strings in a fixed size bit array
+    A key never added is reported present with probability error_rate at
+    capacity keys, a key added is always reported present. The k bit
+    positions of a key are h1 + i * h2 modulo 2 ** 64 and the size, batches
+    are hashed and tested with NumPy
+    :param capacity: keys expected
+    :param error_rate: false positive rate at capacity
+    :return filter
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(1, int(capacity))
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / float(capacity) * math.log(2))))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return bool(self.contains_many([key])[0])
+
+    def positions(self, keys):
+        """
+        :param keys: sequence of str or bytes
+        :return: array of shape (len(keys), hashes)
+        """
+        hashes = np.frombuffer(b''.join(map(key_digest, keys)), dtype='<u8').reshape(-1, 2)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+
+        with np.errstate(over='ignore'):
+            combined = hashes[:, :1] + steps * (hashes[:, 1:] | np.uint64(1))
+
+        return combined % np.uint64(self.size)
+
+    def test(self, positions):
+        masks = (1 << (positions & np.uint64(7))).astype(np.uint8)
+        return np.all(self.bits[positions >> np.uint64(3)] & masks, axis=1)
+
+    def contains_many(self, keys):
+        """
+        :param keys: sequence of str or bytes
+        :return: array of bool, True where a key may have been added
+        """
+        return self.test(self.positions(keys))
+
+    def add_many(self, keys):
+        """
+        Add a batch of keys
+        A key repeated within the batch is reported like its first occurrence
+        :param keys: sequence of str or bytes
+        :return: array of bool, True where a key may have been added before, False where it surely wasn't
+        """
+        positions = self.positions(keys)
+        present = self.test(positions)
+        masks = (1 << (positions & np.uint64(7))).astype(np.uint8)
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), masks)
+        self.count += len(set(key for key, seen in zip(keys, present.tolist()) if not seen))
+        return present
+
+    def add(self, key):
+        """
+        :param key: str or bytes
+        :return: bool: the key may have been added before, False when it surely wasn't
+        """
+        return bool(self.add_many([key])[0])
+
+    @property
+    def memory(self):
+        return self.bits.nbytes
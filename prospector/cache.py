@@ -0,0 +1,385 @@
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+LOCK_PREFIX = 'lock:'
+
+
+class TTLCache(object):
+    """
+    Bounded in-process LRU cache with a per-entry time to live
+    Counters live apart from the entries and are never evicted
+    :return value
+    """
+    # calls never wait on I/O, the ASGI app runs them on the loop
+    blocking = False
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set_many(self, items, ttl=None):
+        for key, value in items.items():
+            self.set(key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        """
+        Set a key that is absent or expired
+        :return: bool: set
+        """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] >= now):
+                return False
+
+            self._entries[key] = (value, now + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class RedisCache(object):
+    """
+    Shared cache backend, values are stored as JSON under a key prefix
+    :return value
+    """
+    # every call is a network round trip
+    blocking = True
+
+    def __init__(self, client, prefix='prospector:', ttl=60):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+
+        if raw is None:
+            return None
+
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or None)
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+
+        return [None if raw is None else json.loads(raw)
+                for raw in self.client.mget([self.prefix + key for key in keys])]
+
+    def set_many(self, items, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        pipe = self.client.pipeline(transaction=False)
+
+        for key, value in items.items():
+            pipe.set(self.prefix + key, json.dumps(value), ex=ttl or None)
+
+        pipe.execute()
+
+    def add(self, key, value, ttl=None):
+        """
+        Set a key that is absent, SET NX
+        :return: bool: set
+        """
+        ttl = self.ttl if ttl is None else ttl
+        ex = int(math.ceil(ttl)) if ttl else None
+        return bool(self.client.set(self.prefix + key, json.dumps(value), ex=ex, nx=True))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def counter(self, key):
+        return int(self.client.get(self.prefix + 'counter:' + key) or 0)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + 'counter:' + key)
+
+
+class LookupCache(object):
+    """
+    Two tier cache of enrichment lookups, a per-process LRU in front of an
+    optional shared tier every worker process reads
+    Keys are the lookup kind and its normalized input, results are stored
+    as [value] so a lookup answering None is cached too, for negative_ttl.
+    Local entries live at most local_ttl. A missing key is computed by one
+    caller at a time: it takes a lock in the shared tier, or in the local
+    one without a shared tier, and the other callers wait up to
+    lock_timeout for its result before computing it themselves. Errors of
+    the shared tier are counted and the lookup carries on without it
+    :return value
+    """
+
+    def __init__(self, local=None, shared=None, ttl=86400, negative_ttl=3600, local_ttl=300,
+                 lock_timeout=10.0, poll_interval=0.02):
+        self.local = local if local is not None else TTLCache(maxsize=100000, ttl=local_ttl)
+        self.shared = shared
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.local_ttl = local_ttl
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.local)
+
+    @staticmethod
+    def key(kind, value):
+        """
+        :param kind: lookup type, like 'geoip'
+        :param value: normalized input, str or a tuple of parts
+        :return: str
+        """
+        if isinstance(value, (list, tuple)):
+            value = '|'.join('' if part is None else str(part) for part in value)
+
+        key = 'lookup:{}:{}'.format(kind, value)
+
+        if len(key) > 200:
+            key = 'lookup:{}:#{}'.format(kind, hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest())
+
+        return key
+
+    def count(self, kind, name, n=1):
+        with self._stats_lock:
+            counts = self.stats.setdefault(kind, {'local': 0, 'shared': 0, 'computed': 0, 'waited': 0, 'errors': 0})
+            counts[name] += n
+
+    def get(self, kind, value, compute):
+        """
+        Cached result of one lookup
+        :param kind: lookup type
+        :param value: normalized input
+        :param compute: callable taking the input, returning its result
+        :return: result
+        """
+        return self.get_many(kind, [value], lambda values: [compute(values[0])])[0]
+
+    def get_many(self, kind, values, compute_many):
+        """
+        Cached results of a batch of lookups, the ones missing from both
+        tiers are computed in a single call
+        :param kind: lookup type
+        :param values: normalized inputs
+        :param compute_many: callable taking a list of inputs, returning their results in order
+        :return: list of results in input order
+        """
+        keys = [self.key(kind, value) for value in values]
+        missing = OrderedDict((key, value) for key, value in zip(keys, values))
+        found = self.read(kind, list(missing))
+
+        for key in found:
+            del missing[key]
+
+        if missing:
+            found.update(self.fill(kind, missing, compute_many))
+
+        return [found[key][0] for key in keys]
+
+    def read(self, kind, keys, waited=False):
+        """
+        :return: dict: key -> [value] of the keys in either tier
+        """
+        found = {}
+
+        for key in keys:
+            entry = self.local.get(key)
+            if entry is not None:
+                found[key] = entry
+
+        rest = [key for key in keys if key not in found]
+        shared = {}
+
+        if rest and self.shared is not None:
+            try:
+                shared = dict((key, entry) for key, entry in zip(rest, self.shared.get_many(rest))
+                              if entry is not None)
+            except Exception:
+                self.count(kind, 'errors')
+
+            for key, entry in shared.items():
+                ttl = self.ttl if entry[0] is not None else self.negative_ttl
+                self.local.set(key, entry, self.local_expiry(ttl))
+            found.update(shared)
+
+        if waited:
+            self.count(kind, 'waited', len(found))
+        else:
+            self.count(kind, 'local', len(found) - len(shared))
+            self.count(kind, 'shared', len(shared))
+
+        return found
+
+    def fill(self, kind, missing, compute_many):
+        """
+        Compute the missing keys, or wait for the callers holding their locks
+        :param missing: OrderedDict: key -> normalized input
+        :return: dict: key -> [value]
+        """
+        locks = self.shared if self.shared is not None else self.local
+        owned = []
+
+        for key in missing:
+            try:
+                if locks.add(LOCK_PREFIX + key, 1, self.lock_timeout):
+                    owned.append(key)
+            except Exception:
+                self.count(kind, 'errors')
+                owned.append(key)
+
+        try:
+            # a caller may have filled a key between the read and the lock
+            found = self.read(kind, owned, waited=True) if owned else {}
+            computing = [(key, missing[key]) for key in owned if key not in found]
+            if computing:
+                found.update(self.compute(kind, computing, compute_many))
+            waiting = [key for key in missing if key not in found]
+            deadline = time.time() + self.lock_timeout
+
+            while waiting and time.time() < deadline:
+                time.sleep(self.poll_interval)
+                found.update(self.read(kind, waiting, waited=True))
+                waiting = [key for key in waiting if key not in found]
+
+            if waiting:
+                # the lock holder is slow or gone, compute them here
+                found.update(self.compute(kind, [(key, missing[key]) for key in waiting], compute_many))
+
+        finally:
+            for key in owned:
+                try:
+                    locks.delete(LOCK_PREFIX + key)
+                except Exception:
+                    self.count(kind, 'errors')
+
+        return found
+
+    def compute(self, kind, items, compute_many):
+        """
+        :param items: list of (key, normalized input)
+        :return: dict: key -> [value]
+        """
+        results = compute_many([value for key, value in items])
+        entries = dict((key, [result]) for (key, value), result in zip(items, results))
+        self.count(kind, 'computed', len(entries))
+
+        found = dict((key, entry) for key, entry in entries.items() if entry[0] is not None)
+        negative = dict((key, entry) for key, entry in entries.items() if entry[0] is None)
+        stored = [(found, self.ttl)] + ([(negative, self.negative_ttl)] if self.negative_ttl else [])
+
+        for batch, ttl in stored:
+            self.local.set_many(batch, self.local_expiry(ttl))
+
+            if self.shared is not None and batch:
+                try:
+                    self.shared.set_many(batch, ttl)
+                except Exception:
+                    self.count(kind, 'errors')
+
+        return entries
+
+    def local_expiry(self, ttl):
+        """
+        Seconds a local entry of a shared ttl lives, 0 never expires
+        """
+        return min(self.local_ttl, ttl) if self.local_ttl and ttl else self.local_ttl or ttl
+
+
+def build_lookup_cache(tasks_cfg):
+    """
+    Lookup cache of a process, shared through Redis when a lookup_cache_url is configured
+    :param tasks_cfg: TasksConfig
+    :return: LookupCache
+    """
+    shared = None
+
+    if tasks_cfg.lookup_cache_url:
+        shared = RedisCache.from_url(tasks_cfg.lookup_cache_url)
+
+    return LookupCache(
+        TTLCache(maxsize=tasks_cfg.geoip_cache_size, ttl=tasks_cfg.lookup_cache_local_ttl),
+        shared,
+        ttl=tasks_cfg.lookup_cache_ttl,
+        negative_ttl=tasks_cfg.lookup_cache_negative_ttl,
+        local_ttl=tasks_cfg.lookup_cache_local_ttl
+    )
+
+
+def build_cache(cache_cfg):
+    """
+    Shared Redis cache when a redis_url is configured, in-process otherwise
+    :param cache_cfg: CacheConfig
+    :return: cache
+    """
+    if cache_cfg.redis_url:
+        return RedisCache.from_url(cache_cfg.redis_url, ttl=cache_cfg.ttl)
+
+    return TTLCache(maxsize=cache_cfg.maxsize, ttl=cache_cfg.ttl)
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter(object):
+    """
+    Space out requests to the same host to at most `rate` per second
+    :return none
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class HTTPClient(object):
+    """
+    Shared pooled HTTP client with keep-alive, timeouts, retry with backoff
+    and a per-host rate limit. Every attempt, retries included, waits its
+    turn with the rate limiter. The session is rebuilt after a fork so
+    pooled sockets are never shared between worker processes
+    :return response
+    """
+
+    def __init__(self, timeout=(3.05, 15), retries=3, backoff=0.5, rate_limit=None, workers=8,
+                 headers=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.workers = workers
+        self.headers = headers or {}
+        self.limiter = RateLimiter(rate_limit)
+        self._session = None
+        self._pid = None
+
+    @property
+    def session(self):
+        if self._session is None or self._pid != os.getpid():
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.workers)
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+            self._pid = os.getpid()
+
+        return self._session
+
+    def retry_delay(self, attempt, response=None):
+        """
+        Seconds to wait before retrying, the response's Retry-After when it sends one
+        :param attempt: 0 for the first retry
+        :param response: the response retried, None after a connection error
+        :return: float
+        """
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+
+        if retry_after is not None and retry_after.strip().isdigit():
+            return float(retry_after)
+
+        return self.backoff * (2 ** attempt)
+
+    def get(self, url, **kwargs):
+        """
+        Rate limited GET through the shared session, connection errors,
+        timeouts and RETRY_STATUSES are retried up to retries times
+        :param url:
+        :return: requests.Response, the last one when every retry failed
+        """
+        host = urlsplit(url).netloc
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+
+        while True:
+            self.limiter.wait(host)
+
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+                response = None
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+                response.close()
+
+            time.sleep(self.retry_delay(attempt, response))
+            attempt += 1
+
+    def get_many(self, requests_kwargs):
+        """
+        Run many GETs at once on a thread pool, rate limited per host
+        :param requests_kwargs: list of dicts of get() arguments, each with a url
+        :return: list of responses in input order, a failed request
+                 is returned as its exception instead
+        """
+        # build the session before the threads race for it
+        self.session
+
+        def fetch(kwargs):
+            try:
+                return self.get(**kwargs)
+            except requests.RequestException as err:
+                return err
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(fetch, requests_kwargs))
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
@@ -1,5 +1,11 @@
+import os
+import aumbry
 from aumbry import Attr, YamlConfig
 
+# config/config.yaml at the repo root, override with PROSPECTOR_CONFIG
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'config', 'config.yaml')
+
 
 class DatabaseConfig(YamlConfig):
     """
@@ -8,9 +14,96 @@ class DatabaseConfig(YamlConfig):
     """
     __mapping__ = {
         'connection': Attr('connection', str),
+        'pool_size': Attr('pool_size', int),
+        'max_overflow': Attr('max_overflow', int),
+        'pool_recycle': Attr('pool_recycle', int),
+        'pool_timeout': Attr('pool_timeout', int),
+        'pool_pre_ping': Attr('pool_pre_ping', bool),
     }
 
     connection = ''
+    pool_size = 5
+    max_overflow = 10
+    pool_recycle = 3600
+    pool_timeout = 30
+    pool_pre_ping = True
+
+
+class TasksConfig(YamlConfig):
+    """
+    Map the Celery task tuning knobs to our application
+    from the YAML config file
+    """
+    __mapping__ = {
+        'zipcode_chunk_size': Attr('zipcode_chunk_size', int),
+        'zipcode_max_distance_km': Attr('zipcode_max_distance_km', float),
+        'geoip_cache_size': Attr('geoip_cache_size', int),
+        'owner_lookup_url': Attr('owner_lookup_url', str),
+        'http_timeout': Attr('http_timeout', float),
+        'http_retries': Attr('http_retries', int),
+        'http_rate_limit': Attr('http_rate_limit', float),
+        'http_workers': Attr('http_workers', int),
+        'stats_redis_url': Attr('stats_redis_url', str),
+        'claim_lease_seconds': Attr('claim_lease_seconds', int),
+        'lookup_cache_url': Attr('lookup_cache_url', str),
+        'lookup_cache_ttl': Attr('lookup_cache_ttl', int),
+        'lookup_cache_negative_ttl': Attr('lookup_cache_negative_ttl', int),
+        'lookup_cache_local_ttl': Attr('lookup_cache_local_ttl', int),
+    }
+
+    zipcode_chunk_size = 250
+    # addresses farther than this from every zip code centroid get no code
+    zipcode_max_distance_km = 25.0
+    # per-process entries of the lookup cache: GeoIP, reverse geocode and zip code lookups
+    geoip_cache_size = 100000
+    owner_lookup_url = 'https://www.melissa.com/lookups/addresscheck.asp'
+    http_timeout = 15.0
+    http_retries = 3
+    http_rate_limit = 2.0
+    http_workers = 8
+    stats_redis_url = 'redis://localhost:6379/0'
+    claim_lease_seconds = 600
+    # Redis shared by every worker process, empty keeps lookups in process
+    lookup_cache_url = ''
+    lookup_cache_ttl = 86400
+    # lookups that found nothing
+    lookup_cache_negative_ttl = 3600
+    # local entries are dropped sooner so every process sees the shared tier
+    lookup_cache_local_ttl = 300
+
+
+class CacheConfig(YamlConfig):
+    """
+    Map the response cache settings to our application
+    from the YAML config file
+    """
+    __mapping__ = {
+        'ttl': Attr('ttl', int),
+        'maxsize': Attr('maxsize', int),
+        'redis_url': Attr('redis_url', str),
+    }
+
+    ttl = 60
+    maxsize = 10000
+    redis_url = ''
+
+
+class ServerConfig(YamlConfig):
+    """
+    Map the serving mode to our application
+    from the YAML config file
+    """
+    __mapping__ = {
+        'mode': Attr('mode', str),
+        'async_worker_class': Attr('async_worker_class', str),
+        'json_library': Attr('json_library', str),
+    }
+
+    # sync: WSGI app on sync gunicorn workers, async: ASGI app on async_worker_class
+    mode = 'sync'
+    async_worker_class = 'uvicorn.workers.UvicornWorker'
+    # auto, orjson or json, auto uses orjson when it is installed
+    json_library = 'auto'
 
 
 class AppConfig(YamlConfig):
@@ -19,9 +112,30 @@ class AppConfig(YamlConfig):
     """
     __mapping__ = {
         'db': Attr('db', DatabaseConfig),
-        'gunicorn': Attr('gunicorn', dict)
+        'gunicorn': Attr('gunicorn', dict),
+        'tasks': Attr('tasks', TasksConfig),
+        'cache': Attr('cache', CacheConfig),
+        'server': Attr('server', ServerConfig)
     }
 
     def __init__(self):
         self.db = DatabaseConfig()
         self.gunicorn = {}
+        self.tasks = TasksConfig()
+        self.cache = CacheConfig()
+        self.server = ServerConfig()
+
+
+def load_config(path=None):
+    """
+    Load the application config, independent of the working directory
+    :param path: config file, defaults to PROSPECTOR_CONFIG or config/config.yaml
+    :return: AppConfig
+    """
+    return aumbry.load(
+        aumbry.FILE,
+        AppConfig,
+        {
+            'CONFIG_FILE_PATH': path or os.environ.get('PROSPECTOR_CONFIG', DEFAULT_CONFIG_PATH)
+        }
+    )
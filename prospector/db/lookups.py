@@ -0,0 +1,270 @@
+import time
+from bisect import bisect_left
+from prospector.db.models import ZipCode
+from prospector.db.spatial import EARTH_RADIUS_KM
+from prospector.normalize import normalize_region
+
+
+def refresh_index(index, session):
+    """
+    Reload a zip code index when the zipcodes table has changed
+    The table signature is checked at most once every index.max_age seconds
+    :param index: ZipCodeIndex or ZipCentroidIndex
+    :param session:
+    :return: bool: reloaded
+    """
+    if index.signature is not None and time.time() - index.checked < index.max_age:
+        return False
+
+    index.checked = time.time()
+
+    if index.signature is not None and ZipCode.get_signature(session) == index.signature:
+        return False
+
+    index.load(session)
+    return True
+
+
+class TableSignature(object):
+    """
+    Signature of the zipcodes table, read at most once every max_age seconds
+    Lets a worker notice table changes without loading an index
+    :return signature
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self.value = None
+        self.checked = 0
+
+    def get(self, session):
+        if self.value is None or time.time() - self.checked >= self.max_age:
+            self.value = ZipCode.get_signature(session)
+            self.checked = time.time()
+
+        return self.value
+
+
+class ZipCodeIndex(object):
+    """
+    Worker-local zip code lookup built once from the zipcodes table
+    Gives the same result as ZipCode.query_for_code without a DB round trip.
+    States are compared normalized, so case doesn't matter like under MySQL's
+    collation, and a state code finds its state name. The last max_memo
+    lookups are remembered
+    :return index
+    """
+
+    def __init__(self, max_age=300, max_memo=100000):
+        self.max_age = max_age
+        self.max_memo = max_memo
+        self.signature = None
+        self.checked = 0
+        self._cities = {}
+        self._entries = {}
+        self._memo = {}
+
+    def __len__(self):
+        return sum(len(cities) for cities in self._cities.values())
+
+    def load(self, session):
+        """
+        Build the per-state sorted city index from the zipcodes table
+        :param session:
+        :return: none
+        """
+        signature = ZipCode.get_signature(session)
+        entries = {}
+
+        for row in ZipCode.get_index_rows(session):
+            entries.setdefault(normalize_region(row.state), []).append(
+                (row.city_name.lower(), row.id, row.postal_code)
+            )
+
+        for state_entries in entries.values():
+            state_entries.sort()
+
+        self._entries = entries
+        self._cities = dict(
+            (state, [entry[0] for entry in state_entries])
+            for state, state_entries in entries.items()
+        )
+        self._memo = {}
+        self.signature = signature
+        self.checked = time.time()
+
+    def refresh(self, session):
+        """
+        Reload the index when the zipcodes table has changed, see refresh_index
+        :return: bool: reloaded
+        """
+        return refresh_index(self, session)
+
+    def lookup(self, city, state):
+        """
+        Prefix match a city within a state, like LIKE 'city%'
+        The lowest zipcodes.id wins when several cities share the prefix
+        :param city:
+        :param state:
+        :return: postal code or None
+        """
+        key = (city, state)
+
+        if key in self._memo:
+            return self._memo[key]
+
+        code = None
+        region = normalize_region(state)
+        cities = self._cities.get(region)
+
+        if cities and city:
+            prefix = city.lower()
+            lo = bisect_left(cities, prefix)
+            hi = bisect_left(cities, prefix + u'￿', lo)
+
+            if lo < hi:
+                code = min(self._entries[region][lo:hi], key=lambda entry: entry[1])[2]
+
+        if len(self._memo) >= self.max_memo:
+            self._memo.clear()
+
+        self._memo[key] = code
+        return code
+
+
+def unit_vectors(lats, lons):
+    """
+    Points on the unit sphere, straight line distance between them grows
+    with the great circle distance
+    :param lats: array of degrees
+    :param lons: array of degrees
+    :return: array of shape (n, 3)
+    """
+    import numpy as np
+    phi = np.radians(lats)
+    lam = np.radians(lons)
+    cos_phi = np.cos(phi)
+    return np.column_stack((cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)))
+
+
+def chord_to_km(chords):
+    import numpy as np
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chords / 2, 1.0))
+
+
+def km_to_chord(km):
+    import numpy as np
+    return 2 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+class ZipCentroidIndex(object):
+    """
+    Worker-local nearest zip code by coordinates
+    A KD-tree over the zip code centroids, queried for whole batches of
+    points at once. Confidence is the margin of the nearest centroid over
+    the second nearest, scaled down linearly to 0 at max_distance_km.
+    numpy and scipy are imported on first use, importing prospector.tasks
+    doesn't pay for them
+    :return index
+    """
+
+    def __init__(self, max_age=300, max_distance_km=25.0):
+        self.max_age = max_age
+        self.signature = None
+        self.checked = 0
+        self.max_distance_km = max_distance_km
+        self._codes = []
+        self._tree = None
+
+    def __len__(self):
+        return len(self._codes)
+
+    def load(self, session):
+        """
+        Build the KD-tree from the zipcodes table
+        :param session:
+        :return: none
+        """
+        import numpy as np
+        from scipy.spatial import cKDTree
+        signature = ZipCode.get_signature(session)
+        rows = ZipCode.get_centroid_rows(session)
+        points = np.array([(row.latitude, row.longitude) for row in rows], dtype=float).reshape(-1, 2)
+
+        self._codes = [row.postal_code for row in rows]
+        self._tree = cKDTree(unit_vectors(points[:, 0], points[:, 1])) if rows else None
+        self.signature = signature
+        self.checked = time.time()
+
+    def refresh(self, session):
+        """
+        Reload the index when the zipcodes table has changed, see refresh_index
+        :return: bool: reloaded
+        """
+        return refresh_index(self, session)
+
+    def nearest(self, lats, lons, max_distance_km=None):
+        """
+        Nearest zip code of every point
+        :param lats: sequence of degrees, None or NaN where unknown
+        :param lons: sequence of degrees, None or NaN where unknown
+        :param max_distance_km: no code past this distance, defaults to max_distance_km
+        :return: tuple: (list of postal code or None, array of km, array of confidence)
+        """
+        import numpy as np
+
+        if max_distance_km is None:
+            max_distance_km = self.max_distance_km
+
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        count = len(lats)
+        codes = [None] * count
+        distances = np.full(count, np.inf)
+        confidences = np.zeros(count)
+        valid = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons) & (np.abs(lats) <= 90) & (np.abs(lons) <= 180))
+
+        if self._tree is None or not len(valid):
+            return codes, distances, confidences
+
+        chords, found = self._tree.query(
+            unit_vectors(lats[valid], lons[valid]),
+            k=2 if len(self._codes) > 1 else 1,
+            distance_upper_bound=km_to_chord(max_distance_km) * (1 + 1e-9)
+        )
+        chords = chords.reshape(len(valid), -1)
+        found = found.reshape(len(valid), -1)
+
+        nearest_km = chord_to_km(chords[:, 0])
+        second_km = chord_to_km(chords[:, 1]) if chords.shape[1] > 1 else np.full(len(valid), np.inf)
+        hit = found[:, 0] < len(self._codes)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            margin = np.where(second_km > 0, 1 - nearest_km / second_km, 0.0)
+            closeness = 1 - nearest_km / max_distance_km if max_distance_km > 0 else np.zeros(len(valid))
+
+        distances[valid] = np.where(hit, nearest_km, np.inf)
+        confidences[valid] = np.where(hit, np.clip(margin * closeness, 0.0, 1.0), 0.0)
+
+        for position, index, is_hit in zip(valid.tolist(), found[:, 0].tolist(), hit.tolist()):
+            if is_hit:
+                codes[position] = self._codes[index]
+
+        return codes, distances, confidences
+
+    def assign(self, rows, max_distance_km=None):
+        """
+        Nearest zip code of a batch of addresses in one query
+        :param rows: sequence with id, lat and lon
+        :param max_distance_km: see nearest()
+        :return: dict: addr_pk_id -> (postal code, confidence), addresses without a code are left out
+        """
+        codes, distances, confidences = self.nearest(
+            [row.lat for row in rows], [row.lon for row in rows], max_distance_km
+        )
+
+        return dict(
+            (row.id, (code, round(confidence, 3)))
+            for row, code, confidence in zip(rows, codes, confidences.tolist())
+            if code is not None
+        )
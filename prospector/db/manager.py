@@ -1,21 +1,88 @@
+import os
+import time
 import sqlalchemy
-from sqlalchemy import orm
+from sqlalchemy import event, exc, orm, pool
 from sqlalchemy.orm import scoping
 from prospector.db import models
 
 
+class TimedQueuePool(pool.QueuePool):
+    """
+    QueuePool that records how long checkouts wait for a connection
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+        self.on_wait = None
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_count += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+            if self.on_wait is not None:
+                self.on_wait(waited)
+
+    def recreate(self):
+        new_pool = super(TimedQueuePool, self).recreate()
+        new_pool.on_wait = self.on_wait
+        return new_pool
+
+
+def _tag_connection(dbapi_connection, connection_record):
+    connection_record.info['pid'] = os.getpid()
+
+
+def _check_connection_pid(dbapi_connection, connection_record, connection_proxy):
+    # a connection opened before a fork belongs to the parent, never reuse it
+    pid = os.getpid()
+
+    if connection_record.info['pid'] != pid:
+        connection_record.dbapi_connection = connection_proxy.dbapi_connection = None
+        raise exc.DisconnectionError(
+            'Connection record belongs to pid {}, attempting to check out in pid {}'.format(
+                connection_record.info['pid'], pid
+            )
+        )
+
+
 class DBManager(object):
     """
     DB Connection Class
     :return db connection/session
     """
 
-    def __init__(self, connection=None):
+    def __init__(self, connection=None, pool_size=5, max_overflow=10, pool_recycle=3600, pool_timeout=30,
+                 pool_pre_ping=True):
         self.connection = connection
+        options = {'pool_pre_ping': pool_pre_ping}
+
+        # SQLite uses its own single connection or null pools
+        if not self.connection.startswith('sqlite'):
+            options.update({
+                'poolclass': TimedQueuePool,
+                'pool_size': pool_size,
+                'max_overflow': max_overflow,
+                'pool_recycle': pool_recycle,
+                'pool_timeout': pool_timeout
+            })
+
         self.engine = sqlalchemy.create_engine(
             self.connection,
-            pool_pre_ping=True
+            **options
         )
+        event.listen(self.engine, 'connect', _tag_connection)
+        event.listen(self.engine, 'checkout', _check_connection_pid)
+
         self.DBSession = scoping.scoped_session(
             orm.sessionmaker(
                 bind=self.engine,
@@ -24,10 +91,64 @@ class DBManager(object):
             )
         )
 
+    @classmethod
+    def from_config(cls, db_cfg):
+        """
+        :param db_cfg: DatabaseConfig
+        :return: DBManager
+        """
+        return cls(
+            db_cfg.connection,
+            pool_size=db_cfg.pool_size,
+            max_overflow=db_cfg.max_overflow,
+            pool_recycle=db_cfg.pool_recycle,
+            pool_timeout=db_cfg.pool_timeout,
+            pool_pre_ping=db_cfg.pool_pre_ping
+        )
+
     @property
     def session(self):
         return self.DBSession()
 
+    def after_fork(self):
+        """
+        Give a forked worker its own pool, call it first thing in the child
+        The parent's connections are left open for the parent
+        :return: none
+        """
+        self.DBSession.remove()
+
+        try:
+            self.engine.dispose(close=False)
+        except TypeError:
+            # SQLAlchemy < 1.4.33, the checkout pid guard discards the parent's connections
+            pass
+
+    def pool_stats(self):
+        """
+        Connection pool statistics for monitoring
+        :return: dict
+        """
+        engine_pool = self.engine.pool
+        stats = {'pool': type(engine_pool).__name__}
+
+        if isinstance(engine_pool, pool.QueuePool):
+            stats.update({
+                'size': engine_pool.size(),
+                'checked_in': engine_pool.checkedin(),
+                'checked_out': engine_pool.checkedout(),
+                'overflow': engine_pool.overflow()
+            })
+
+        if isinstance(engine_pool, TimedQueuePool):
+            stats.update({
+                'wait_count': engine_pool.wait_count,
+                'wait_total_s': engine_pool.wait_total,
+                'wait_max_s': engine_pool.wait_max
+            })
+
+        return stats
+
     def setup(self):
         """
         Database setup code here
@@ -0,0 +1,323 @@
+"""
+Bring existing tables up to date with the models
+
+ip-packed                    add ipaddress.ip_packed and backfill it from ip
+address-claims               add the address lease columns and claim index
+address-geohash              add address.geohash and backfill it from lat and lon
+address-postcode-confidence  add address.postcode_confidence
+address-postcode-nullable    let address.postcode hold NULL, for ingested rows without one
+address-fingerprint          add address.fingerprint and backfill it from the address fields
+match-links                  add the match_links table and the zip code indexes it blocks on
+
+Usage:
+    migrations.py ip-packed [--config=<path>] [--batch-size=<n>]
+    migrations.py address-claims [--config=<path>]
+    migrations.py address-geohash [--config=<path>] [--batch-size=<n>]
+    migrations.py address-postcode-confidence [--config=<path>]
+    migrations.py address-postcode-nullable [--config=<path>]
+    migrations.py address-fingerprint [--config=<path>] [--batch-size=<n>]
+    migrations.py match-links [--config=<path>]
+
+Options:
+    --config=<path>     Config file, defaults to PROSPECTOR_CONFIG or config/config.yaml
+    --batch-size=<n>    Rows backfilled per transaction [default: 10000]
+"""
+
+import sqlalchemy as sa
+from docopt import docopt
+from prospector.config import load_config
+from prospector.db.manager import DBManager
+from prospector.db.models import ADDRESS_FINGERPRINT_FIELDS, Address, IPAddress, MatchLink, Person
+from prospector.db.spatial import geohash_encode
+from prospector.normalize import address_fingerprint
+from prospector.db.types import pack_ip
+
+
+def add_ip_packed_column(mgr):
+    """
+    Add ip_packed and its index, and widen ip for IPv6 text
+    Safe to run more than once
+    :param mgr: DBManager
+    :return: none
+    """
+    inspector = sa.inspect(mgr.engine)
+    columns = [col['name'] for col in inspector.get_columns(IPAddress.__tablename__)]
+
+    if 'ip_packed' in columns:
+        return
+
+    with mgr.engine.begin() as conn:
+        conn.execute(sa.text('ALTER TABLE ipaddress ADD COLUMN ip_packed VARBINARY(16)'))
+        conn.execute(sa.text('CREATE INDEX ix_ipaddress_ip_packed ON ipaddress (ip_packed)'))
+
+        if mgr.engine.dialect.name == 'mysql':
+            conn.execute(sa.text('ALTER TABLE ipaddress MODIFY ip VARCHAR(45)'))
+
+
+def backfill_ip_packed(mgr, batch_size=10000):
+    """
+    Pack the text ip of every row missing ip_packed, batch_size rows at a time
+    :param mgr: DBManager
+    :param batch_size:
+    :return: int: rows backfilled
+    """
+    table = IPAddress.__table__
+    stmt = table.update().where(
+        table.c.id == sa.bindparam('ip_pk_id')
+    ).values(ip_packed=sa.bindparam('packed', type_=table.c.ip_packed.type))
+    after = 0
+    total = 0
+
+    while True:
+        with mgr.engine.begin() as conn:
+            rows = conn.execute(
+                sa.select(table.c.id, table.c.ip).where(
+                    sa.and_(table.c.id > after, table.c.ip_packed.is_(None))
+                ).order_by(table.c.id).limit(batch_size)
+            ).fetchall()
+
+            if not rows:
+                break
+
+            valid = []
+            for row in rows:
+                try:
+                    pack_ip((row.ip or '').strip())
+                    valid.append({'ip_pk_id': row.id, 'packed': row.ip.strip()})
+                except ValueError:
+                    print('Skipping invalid ip on row {}'.format(row.id))
+
+            if valid:
+                conn.execute(stmt, valid)
+
+        after = rows[-1].id
+        total += len(valid)
+        print('Backfilled {} rows'.format(total))
+
+    return total
+
+
+def add_address_claim_columns(mgr):
+    """
+    Add claimed_until, claim_token and the composite claim index
+    Safe to run more than once
+    :param mgr: DBManager
+    :return: none
+    """
+    inspector = sa.inspect(mgr.engine)
+    columns = [col['name'] for col in inspector.get_columns(Address.__tablename__)]
+
+    if 'claimed_until' in columns:
+        return
+
+    with mgr.engine.begin() as conn:
+        conn.execute(sa.text('ALTER TABLE address ADD COLUMN claimed_until DATETIME'))
+        conn.execute(sa.text('ALTER TABLE address ADD COLUMN claim_token VARCHAR(32)'))
+        conn.execute(sa.text(
+            'CREATE INDEX ix_address_claim ON address (processed, postcode, claimed_until)'
+        ))
+
+
+def add_address_geohash_column(mgr):
+    """
+    Add geohash and its index to address
+    Safe to run more than once
+    :param mgr: DBManager
+    :return: none
+    """
+    inspector = sa.inspect(mgr.engine)
+    columns = [col['name'] for col in inspector.get_columns(Address.__tablename__)]
+
+    if 'geohash' in columns:
+        return
+
+    with mgr.engine.begin() as conn:
+        conn.execute(sa.text('ALTER TABLE address ADD COLUMN geohash VARCHAR(12)'))
+        conn.execute(sa.text('CREATE INDEX ix_address_geohash ON address (geohash)'))
+
+
+def backfill_address_geohash(mgr, batch_size=10000):
+    """
+    Geohash every located address missing one, batch_size rows at a time
+    :param mgr: DBManager
+    :param batch_size:
+    :return: int: rows backfilled
+    """
+    table = Address.__table__
+    stmt = table.update().where(
+        table.c.id == sa.bindparam('addr_pk_id')
+    ).values(geohash=sa.bindparam('code'))
+    after = 0
+    total = 0
+
+    while True:
+        with mgr.engine.begin() as conn:
+            rows = conn.execute(
+                sa.select(table.c.id, table.c.lat, table.c.lon).where(
+                    sa.and_(table.c.id > after, table.c.geohash.is_(None),
+                            table.c.lat.isnot(None), table.c.lon.isnot(None))
+                ).order_by(table.c.id).limit(batch_size)
+            ).fetchall()
+
+            if not rows:
+                break
+
+            conn.execute(stmt, [
+                {'addr_pk_id': row.id, 'code': geohash_encode(row.lat, row.lon)}
+                for row in rows
+            ])
+
+        after = rows[-1].id
+        total += len(rows)
+        print('Backfilled {} rows'.format(total))
+
+    return total
+
+
+def add_address_postcode_confidence_column(mgr):
+    """
+    Add postcode_confidence to address
+    Safe to run more than once
+    :param mgr: DBManager
+    :return: none
+    """
+    inspector = sa.inspect(mgr.engine)
+    columns = [col['name'] for col in inspector.get_columns(Address.__tablename__)]
+
+    if 'postcode_confidence' in columns:
+        return
+
+    with mgr.engine.begin() as conn:
+        conn.execute(sa.text('ALTER TABLE address ADD COLUMN postcode_confidence FLOAT'))
+
+
+def make_address_postcode_nullable(mgr):
+    """
+    Drop the NOT NULL of address.postcode
+    Safe to run more than once
+    :param mgr: DBManager
+    :return: none
+    """
+    inspector = sa.inspect(mgr.engine)
+    columns = dict((col['name'], col) for col in inspector.get_columns(Address.__tablename__))
+
+    if columns['postcode']['nullable']:
+        return
+
+    with mgr.engine.begin() as conn:
+        if mgr.engine.dialect.name == 'mysql':
+            conn.execute(sa.text('ALTER TABLE address MODIFY postcode VARCHAR(10) NULL'))
+        else:
+            conn.execute(sa.text('ALTER TABLE address ALTER COLUMN postcode DROP NOT NULL'))
+
+
+def add_address_fingerprint_column(mgr):
+    """
+    Add fingerprint and its index to address
+    Safe to run more than once
+    :param mgr: DBManager
+    :return: none
+    """
+    inspector = sa.inspect(mgr.engine)
+    columns = [col['name'] for col in inspector.get_columns(Address.__tablename__)]
+
+    if 'fingerprint' in columns:
+        return
+
+    with mgr.engine.begin() as conn:
+        conn.execute(sa.text('ALTER TABLE address ADD COLUMN fingerprint VARCHAR(32)'))
+        conn.execute(sa.text('CREATE INDEX ix_address_fingerprint ON address (fingerprint)'))
+
+
+def backfill_address_fingerprint(mgr, batch_size=10000):
+    """
+    Fingerprint every address missing one, batch_size rows at a time
+    :param mgr: DBManager
+    :param batch_size:
+    :return: int: rows backfilled
+    """
+    table = Address.__table__
+    stmt = table.update().where(
+        table.c.id == sa.bindparam('addr_pk_id')
+    ).values(fingerprint=sa.bindparam('code'))
+    fields = [table.c[name] for name in ADDRESS_FINGERPRINT_FIELDS]
+    after = 0
+    total = 0
+
+    while True:
+        with mgr.engine.begin() as conn:
+            rows = conn.execute(
+                sa.select(table.c.id, *fields).where(
+                    sa.and_(table.c.id > after, table.c.fingerprint.is_(None))
+                ).order_by(table.c.id).limit(batch_size)
+            ).fetchall()
+
+            if not rows:
+                break
+
+            conn.execute(stmt, [
+                {'addr_pk_id': row.id, 'code': address_fingerprint(*row[1:])}
+                for row in rows
+            ])
+
+        after = rows[-1].id
+        total += len(rows)
+        print('Backfilled {} rows'.format(total))
+
+    return total
+
+
+def add_match_links(mgr):
+    """
+    Create match_links and index the zip code columns of persons, address and ipaddress
+    Safe to run more than once
+    :param mgr: DBManager
+    :return: none
+    """
+    MatchLink.__table__.create(mgr.engine, checkfirst=True)
+    inspector = sa.inspect(mgr.engine)
+
+    for name, table, column in (('ix_persons_zip_code', Person.__tablename__, 'zip_code'),
+                                ('ix_address_postcode', Address.__tablename__, 'postcode'),
+                                ('ix_ipaddress_postal_code', IPAddress.__tablename__, 'postal_code')):
+        if name in [index['name'] for index in inspector.get_indexes(table)]:
+            continue
+
+        with mgr.engine.begin() as conn:
+            conn.execute(sa.text('CREATE INDEX {} ON {} ({})'.format(name, table, column)))
+
+
+def main():
+    args = docopt(__doc__)
+
+    cfg = load_config(args['--config'])
+
+    mgr = DBManager.from_config(cfg.db)
+
+    if args['ip-packed']:
+        add_ip_packed_column(mgr)
+        backfill_ip_packed(mgr, int(args['--batch-size']))
+
+    if args['address-claims']:
+        add_address_claim_columns(mgr)
+
+    if args['address-geohash']:
+        add_address_geohash_column(mgr)
+        backfill_address_geohash(mgr, int(args['--batch-size']))
+
+    if args['address-postcode-confidence']:
+        add_address_postcode_confidence_column(mgr)
+
+    if args['address-postcode-nullable']:
+        make_address_postcode_nullable(mgr)
+
+    if args['address-fingerprint']:
+        add_address_fingerprint_column(mgr)
+        backfill_address_fingerprint(mgr, int(args['--batch-size']))
+
+    if args['match-links']:
+        add_match_links(mgr)
+
+
+if __name__ == '__main__':
+    main()
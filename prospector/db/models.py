@@ -1,14 +1,191 @@
 import sqlalchemy as sa
+from collections import namedtuple
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
-from datetime import datetime
+from datetime import datetime, timedelta
+import ipaddress
 import secrets
+import uuid
 from werkzeug.security import generate_password_hash, check_password_hash
+from prospector.db.types import PackedIP, ip_bounds
+from prospector.db import spatial
+from prospector.normalize import address_fingerprint, normalize_postcode
+from prospector.serializers import Serializer
 
 SAModel = declarative_base()
 
+ADDRESS_FINGERPRINT_FIELDS = ('number', 'street', 'unit', 'city', 'region', 'postcode')
 
-class User(SAModel):
+
+def point_geohash(context):
+    """
+    Column default geohash of the lat and lon being inserted
+    """
+    params = context.get_current_parameters()
+    return spatial.geohash_encode(params.get('lat'), params.get('lon'))
+
+
+def row_fingerprint(context):
+    """
+    Column default address fingerprint of the fields being inserted
+    """
+    params = context.get_current_parameters()
+    return address_fingerprint(*[params.get(name) for name in ADDRESS_FINGERPRINT_FIELDS])
+
+
+class SerializeMixin(object):
+    """
+    as_dict and a precompiled serializer built from serialize_fields,
+    a sequence of (output key, attribute name)
+    :return dict
+    """
+    serialize_fields = ()
+
+    @classmethod
+    def serializer(cls):
+        if '_serializer' not in cls.__dict__:
+            cls._serializer = Serializer(cls.serialize_fields)
+
+        return cls._serializer
+
+    @property
+    def as_dict(self):
+        return self.serializer().to_dict(self)
+
+
+class RowsMixin(object):
+    """
+    Read only queries on SQLAlchemy Core
+    Rows are namedtuples of just the selected columns, nothing is loaded
+    into the session identity map. Columns default to row_columns, or the
+    attributes of serialize_fields
+    :return rows
+    """
+    row_columns = None
+
+    @classmethod
+    def default_row_columns(cls):
+        return tuple(cls.row_columns or [attr for key, attr in getattr(cls, 'serialize_fields', ())])
+
+    @classmethod
+    def row_type(cls, columns):
+        if '_row_types' not in cls.__dict__:
+            cls._row_types = {}
+
+        if columns not in cls._row_types:
+            cls._row_types[columns] = namedtuple('{}Row'.format(cls.__name__), columns)
+
+        return cls._row_types[columns]
+
+    @classmethod
+    def row_query(cls, columns=None, filters=(), limit=None):
+        """
+        :return: tuple: (select statement, namedtuple type)
+        """
+        columns = tuple(columns or cls.default_row_columns())
+        query = sa.select(*[cls.__table__.c[name] for name in columns]).where(*filters)
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        return query, cls.row_type(columns)
+
+    @classmethod
+    def select_rows(cls, session, filters=(), columns=None, order_by=None, limit=None):
+        """
+        :param session:
+        :param filters: filter criteria
+        :param columns: column names, defaults to default_row_columns()
+        :param order_by: order criteria
+        :param limit:
+        :return: list of namedtuples
+        """
+        rows = []
+        query, row_type = cls.row_query(columns, filters, limit)
+
+        if order_by is not None:
+            query = query.order_by(order_by)
+
+        with session.begin():
+            rows = list(map(row_type._make, session.execute(query)))
+
+        return rows
+
+    @classmethod
+    def select_row(cls, session, filters=(), columns=None):
+        rows = cls.select_rows(session, filters, columns, limit=1)
+        return rows[0] if rows else None
+
+
+class KeysetMixin(RowsMixin):
+    """
+    Keyset pagination on the primary key
+    :return models
+    """
+
+    @classmethod
+    def get_page(cls, session, after=None, limit=100, filters=()):
+        models = []
+        with session.begin():
+            query = session.query(cls).filter(*filters)
+            if after is not None:
+                query = query.filter(cls.id > after)
+            models = query.order_by(cls.id).limit(limit).all()
+
+        return models
+
+    @classmethod
+    def get_page_rows(cls, session, after=None, limit=100, filters=(), columns=None):
+        """
+        get_page as read only rows, see RowsMixin
+        :return: list of namedtuples
+        """
+        if after is not None:
+            filters = tuple(filters) + (cls.id > after,)
+
+        return cls.select_rows(session, filters, columns, order_by=cls.id, limit=limit)
+
+    @classmethod
+    def iter_rows(cls, session, after=None, limit=None, batch_size=1000, filters=(), columns=None):
+        """
+        Yield read only rows a keyset page of batch_size rows at a time
+        Every page is its own query and transaction, so memory stays flat
+        with any driver, server-side cursors or not
+        :param session:
+        :param after: only rows with id > after
+        :param limit: stop after this many rows, None for all
+        :param batch_size:
+        :param filters: extra filter criteria
+        :param columns: column names, see RowsMixin
+        :return: generator of namedtuples
+        """
+        columns = tuple(columns or cls.default_row_columns())
+        # the page boundary needs id, selected last when the caller doesn't want it
+        selected = columns if 'id' in columns else columns + ('id',)
+        id_index = selected.index('id')
+        row_type = cls.row_type(columns)
+        remaining = limit
+
+        while remaining is None or remaining > 0:
+            page_filters = tuple(filters) + ((cls.id > after,) if after is not None else ())
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            query, _ = cls.row_query(selected, page_filters, size)
+
+            with session.begin():
+                rows = session.execute(query.order_by(cls.id)).fetchall()
+
+            for row in rows:
+                yield row_type._make(row[:len(columns)])
+
+            if len(rows) < size:
+                return
+
+            after = rows[-1][id_index]
+            if remaining is not None:
+                remaining -= len(rows)
+
+
+class User(SerializeMixin, SAModel):
     """
     The Company User Class
     """
@@ -22,6 +199,11 @@ class User(SAModel):
     token = sa.Column(sa.String(1024), unique=True)
     last_login = sa.Column(sa.DateTime, nullable=False, onupdate=datetime.now)
 
+    serialize_fields = (
+        ('username', 'username'),
+        ('company', 'company')
+    )
+
     def __init__(self, username, password, company_id):
         self.username = username
         self.set_password(password)
@@ -31,12 +213,6 @@ class User(SAModel):
     def set_password(self, password):
         self.pw_hash = generate_password_hash(password)
 
-    def as_dict(self):
-        return {
-            'username': self.username,
-            'company': self.company
-        }
-
     @classmethod
     def get_user_list(cls, session):
         models = []
@@ -55,7 +231,7 @@ class User(SAModel):
         self.token = secrets.token_urlsafe(1024)
 
 
-class Company(SAModel):
+class Company(KeysetMixin, SerializeMixin, SAModel):
     """
     The Company Class
     """
@@ -76,6 +252,14 @@ class Company(SAModel):
     subscription_status = sa.Column(sa.String(20), nullable=False, default='ACTIVE')
     subscription_date = sa.Column(sa.DateTime, onupdate=datetime.now)
 
+    serialize_fields = (
+        ('id', 'id'),
+        ('company', 'name'),
+        ('city', 'city'),
+        ('state', 'state'),
+        ('postal_code', 'zip_code')
+    )
+
     def __init__(self, name, address, city, state, zip_code,
                  sub_type, status):
         self.name = name
@@ -93,16 +277,6 @@ class Company(SAModel):
                 self.state
             )
 
-    @property
-    def as_dict(self):
-        return {
-            'id': self.id,
-            'company': self.name,
-            'city': self.city,
-            'state': self.state,
-            'postal_code': self.zip_code
-        }
-
     def save(self, session):
         with session.begin():
             session.add(self)
@@ -118,7 +292,7 @@ class Company(SAModel):
         return models
 
 
-class IPAddress(SAModel):
+class IPAddress(KeysetMixin, SerializeMixin, SAModel):
     """
     The IPAddress Class
     :return ip_address
@@ -128,7 +302,8 @@ class IPAddress(SAModel):
 
     id = sa.Column(sa.Integer, primary_key=True)
     created_date = sa.Column(sa.DateTime, onupdate=datetime.now)
-    ip = sa.Column(sa.String(15), index=True)
+    ip = sa.Column(sa.String(45))
+    ip_packed = sa.Column(PackedIP, index=True)
     city = sa.Column(sa.String(255))
     time_zone = sa.Column(sa.String(50))
     longitude = sa.Column(sa.String(50))
@@ -136,35 +311,44 @@ class IPAddress(SAModel):
     metro_code = sa.Column(sa.String(3))
     dma_code = sa.Column(sa.String(3))
     area_code = sa.Column(sa.String(3))
-    postal_code = sa.Column(sa.String(10))
+    postal_code = sa.Column(sa.String(10), index=True)
     region = sa.Column(sa.String(255))
     region_name = sa.Column(sa.String(255))
 
+    serialize_fields = (
+        ('id', 'id'),
+        ('ip', 'ip'),
+        ('city', 'city'),
+        ('metro_code', 'metro_code'),
+        ('dma_code', 'dma_code'),
+        ('postal_code', 'postal_code'),
+        ('region_name', 'region_name'),
+        ('latitude', 'latitude'),
+        ('longitude', 'longitude')
+    )
+
     def __init__(self, created_date, ip, city, time_zone, longitude, latitude,
                  metro_code, dma_code, area_code, postal_code, region, region_name):
 
         self.created_date = created_date
         self.ip = ip
+        self.ip_packed = ip
+        self.city = city
+        self.time_zone = time_zone
+        self.longitude = longitude
+        self.latitude = latitude
+        self.metro_code = metro_code
+        self.dma_code = dma_code
+        self.area_code = area_code
+        self.postal_code = postal_code
+        self.region = region
+        self.region_name = region_name
 
     def __repr__(self):
         return '{}'.format(
             self.ip
         )
 
-    @property
-    def as_dict(self):
-        return {
-            'id': self.id,
-            'ip': self.ip,
-            'city': self.city,
-            'metro_code': self.metro_code,
-            'dma_code': self.dma_code,
-            'postal_code': self.postal_code,
-            'region_name': self.region_name,
-            'latitude': self.latitude,
-            'longitude': self.longitude
-        }
-
     def save(self, session):
         with session.begin():
             session.add(self)
@@ -180,6 +364,51 @@ class IPAddress(SAModel):
 
         return ip
 
+    @classmethod
+    def get_by_ip(cls, ip, session):
+        ip_addr = []
+        with session.begin():
+            query = session.query(cls).filter(
+                cls.ip_packed == ip
+            )
+            ip_addr = query.first()
+
+        return ip_addr
+
+    @classmethod
+    def get_row_by_ip(cls, ip, session):
+        return cls.select_row(session, (cls.ip_packed == ip,))
+
+    @classmethod
+    def range_filter(cls, start=None, end=None):
+        """
+        Indexed range criteria on ip_packed, raises ValueError on a bad address
+        A missing bound is open ended within the address family of the other
+        :param start: first address, inclusive, None for the first of its family
+        :param end: last address, inclusive, None for the last of its family
+        :return: filter criteria
+        """
+        start = ipaddress.ip_address(start) if start else None
+        end = ipaddress.ip_address(end) if end else None
+
+        if start is None and end is None:
+            raise ValueError('An IP range needs a start or an end')
+
+        version = (start or end).version
+        first, last = ip_bounds('0.0.0.0/0' if version == 4 else '::/0')
+        filters = (cls.ip_packed.between(start or first, end or last),)
+
+        if version == 6 and (start is None or end is None):
+            # IPv4 is stored IPv4-mapped, inside the open IPv6 range
+            filters += (~cls.ip_packed.between(*ip_bounds('0.0.0.0/0')),)
+
+        return filters
+
+    @classmethod
+    def cidr_filter(cls, cidr):
+        first, last = ip_bounds(cidr)
+        return cls.range_filter(first, last)
+
     @classmethod
     def get_list(cls, session):
         models = []
@@ -190,7 +419,7 @@ class IPAddress(SAModel):
         return models
 
 
-class Person(SAModel):
+class Person(KeysetMixin, SerializeMixin, SAModel):
     """
     The Person Class
     :return person obj
@@ -209,13 +438,30 @@ class Person(SAModel):
     address2 = sa.Column(sa.String(255))
     city = sa.Column(sa.String(255))
     state = sa.Column(sa.String(2))
-    zip_code = sa.Column(sa.String(5))
+    zip_code = sa.Column(sa.String(5), index=True)
     zip_4 = sa.Column(sa.Integer)
     credit_range = sa.Column(sa.String(50))
     car_year = sa.Column(sa.String(10))
     car_make = sa.Column(sa.String(255))
     car_model = sa.Column(sa.String(255))
 
+    serialize_fields = (
+        ('id', 'id'),
+        ('created_date', 'created_date'),
+        ('first_name', 'first_name'),
+        ('last_name', 'last_name'),
+        ('email', 'email'),
+        ('cell_phone', 'cell_phone'),
+        ('address', 'address1'),
+        ('city', 'city'),
+        ('state', 'state'),
+        ('zip_code', 'zip_code'),
+        ('credit_range', 'credit_range'),
+        ('car_year', 'car_year'),
+        ('car_make', 'car_make'),
+        ('car_mode', 'car_model')
+    )
+
     def __init__(self, ipaddress_id, created_date, first_name, last_name, email, cell_phone,
                  address1, address2, city, state, zip_code):
         self.ipaddress_id = ipaddress_id
@@ -237,29 +483,25 @@ class Person(SAModel):
             self.created_date
         )
 
-    @property
-    def as_dict(self):
-        return {
-            'id': self.id,
-            'created_date': self.created_date,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'email': self.email,
-            'cell_phone': self.cell_phone,
-            'address': self.address1,
-            'city': self.city,
-            'state': self.state,
-            'zip_code': self.zip_code,
-            'credit_range': self.credit_range,
-            'car_year': self.car_year,
-            'car_make': self.car_make,
-            'car_mode': self.car_model
-        }
-
     def save(self, session):
         with session.begin():
             session.add(self)
 
+    @classmethod
+    def get_person(cls, person_pk_id, session):
+        person = []
+        with session.begin():
+            query = session.query(cls).filter(
+                cls.id == person_pk_id
+            )
+            person = query.first()
+
+        return person
+
+    @classmethod
+    def get_person_row(cls, person_pk_id, session):
+        return cls.select_row(session, (cls.id == person_pk_id,))
+
     @classmethod
     def get_person_list(cls, session):
         models = []
@@ -269,14 +511,54 @@ class Person(SAModel):
 
         return models
 
+    @classmethod
+    def get_match_blocks(cls, session, rematch=False):
+        """
+        Five digit zip codes of the persons without a MatchLink, every zip code with rematch
+        :param session:
+        :param rematch:
+        :return: sorted list of str
+        """
+        query = sa.select(cls.zip_code).distinct().where(cls.zip_code.isnot(None))
+
+        if not rematch:
+            query = query.where(~sa.exists().where(MatchLink.person_id == cls.id))
+
+        codes = set()
+        with session.begin():
+            codes = set(normalize_postcode(row.zip_code) for row in session.execute(query))
+
+        codes.discard('')
+        return sorted(codes)
+
+    @classmethod
+    def set_ipaddresses(cls, ipaddresses, session):
+        """
+        Write ipaddress_id for many persons in one executemany
+        :param ipaddresses: list of dicts with person_pk_id, ipaddress_id
+        :return: none
+        """
+        table = cls.__table__
+        # keep created_date, its onupdate would stamp every row with now
+        stmt = table.update().where(
+            table.c.id == sa.bindparam('person_pk_id')
+        ).values(ipaddress_id=sa.bindparam('ipaddress_id'), created_date=table.c.created_date)
+
+        with session.begin():
+            session.execute(stmt, ipaddresses)
 
-class Address(SAModel):
+
+class Address(KeysetMixin, SerializeMixin, SAModel):
     """
     Address Class
     :return address obj
     """
 
     __tablename__ = 'address'
+    __table_args__ = (
+        sa.Index('ix_address_claim', 'processed', 'postcode', 'claimed_until'),
+        sa.Index('ix_address_postcode', 'postcode'),
+    )
     id = sa.Column(sa.Integer, primary_key=True)
     lon = sa.Column(sa.Float, nullable=True, default=0.00)
     lat = sa.Column(sa.Float, nullable=True, default=0.00)
@@ -286,9 +568,35 @@ class Address(SAModel):
     city = sa.Column(sa.String(100), nullable=False)
     district = sa.Column(sa.String(50), nullable=True)
     region = sa.Column(sa.String(50), nullable=True)
-    postcode = sa.Column(sa.String(10), nullable=False)
+    postcode = sa.Column(sa.String(10), nullable=True)
+    # set when postcode is the nearest zip code centroid, None for a city match
+    postcode_confidence = sa.Column(sa.Float, nullable=True)
     unique_id = sa.Column(sa.String(50), nullable=True)
     processed = sa.Column(sa.Boolean, default=0, nullable=False)
+    claimed_until = sa.Column(sa.DateTime, nullable=True)
+    claim_token = sa.Column(sa.String(32), nullable=True)
+    geohash = sa.Column(sa.String(12), nullable=True, index=True, default=point_geohash)
+    # normalized address as loaded, enrichment doesn't change it
+    fingerprint = sa.Column(sa.String(32), nullable=True, index=True, default=row_fingerprint)
+
+    serialize_fields = (
+        ('id', 'id'),
+        ('lat', 'lat'),
+        ('lon', 'lon'),
+        ('number', 'number'),
+        ('street', 'street'),
+        ('unit', 'unit'),
+        ('city', 'city'),
+        ('district', 'district'),
+        ('region', 'region'),
+        ('postcode', 'postcode'),
+        ('postcode_confidence', 'postcode_confidence'),
+        ('unique_id', 'unique_id')
+    )
+
+    # within_radius: first search radius, and the most addresses read per step
+    search_start_km = 1.0
+    max_candidates = 50000
 
     def __init__(self, lat, lon, number, street, unit, city, district, region, postcode, unique_id):
         self.lat = lat
@@ -302,26 +610,19 @@ class Address(SAModel):
         self.postcode = postcode
         self.unique_id = unique_id
 
-    @property
-    def as_dict(self):
-        return {
-            'id': self.id,
-            'lat': self.lat,
-            'lon': self.lon,
-            'number': self.number,
-            'street': self.street,
-            'unit': self.unit,
-            'city': self.city,
-            'district': self.district,
-            'region': self.region,
-            'postcode': self.postcode,
-            'unique_id': self.unique_id
-        }
-
     def save(self, session):
         with session.begin():
             session.add(self)
 
+    def mark_processed(self):
+        """
+        Set processed and release the claim, like set_postcodes does for a chunk
+        :return: none
+        """
+        self.processed = 1
+        self.claimed_until = None
+        self.claim_token = None
+
     @classmethod
     def get_addr(cls, addr_pk_id, session):
         addr = []
@@ -343,16 +644,229 @@ class Address(SAModel):
         return models
 
     @classmethod
-    def get_update_list(cls, session):
+    def claim_update_list(cls, session, lease_seconds=600, limit=1000):
+        """
+        Lease up to limit unprocessed addresses that no one else holds
+        Rows are marked in-flight until the lease expires, so the scheduler
+        won't enqueue them again while they wait in the queue. An expired
+        lease is claimed like an unclaimed row
+        :param session:
+        :param lease_seconds:
+        :param limit:
+        :return: list of claimed addr_pk_ids
+        """
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        unclaimed = sa.and_(
+            cls.processed == 0,
+            cls.postcode.is_(None),
+            sa.or_(cls.claimed_until.is_(None), cls.claimed_until < now)
+        )
+        addr_pk_ids = []
+
+        with session.begin():
+            candidates = [row.id for row in session.query(cls.id).filter(unclaimed).limit(limit)]
+
+            if candidates:
+                # re-checking the lease in the UPDATE makes the claim atomic per row
+                session.query(cls).filter(cls.id.in_(candidates), unclaimed).update({
+                    cls.claimed_until: now + timedelta(seconds=lease_seconds),
+                    cls.claim_token: token
+                }, synchronize_session=False)
+
+                addr_pk_ids = [row.id for row in session.query(cls.id).filter(
+                    cls.id.in_(candidates), cls.claim_token == token
+                )]
+
+        return addr_pk_ids
+
+    @classmethod
+    def get_addrs(cls, addr_pk_ids, session):
         addr_list = []
         with session.begin():
-            query = session.query(cls)
-            addr_list = query.filter(cls.postcode.is_(None), cls.processed == 0).limit(1000).all()
+            query = session.query(cls).filter(cls.id.in_(addr_pk_ids))
+            addr_list = query.order_by(cls.id).all()
+
+        return addr_list
+
+    @classmethod
+    def get_addr_chunk(cls, addr_pk_ids, session):
+        addr_list = []
+        with session.begin():
+            query = session.query(cls.id, cls.city, cls.region, cls.postcode, cls.lat, cls.lon)
+            addr_list = query.filter(cls.id.in_(addr_pk_ids)).all()
+
+        return addr_list
+
+    @classmethod
+    def get_geocode_chunk(cls, addr_pk_ids, session):
+        addr_list = []
+        with session.begin():
+            query = session.query(cls.id, cls.lat, cls.lon)
+            addr_list = query.filter(
+                cls.id.in_(addr_pk_ids),
+                cls.lat.isnot(None),
+                cls.lon.isnot(None),
+                sa.or_(*[
+                    sa.or_(field.is_(None), field == '')
+                    for field in (cls.city, cls.district, cls.region)
+                ])
+            ).all()
 
         return addr_list
 
+    @classmethod
+    def set_locations(cls, locations, session):
+        """
+        Write city, district and region for many addresses in one executemany
+        :param locations: list of dicts with addr_pk_id, city, district, region
+        :return: none
+        """
+        stmt = cls.__table__.update().where(
+            cls.__table__.c.id == sa.bindparam('addr_pk_id')
+        ).values(
+            city=sa.bindparam('city'),
+            district=sa.bindparam('district'),
+            region=sa.bindparam('region')
+        )
+
+        with session.begin():
+            session.execute(stmt, locations)
+
+    @classmethod
+    def get_existing_fingerprints(cls, fingerprints, session):
+        """
+        Which of the fingerprints are already stored
+        :param fingerprints: list of str
+        :param session:
+        :return: set of str
+        """
+        existing = set()
+        with session.begin():
+            for i in range(0, len(fingerprints), 1000):
+                query = sa.select(cls.fingerprint).where(cls.fingerprint.in_(fingerprints[i:i + 1000]))
+                existing.update(row.fingerprint for row in session.execute(query))
+
+        return existing
+
+    @classmethod
+    def bbox_filters(cls, south, west, north, east):
+        """
+        Filter criteria for addresses inside a bounding box, one per geohash range
+        Each range is a scan on the geohash index, lat and lon then drop the
+        points of the edge cells outside the box. Ranges come in geohash
+        order. A box crossing the antimeridian has west > east
+        :return: list of tuple of filter criteria
+        """
+        if west <= east:
+            lon_filter = cls.lon.between(west, east)
+        else:
+            lon_filter = sa.or_(cls.lon >= west, cls.lon <= east)
+
+        filters = []
+
+        for low, high in sorted(spatial.geohash_ranges(south, west, north, east)):
+            geohash_filters = (cls.geohash >= low,) if high is None else (cls.geohash >= low, cls.geohash < high)
+            filters.append(geohash_filters + (cls.lat.between(south, north), lon_filter))
+
+        return filters
+
+    @classmethod
+    def within_bbox(cls, south, west, north, east, session, limit=None, columns=None):
+        """
+        Addresses inside a bounding box, in geohash order
+        Ranges are queried one at a time, OR-ing them into one query with an
+        ORDER BY makes the planner scan the whole index
+        :param limit: first limit addresses, None for all
+        :param columns: column names, see RowsMixin
+        :return: list of namedtuples
+        """
+        rows = []
+        query, row_type = cls.row_query(columns)
+
+        with session.begin():
+            for filters in cls.bbox_filters(south, west, north, east):
+                range_query = query.where(*filters).order_by(cls.geohash)
+
+                if limit is not None:
+                    range_query = range_query.limit(limit - len(rows))
+
+                rows.extend(map(row_type._make, session.execute(range_query)))
 
-class ZipCode(SAModel):
+                if limit is not None and len(rows) >= limit:
+                    break
+
+        return rows
+
+    @classmethod
+    def within_radius(cls, lat, lon, radius_km, session, limit=None, columns=None):
+        """
+        Addresses within radius_km of a point, nearest first
+        The search starts at the cells around the point and doubles its
+        radius until limit addresses are inside it, their nearest are then
+        the nearest of the whole radius. Each step searches the bounding box
+        of its circle on the geohash index, reading at most max_candidates
+        addresses, and checks them against their great circle distance
+        :param lat:
+        :param lon:
+        :param radius_km:
+        :param session:
+        :param limit: nearest limit addresses, None for all
+        :param columns: column names, lat and lon are always selected
+        :return: list of tuple: (namedtuple, distance_km)
+        """
+        columns = tuple(columns or cls.default_row_columns())
+
+        if 'lat' not in columns or 'lon' not in columns:
+            columns += tuple(name for name in ('lat', 'lon') if name not in columns)
+
+        haversine_km = spatial.haversine_km
+        step_km = radius_km if limit is None else min(radius_km, cls.search_start_km)
+
+        while True:
+            south, west, north, east = spatial.radius_bbox(lat, lon, step_km)
+            rows = cls.within_bbox(south, west, north, east, session, limit=cls.max_candidates, columns=columns)
+            found = []
+
+            for row in rows:
+                distance = haversine_km(lat, lon, row.lat, row.lon)
+                if distance <= step_km:
+                    found.append((row, distance))
+
+            # enough found, the whole radius searched, or the candidates capped
+            if step_km >= radius_km or len(found) >= limit or len(rows) >= cls.max_candidates:
+                break
+
+            step_km = min(radius_km, step_km * 2)
+
+        found.sort(key=lambda pair: pair[1])
+        return found if limit is None else found[:limit]
+
+    @classmethod
+    def set_postcodes(cls, postcodes, addr_pk_ids, session, confidences=None):
+        """
+        Write postcodes and mark a chunk of addresses processed in one UPDATE
+        :param postcodes: dict: addr_pk_id -> postal code
+        :param addr_pk_ids: every addr_pk_id in the chunk
+        :param confidences: dict: addr_pk_id -> postcode_confidence of nearest centroid postcodes
+        :return: rowcount
+        """
+        values = {cls.processed: 1, cls.claimed_until: None, cls.claim_token: None}
+
+        if postcodes:
+            values[cls.postcode] = sa.case(postcodes, value=cls.id, else_=cls.postcode)
+
+        if confidences:
+            values[cls.postcode_confidence] = sa.case(confidences, value=cls.id, else_=cls.postcode_confidence)
+
+        with session.begin():
+            query = session.query(cls).filter(cls.id.in_(addr_pk_ids))
+            rowcount = query.update(values, synchronize_session=False)
+
+        return rowcount
+
+
+class ZipCode(RowsMixin, SerializeMixin, SAModel):
     """
     Zipcode Class
     :return zipcode
@@ -372,6 +886,15 @@ class ZipCode(SAModel):
     longitude = sa.Column(sa.Float, nullable=False)
     accuracy = sa.Column(sa.Integer)
 
+    serialize_fields = (
+        ('postal_code', 'postal_code'),
+        ('city_name', 'city_name'),
+        ('state', 'state'),
+        ('latitude', 'latitude'),
+        ('longitude', 'longitude'),
+        ('accuracy', 'accuracy')
+    )
+
     def __init__(self, postal_code, city_name, state, county, latitude, longitude, accuracy):
         self.postal_code = postal_code
         self.city_name = city_name
@@ -384,16 +907,6 @@ class ZipCode(SAModel):
     def __repr__(self):
         return '{}'.format(self.postal_code)
 
-    def as_dict(self):
-        return {
-            'postal_code': self.postal_code,
-            'city_name': self.city_name,
-            'state': self.state,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'accuracy': self.accuracy
-        }
-
     def get_coordinates(self):
         return '{} {}'.format(self.latitude, self.longitude)
 
@@ -410,6 +923,28 @@ class ZipCode(SAModel):
 
         return models
 
+    @classmethod
+    def get_index_rows(cls, session):
+        rows = []
+        with session.begin():
+            query = session.query(cls.id, cls.postal_code, cls.city_name, cls.state)
+            rows = query.all()
+
+        return rows
+
+    @classmethod
+    def get_centroid_rows(cls, session):
+        return cls.select_rows(session, columns=('postal_code', 'latitude', 'longitude'), order_by=cls.id)
+
+    @classmethod
+    def get_signature(cls, session):
+        signature = None
+        with session.begin():
+            query = session.query(sa.func.count(cls.id), sa.func.max(cls.id))
+            signature = tuple(query.one())
+
+        return signature
+
     @classmethod
     def get_zip_code(cls, postal_code, session):
         zipcode = []
@@ -422,6 +957,10 @@ class ZipCode(SAModel):
 
         return zipcode
 
+    @classmethod
+    def get_zip_code_row(cls, postal_code, session):
+        return cls.select_row(session, (cls.postal_code == postal_code,))
+
     @classmethod
     def query_for_code(cls, city, state, session):
         zipcode = []
@@ -435,3 +974,51 @@ class ZipCode(SAModel):
 
         return zipcode
 
+
+class MatchLink(RowsMixin, SerializeMixin, SAModel):
+    """
+    The address and IP address a person was matched to, with their scores
+    One row per matched person, written by prospector.matching
+    :return match link
+    """
+    __tablename__ = 'match_links'
+    id = sa.Column(sa.Integer, primary_key=True)
+    person_id = sa.Column(sa.Integer, sa.ForeignKey('persons.id'), nullable=False, unique=True)
+    address_id = sa.Column(sa.Integer, sa.ForeignKey('address.id'), nullable=True)
+    address_score = sa.Column(sa.Float, nullable=True)
+    ipaddress_id = sa.Column(sa.Integer, sa.ForeignKey('ipaddress.id'), nullable=True)
+    ipaddress_score = sa.Column(sa.Float, nullable=True)
+    postal_code = sa.Column(sa.String(10), nullable=True)
+    matched_date = sa.Column(sa.DateTime, default=datetime.now)
+
+    serialize_fields = (
+        ('person_id', 'person_id'),
+        ('address_id', 'address_id'),
+        ('address_score', 'address_score'),
+        ('ipaddress_id', 'ipaddress_id'),
+        ('ipaddress_score', 'ipaddress_score'),
+        ('postal_code', 'postal_code'),
+        ('matched_date', 'matched_date')
+    )
+
+    @classmethod
+    def get_person_link(cls, person_pk_id, session):
+        return cls.select_row(session, (cls.person_id == person_pk_id,))
+
+    @classmethod
+    def replace_links(cls, links, person_pk_ids, session):
+        """
+        Replace the links of a batch of persons in one transaction
+        :param links: list of dicts with the MatchLink columns
+        :param person_pk_ids: every person in the batch, matched or not
+        :return: none
+        """
+        table = cls.__table__
+
+        with session.begin():
+            # chunked to stay under the bound parameter limit of the driver
+            for i in range(0, len(person_pk_ids), 1000):
+                session.execute(table.delete().where(table.c.person_id.in_(person_pk_ids[i:i + 1000])))
+
+            if links:
+                session.execute(table.insert(), links)
@@ -0,0 +1,180 @@
+import math
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.195
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    """
+    Geohash of a point, nearby points share a prefix
+    :param lat: float
+    :param lon: float
+    :param precision: characters, 9 is about 5 meters
+    :return: str or None when the point is missing
+    """
+    if lat is None or lon is None:
+        return None
+
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    code = []
+    bits = 0
+    value = 0
+    even = True
+
+    while len(code) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value = value * 2 + 1
+                lon_lo = mid
+            else:
+                value = value * 2
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = value * 2 + 1
+                lat_lo = mid
+            else:
+                value = value * 2
+                lat_hi = mid
+
+        even = not even
+        bits += 1
+
+        if bits == 5:
+            code.append(GEOHASH_BASE32[value])
+            bits = 0
+            value = 0
+
+    return ''.join(code)
+
+
+def geohash_cell_size(precision):
+    """
+    :return: tuple: (degrees latitude, degrees longitude) of one cell
+    """
+    bits = precision * 5
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** (bits - bits // 2)
+
+
+def _geohash_int(code):
+    value = 0
+    for char in code:
+        value = value * 32 + GEOHASH_BASE32.index(char)
+    return value
+
+
+def _geohash_str(value, precision):
+    chars = []
+    for i in range(precision):
+        chars.append(GEOHASH_BASE32[value % 32])
+        value //= 32
+    return ''.join(reversed(chars))
+
+
+def _cells(south, west, north, east, precision):
+    dlat, dlon = geohash_cell_size(precision)
+    cells = set()
+    lat = math.floor((south + 90.0) / dlat) * dlat - 90.0
+
+    while lat < north:
+        lon = math.floor((west + 180.0) / dlon) * dlon - 180.0
+
+        while lon < east:
+            cells.add(geohash_encode(min(lat + dlat / 2, 90.0), min(lon + dlon / 2, 180.0), precision))
+            lon += dlon
+
+        lat += dlat
+
+    return cells
+
+
+def geohash_ranges(south, west, north, east, max_cells=32):
+    """
+    Cover a bounding box with geohash cells and merge them into key ranges
+    The finest precision needing at most max_cells cells is used. A box
+    crossing the antimeridian (west > east) is split in two
+    :return: list of tuple: (low, high) where low <= geohash < high, high None when unbounded
+    """
+    if west > east:
+        return (geohash_ranges(south, west, north, 180.0, max_cells) +
+                geohash_ranges(south, -180.0, north, east, max_cells))
+
+    south, north = max(south, -90.0), min(north, 90.0)
+    cells = None
+
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        dlat, dlon = geohash_cell_size(precision)
+
+        if ((north - south) / dlat + 2) * ((east - west) / dlon + 2) > max_cells and cells is not None:
+            break
+
+        cells = (precision, _cells(south, west, north, east, precision))
+
+    precision, codes = cells
+
+    if not codes:
+        # a box without area on a cell boundary, the cell holding its corner
+        codes = {geohash_encode(south, west, precision)}
+
+    values = sorted(_geohash_int(code) for code in codes)
+    ranges = []
+    start = prev = values[0]
+
+    for value in values[1:] + [None]:
+        if value is not None and value == prev + 1:
+            prev = value
+            continue
+
+        high = prev + 1
+        ranges.append((_geohash_str(start, precision),
+                       _geohash_str(high, precision) if high < 32 ** precision else None))
+
+        if value is not None:
+            start = prev = value
+
+    return ranges
+
+
+def radius_bbox(lat, lon, radius_km):
+    """
+    Bounding box holding every point within radius_km of lat/lon
+    :return: tuple: (south, west, north, east)
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    south, north = lat - dlat, lat + dlat
+
+    if south <= -90.0 or north >= 90.0:
+        return max(south, -90.0), -180.0, min(north, 90.0), 180.0
+
+    # widest at the latitude nearest the pole
+    cos_lat = math.cos(math.radians(max(abs(south), abs(north))))
+    dlon = radius_km / (KM_PER_DEGREE_LAT * cos_lat) if cos_lat > 0 else 360.0
+
+    if dlon >= 180.0:
+        return south, -180.0, north, 180.0
+
+    west, east = lon - dlon, lon + dlon
+
+    if west < -180.0:
+        west += 360.0
+    if east > 180.0:
+        east -= 360.0
+
+    return south, west, north, east
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great circle distance between two points
+    :return: float: kilometers
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
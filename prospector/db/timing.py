@@ -0,0 +1,60 @@
+import threading
+import time
+from sqlalchemy import event
+
+_timer = threading.local()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # kept on the statement's context, nothing piles up when it fails
+    context.query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _stop_query(context)
+
+
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute
+    _stop_query(exception_context.execution_context)
+
+
+def _stop_query(context):
+    started = getattr(context, 'query_started', None)
+
+    if started is None:
+        return
+
+    context.query_started = None
+
+    if getattr(_timer, 'active', False):
+        _timer.total += time.perf_counter() - started
+
+
+def instrument_engine(engine):
+    """
+    Accumulate SQLAlchemy cursor time into the current thread's timer
+    Safe to call more than once for the same engine
+    :param engine:
+    :return: none
+    """
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+
+
+def start_db_timer():
+    _timer.active = True
+    _timer.total = 0.0
+
+
+def stop_db_timer():
+    """
+    Stop the current thread's timer
+    :return: float: seconds spent in SQLAlchemy since start_db_timer()
+    """
+    total = getattr(_timer, 'total', 0.0)
+    _timer.active = False
+    _timer.total = 0.0
+    return total
@@ -0,0 +1,62 @@
+import ipaddress
+import sqlalchemy as sa
+
+
+def pack_ip(value):
+    """
+    Pack an IPv4 or IPv6 address into 16 sortable bytes
+    IPv4 is stored IPv4-mapped (::ffff:a.b.c.d) so both families share one index
+    :param value: str or ipaddress object
+    :return: bytes
+    """
+    addr = ipaddress.ip_address(value)
+
+    if addr.version == 4:
+        addr = ipaddress.IPv6Address(b'\x00' * 10 + b'\xff\xff' + addr.packed)
+
+    return addr.packed
+
+
+def unpack_ip(value):
+    """
+    Unpack 16 bytes back to the text form of the address
+    :param value: bytes
+    :return: str
+    """
+    addr = ipaddress.IPv6Address(bytes(value))
+
+    if addr.ipv4_mapped is not None:
+        return str(addr.ipv4_mapped)
+
+    return str(addr)
+
+
+def ip_bounds(cidr):
+    """
+    First and last address of a CIDR block
+    :param cidr: str: 10.0.0.0/8, 2001:db8::/32
+    :return: tuple: (first, last)
+    """
+    network = ipaddress.ip_network(cidr, strict=False)
+    return network[0], network[-1]
+
+
+class PackedIP(sa.types.TypeDecorator):
+    """
+    IPv4/IPv6 address stored as VARBINARY(16)
+    Byte order matches address order, so B-tree range scans work
+    """
+    impl = sa.types.VARBINARY(16)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+
+        return pack_ip(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+
+        return unpack_ip(value)
@@ -0,0 +1,82 @@
+import threading
+from prospector.cache import LookupCache, TTLCache
+
+GEOIP_DATA = '/var/lib/geoip/GeoLiteCity.dat'
+
+
+class LazyGeoIP(object):
+    """
+    GeoIP reader that opens the data file on the first lookup
+    Importing and opening GeoIP is left out of process start up
+    :return location
+    """
+
+    def __init__(self, path=GEOIP_DATA):
+        self.path = path
+        self._gi = None
+        self._lock = threading.Lock()
+
+    def record_by_addr(self, ip_addr):
+        if self._gi is None:
+            with self._lock:
+                if self._gi is None:
+                    import GeoIP
+                    # open the geo data file once and store it in cache memory
+                    self._gi = GeoIP.open(self.path, GeoIP.GEOIP_INDEX_CACHE | GeoIP.GEOIP_CHECK_CACHE)
+
+        return self._gi.record_by_addr(ip_addr)
+
+
+class GeoIPCache(object):
+    """
+    Lookup cache in front of a GeoIP reader
+    Misses are cached too, so unknown IPs don't hit the reader again. With a
+    shared LookupCache every worker process reuses the others' lookups
+    :param reader: GeoIP reader
+    :param maxsize: entries of the local cache built when no lookups is given
+    :param lookups: LookupCache
+    :return location
+    """
+    kind = 'geoip'
+
+    def __init__(self, reader, maxsize=100000, lookups=None):
+        self.reader = reader
+        self.lookups = lookups if lookups is not None else LookupCache(TTLCache(maxsize=maxsize), local_ttl=0)
+        self.maxsize = self.lookups.local.maxsize
+
+    def __len__(self):
+        return len(self.lookups)
+
+    @property
+    def stats(self):
+        counts = self.lookups.stats.get(self.kind, {})
+        return {
+            'hits': counts.get('local', 0) + counts.get('shared', 0) + counts.get('waited', 0),
+            'misses': counts.get('computed', 0),
+            'size': len(self.lookups),
+            'maxsize': self.maxsize
+        }
+
+    def record_many(self, ip_addrs):
+        return [self.reader.record_by_addr(ip_addr) for ip_addr in ip_addrs]
+
+    def lookup(self, ip_addr):
+        """
+        GeoIP record for one address
+        :param ip_addr: str
+        :return: dict or None
+        """
+        return self.lookups.get(self.kind, ip_addr.strip(), self.reader.record_by_addr)
+
+    def lookup_many(self, ip_addrs):
+        """
+        GeoIP records for a list of addresses
+        Each distinct address is resolved once, results follow input order
+        :param ip_addrs: list
+        :return: list of dict or None
+        """
+        return self.lookups.get_many(self.kind, [ip_addr.strip() for ip_addr in ip_addrs], self.record_many)
+
+    def clear(self):
+        self.lookups.local.clear()
+        self.lookups.stats.pop(self.kind, None)
@@ -0,0 +1,357 @@
+"""
+Bulk load OpenAddresses CSV or GeoJSON files into the address table
+
+Files are streamed straight out of .zip, .gz, .bz2 or .xz archives, inserted
+in chunks and checkpointed after every chunk, so a failed load resumes where
+it stopped when the same command is run again.
+
+Addresses already stored, or loaded earlier in the run, are skipped by their
+normalized fingerprint. Rows are screened with an in-memory Bloom filter of
+every fingerprint, only the ones it may have seen are looked up in the
+database, one query per chunk.
+
+Usage:
+    ingest.py <source>... [--config=<path>] [--chunk-size=<n>] [--checkpoint=<path>]
+              [--expected-rows=<n>] [--error-rate=<p>] [--no-dedupe]
+
+Options:
+    --config=<path>       Config file, defaults to PROSPECTOR_CONFIG or config/config.yaml
+    --chunk-size=<n>      Rows inserted per transaction [default: 5000]
+    --checkpoint=<path>   Progress file [default: .ingest-checkpoint.json]
+    --expected-rows=<n>   Addresses the dedupe filter is sized for, stored and loaded [default: 10000000]
+    --error-rate=<p>      Dedupe filter false positive rate at expected-rows [default: 0.001]
+    --no-dedupe           Insert every row, duplicates too
+"""
+
+import bz2
+import csv
+import gzip
+import io
+import itertools
+import json
+import lzma
+import os
+import time
+import zipfile
+from docopt import docopt
+from functools import partial
+from prospector.bloom import BloomFilter
+from prospector.config import load_config
+from prospector.db.manager import DBManager
+from prospector.db.models import Address
+from prospector.normalize import address_fingerprint
+
+DATA_FILES = ('.csv', '.geojson', '.geojsonl')
+COMPRESSED = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open
+}
+
+
+class Checkpoint(object):
+    """
+    Rows read per data file, written after every committed chunk
+    :return checkpoint
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.progress = {}
+
+        if os.path.exists(path):
+            with open(path, 'r') as fp:
+                self.progress = json.load(fp)
+
+    def get(self, name):
+        return self.progress.get(name, {'rows': 0, 'done': False})
+
+    def set(self, name, rows, done=False):
+        self.progress[name] = {'rows': rows, 'done': done}
+        tmp_path = '{}.tmp'.format(self.path)
+
+        with open(tmp_path, 'w') as fp:
+            json.dump(self.progress, fp)
+
+        os.replace(tmp_path, self.path)
+
+
+def open_source(path):
+    """
+    Yield (name, text stream) for every data file in a source, decompressing on the fly
+    :param path: .csv, .geojson, optionally .gz/.bz2/.xz compressed, or a .zip of them
+    :return: generator
+    """
+    if path.lower().endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.filename.lower().endswith(DATA_FILES):
+                    with archive.open(info) as raw:
+                        yield '{}:{}'.format(path, info.filename), io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        return
+
+    opener = COMPRESSED.get(os.path.splitext(path)[1].lower())
+
+    if opener is not None:
+        stream = opener(path, 'rt', encoding='utf-8', newline='')
+    else:
+        stream = open(path, 'r', encoding='utf-8', newline='')
+
+    with stream:
+        yield path, stream
+
+
+def read_csv(stream, skip=0):
+    for record in itertools.islice(csv.DictReader(stream), skip, None):
+        yield dict((key.lower(), value) for key, value in record.items() if key)
+
+
+def read_geojson(stream, skip=0):
+    """
+    Line delimited GeoJSON features, as OpenAddresses ships them
+    Every object line is one record, one that isn't a Feature is an empty
+    record, so the first skip lines are passed over without decoding them
+    :param stream:
+    :param skip: records to pass over
+    :return: generator of dicts
+    """
+    for line in stream:
+        line = line.strip().rstrip(',')
+        if not line.startswith('{'):
+            continue
+
+        if skip:
+            skip -= 1
+            continue
+
+        feature = json.loads(line)
+        if feature.get('type') != 'Feature':
+            yield {}
+            continue
+
+        record = dict(feature.get('properties') or {})
+        coordinates = (feature.get('geometry') or {}).get('coordinates') or (None, None)
+        record['lon'], record['lat'] = coordinates[0], coordinates[1]
+        yield record
+
+
+def read_records(name, stream, skip=0):
+    """
+    Records of one data file, CSV or GeoJSON by its name
+    :param skip: records to pass over, see read_geojson
+    :return: generator of dicts
+    """
+    data_name = name
+    for ext in COMPRESSED:
+        if data_name.lower().endswith(ext):
+            data_name = data_name[:-len(ext)]
+
+    if data_name.lower().endswith('.csv'):
+        return read_csv(stream, skip)
+
+    return read_geojson(stream, skip)
+
+
+def _text(record, field, column):
+    value = (record.get(field) or '').strip()
+    return value[:column.type.length]
+
+
+def to_row(record):
+    """
+    Map an OpenAddresses record to an address row
+    :param record: dict with lower case OpenAddresses field names
+    :return: dict or None when the record can't be stored
+    """
+    columns = Address.__table__.c
+
+    try:
+        number = int(str(record.get('number')).strip())
+        lon = float(record.get('lon'))
+        lat = float(record.get('lat'))
+    except (TypeError, ValueError):
+        return None
+
+    street = _text(record, 'street', columns.street)
+    if not street:
+        return None
+
+    row = {
+        'lon': lon,
+        'lat': lat,
+        'number': number,
+        'street': street,
+        'unit': _text(record, 'unit', columns.unit) or None,
+        'city': _text(record, 'city', columns.city),
+        'district': _text(record, 'district', columns.district) or None,
+        'region': _text(record, 'region', columns.region) or None,
+        'postcode': _text(record, 'postcode', columns.postcode) or None,
+        'unique_id': (_text(record, 'id', columns.unique_id) or
+                      _text(record, 'hash', columns.unique_id) or None),
+        'processed': 0
+    }
+    row['fingerprint'] = address_fingerprint(
+        row['number'], row['street'], row['unit'], row['city'], row['region'], row['postcode']
+    )
+    return row
+
+
+class Deduplicator(object):
+    """
+    Drop the rows whose address is already stored or was loaded this run
+    A Bloom filter of every fingerprint answers most rows in memory, the
+    rows it may have seen are checked against the database in one query
+    :param capacity: fingerprints the filter is sized for
+    :param error_rate: false positive rate at capacity
+    :return deduplicator
+    """
+
+    def __init__(self, capacity=10000000, error_rate=0.001):
+        self.filter = BloomFilter(capacity, error_rate)
+        self.duplicates = 0
+        self.checked = 0
+
+    def load(self, mgr):
+        """
+        Add the fingerprints already stored to the filter
+        Rows stored before the fingerprint column need `migrations.py address-fingerprint` first
+        :param mgr: DBManager
+        :return: int: fingerprints loaded
+        """
+        batch = []
+        loaded = 0
+        rows = Address.iter_rows(mgr.session, batch_size=10000, filters=(Address.fingerprint.isnot(None),),
+                                 columns=('fingerprint',))
+
+        for row in rows:
+            batch.append(row.fingerprint)
+
+            if len(batch) >= 10000:
+                self.filter.add_many(batch)
+                loaded += len(batch)
+                batch = []
+
+        if batch:
+            self.filter.add_many(batch)
+            loaded += len(batch)
+
+        return loaded
+
+    def screen(self, mgr, rows):
+        """
+        :param mgr: DBManager
+        :param rows: address rows with a fingerprint
+        :return: list: the rows to insert
+        """
+        unique = []
+        seen = set()
+
+        for row in rows:
+            if row['fingerprint'] not in seen:
+                seen.add(row['fingerprint'])
+                unique.append(row)
+
+        maybe_seen = self.filter.add_many([row['fingerprint'] for row in unique]).tolist()
+        fresh = [row for row, maybe in zip(unique, maybe_seen) if not maybe]
+        suspects = [row for row, maybe in zip(unique, maybe_seen) if maybe]
+
+        if suspects:
+            self.checked += len(suspects)
+            existing = Address.get_existing_fingerprints([row['fingerprint'] for row in suspects], mgr.session)
+            fresh.extend(row for row in suspects if row['fingerprint'] not in existing)
+
+        self.duplicates += len(rows) - len(fresh)
+        return fresh
+
+
+def insert_chunk(mgr, rows):
+    session = mgr.session
+    with session.begin():
+        session.execute(Address.__table__.insert(), rows)
+
+
+def ingest_stream(mgr, name, read, checkpoint, chunk_size=5000, deduplicator=None):
+    """
+    Insert the records of one data file in chunks, resuming from the checkpoint
+    :param read: callable taking the records already loaded, returning the records after them
+    :param deduplicator: Deduplicator, None inserts duplicates too
+    :return: tuple: (rows inserted, rows skipped)
+    """
+    progress = checkpoint.get(name)
+
+    if progress['done']:
+        print('{}: already loaded, skipping'.format(name))
+        return 0, 0
+
+    resume = progress['rows']
+    count = resume
+    inserted = 0
+    skipped = 0
+    chunk = []
+    started = time.time()
+
+    def flush():
+        rows = deduplicator.screen(mgr, chunk) if deduplicator is not None else chunk
+
+        if rows:
+            insert_chunk(mgr, rows)
+
+        checkpoint.set(name, count)
+        elapsed = time.time() - started
+        print('{}: {} rows inserted, {} skipped, {} duplicates ({:.0f} rows/sec)'.format(
+            name, inserted + len(rows), skipped, count - resume - skipped - inserted - len(rows),
+            (count - resume) / elapsed if elapsed else 0
+        ))
+        return len(rows)
+
+    for record in read(resume):
+        count += 1
+        row = to_row(record)
+        if row is None:
+            skipped += 1
+            continue
+
+        chunk.append(row)
+
+        if len(chunk) >= chunk_size:
+            inserted += flush()
+            chunk = []
+
+    if chunk:
+        inserted += flush()
+
+    checkpoint.set(name, count, done=True)
+    return inserted, skipped
+
+
+def main():
+    args = docopt(__doc__)
+
+    cfg = load_config(args['--config'])
+
+    mgr = DBManager.from_config(cfg.db)
+    mgr.setup()
+    checkpoint = Checkpoint(args['--checkpoint'])
+    chunk_size = int(args['--chunk-size'])
+    deduplicator = None
+    total = 0
+    started = time.time()
+
+    if not args['--no-dedupe']:
+        deduplicator = Deduplicator(int(args['--expected-rows']), float(args['--error-rate']))
+        print('Dedupe filter loaded with {} stored addresses'.format(deduplicator.load(mgr)))
+
+    for source in args['<source>']:
+        for name, stream in open_source(source):
+            inserted, skipped = ingest_stream(mgr, name, partial(read_records, name, stream), checkpoint, chunk_size,
+                                              deduplicator)
+            total += inserted
+
+    elapsed = time.time() - started
+    print('Loaded {} rows in {:.1f}s ({:.0f} rows/sec)'.format(
+        total, elapsed, total / elapsed if elapsed else 0
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Summarize Celery task instrumentation recorded in Redis
+
+Usage:
+    instrumentation.py [--config=<path>] [--json]
+
+Options:
+    --config=<path>   Config file, defaults to PROSPECTOR_CONFIG or config/config.yaml
+    --json            Print the summary as JSON
+"""
+
+import json
+import time
+from celery import signals
+from docopt import docopt
+from prospector.config import load_config
+from prospector.db.timing import start_db_timer, stop_db_timer
+
+ENQUEUED_AT = 'prospector_enqueued_at'
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+class TaskStats(object):
+    """
+    Per task name counts by final state, plus the most recent samples of
+    queue wait, runtime and DB time, kept in Redis so every worker process
+    and host reports into the same place
+    :return stats
+    """
+
+    def __init__(self, client, prefix='prospector:taskstats:', samples=10000):
+        self.client = client
+        self.prefix = prefix
+        self.samples = samples
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def record(self, name, state, wait, runtime, db_time):
+        """
+        Record one finished task run
+        :param name: task name
+        :param state: SUCCESS, FAILURE, RETRY
+        :param wait: seconds from enqueue to start, None when unknown
+        :param runtime: seconds
+        :param db_time: seconds spent in SQLAlchemy
+        :return: none
+        """
+        samples_key = '{}samples:{}'.format(self.prefix, name)
+        pipe = self.client.pipeline()
+        pipe.sadd(self.prefix + 'tasks', name)
+        pipe.hincrby('{}counts:{}'.format(self.prefix, name), state, 1)
+        pipe.lpush(samples_key, json.dumps([time.time(), wait, runtime, db_time]))
+        pipe.ltrim(samples_key, 0, self.samples - 1)
+        pipe.execute()
+
+    def summary(self):
+        """
+        Throughput and p50/p95/p99 of wait, runtime and DB time per task name
+        :return: dict
+        """
+        summary = {}
+
+        for name in sorted(n.decode('utf-8') if isinstance(n, bytes) else n
+                           for n in self.client.smembers(self.prefix + 'tasks')):
+            counts = self.client.hgetall('{}counts:{}'.format(self.prefix, name))
+            samples = [json.loads(raw) for raw in
+                       self.client.lrange('{}samples:{}'.format(self.prefix, name), 0, -1)]
+            finished = [sample[0] for sample in samples]
+            span = max(finished) - min(finished) if len(finished) > 1 else 0
+
+            task = {
+                'counts': dict(
+                    (k.decode('utf-8') if isinstance(k, bytes) else k, int(v)) for k, v in counts.items()
+                ),
+                'samples': len(samples),
+                'throughput_per_sec': round(len(samples) / span, 3) if span else None
+            }
+
+            for index, metric in ((1, 'wait'), (2, 'runtime'), (3, 'db_time')):
+                values = [sample[index] for sample in samples if sample[index] is not None]
+                for pct in (50, 95, 99):
+                    value = percentile(values, pct)
+                    task['{}_p{}_ms'.format(metric, pct)] = round(value * 1000, 3) if value is not None else None
+
+            summary[name] = task
+
+        return summary
+
+
+def connect_signals(get_stats):
+    """
+    Instrument every task of the process with Celery signals
+    :param get_stats: callable returning the TaskStats, called on first use
+    :return: none
+    """
+    running = {}
+
+    @signals.before_task_publish.connect(weak=False)
+    def stamp_enqueued(headers=None, **kwargs):
+        if headers is not None:
+            headers[ENQUEUED_AT] = time.time()
+
+    @signals.task_prerun.connect(weak=False)
+    def task_started(task_id=None, task=None, **kwargs):
+        enqueued_at = getattr(task.request, ENQUEUED_AT, None)
+        if enqueued_at is None:
+            enqueued_at = (getattr(task.request, 'headers', None) or {}).get(ENQUEUED_AT)
+
+        running[task_id] = (time.time(), time.perf_counter(), enqueued_at)
+        start_db_timer()
+
+    @signals.task_postrun.connect(weak=False)
+    def task_finished(task_id=None, task=None, state=None, **kwargs):
+        started = running.pop(task_id, None)
+        db_time = stop_db_timer()
+
+        if started is None:
+            return
+
+        started_at, perf_started, enqueued_at = started
+        wait = max(0.0, started_at - enqueued_at) if enqueued_at else None
+
+        try:
+            get_stats().record(task.name, state or 'UNKNOWN', wait, time.perf_counter() - perf_started, db_time)
+        except Exception as err:
+            task.get_logger().warning('Could not record task stats: {}'.format(str(err)))
+
+
+def main():
+    args = docopt(__doc__)
+
+    cfg = load_config(args['--config'])
+
+    summary = TaskStats.from_url(cfg.tasks.stats_redis_url).summary()
+
+    if args['--json']:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print('{:<36} {:>8} {:>8} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'task', 'success', 'retry', 'failure', 'per sec', 'wait p50', 'wait p99', 'run p50', 'run p99'))
+    for name, task in summary.items():
+        print('{:<36} {:>8} {:>8} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+            name,
+            task['counts'].get('SUCCESS', 0),
+            task['counts'].get('RETRY', 0),
+            task['counts'].get('FAILURE', 0),
+            task['throughput_per_sec'],
+            task['wait_p50_ms'],
+            task['wait_p99_ms'],
+            task['runtime_p50_ms'],
+            task['runtime_p99_ms']
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""
+Link persons to the address and the IP address they most likely belong to
+
+Persons, addresses and IP addresses are blocked by five digit zip code,
+records are only compared within the same zip code. In a block an address is a
+candidate of a person when the house numbers agree, an IP address when it
+was seen within --window-hours of the person's created date. Every person
+matched gets a MatchLink with the address and IP address scoring at least
+the minimum, and Person.ipaddress_id is set from it, or cleared by a
+rematch that links no IP address.
+
+Usage:
+    matching.py [--config=<path>] [--block-size=<n>] [--min-address-score=<s>] [--min-ip-score=<s>]
+                [--window-hours=<h>] [--rematch]
+
+Options:
+    --config=<path>             Config file, defaults to PROSPECTOR_CONFIG or config/config.yaml
+    --block-size=<n>            Zip codes matched per batch [default: 100]
+    --min-address-score=<s>     Lowest address score linked [default: 0.7]
+    --min-ip-score=<s>          Lowest IP address score linked [default: 0.6]
+    --window-hours=<h>          IP addresses seen this close to a person are candidates [default: 24]
+    --rematch                   Match every person again, not only the ones without a link
+"""
+
+import time
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from docopt import docopt
+import sqlalchemy as sa
+from prospector.config import load_config
+from prospector.db.manager import DBManager
+from prospector.db.models import Address, IPAddress, MatchLink, Person
+from prospector.db.spatial import haversine_km
+from prospector.normalize import (normalize_city, normalize_postcode, normalize_state, normalize_street,
+                                  split_address_line)
+
+PERSON_COLUMNS = ('id', 'created_date', 'address1', 'city', 'state', 'zip_code')
+ADDRESS_COLUMNS = ('id', 'number', 'street', 'city', 'postcode', 'lat', 'lon')
+IPADDRESS_COLUMNS = ('id', 'created_date', 'city', 'region', 'region_name', 'postal_code', 'latitude', 'longitude')
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def token_similarity(a, b):
+    """
+    Jaccard similarity of the words of two normalized strings
+    :return: float: 0 to 1
+    """
+    if a == b:
+        return 1.0 if a else 0.0
+
+    a, b = set(a.split()), set(b.split())
+
+    if not a or not b:
+        return 0.0
+
+    return len(a & b) / float(len(a | b))
+
+
+def agreement(a, b):
+    """
+    1 when two normalized fields agree, 0 when they differ, 0.5 when either is unknown
+    """
+    if not a or not b:
+        return 0.5
+
+    return 1.0 if a == b else 0.0
+
+
+class Block(object):
+    """
+    The addresses and IP addresses of one zip code, keyed for matching
+    Addresses are grouped by house number, IP addresses sorted by created
+    date so the ones in a time window are found by bisection
+    :return block
+    """
+
+    def __init__(self):
+        self.addresses = {}
+        self.ip_dates = []
+        self.ipaddresses = []
+
+    def add_address(self, row):
+        self.addresses.setdefault(str(row.number), []).append(
+            (row.id, normalize_street(row.street), normalize_city(row.city), row.lat, row.lon)
+        )
+
+    def add_ipaddresses(self, rows):
+        entries = sorted(
+            (row.created_date, row.id, normalize_city(row.city),
+             normalize_state(row.region) or normalize_state(row.region_name),
+             to_float(row.latitude), to_float(row.longitude))
+            for row in rows if row.created_date is not None
+        )
+        self.ip_dates = [entry[0] for entry in entries]
+        self.ipaddresses = entries
+
+
+class Matcher(object):
+    """
+    Score the candidates of a person in a block and keep the best of each
+    An address candidate already agrees on zip code and house number, it
+    scores on street words and city. An IP address candidate already agrees
+    on zip code, it scores on how close in time it was seen, city, state
+    and distance to the matched address
+    :return matcher
+    """
+    number_weight = 0.2
+    street_weight = 0.65
+    city_weight = 0.15
+
+    ip_postal_weight = 0.3
+    ip_time_weight = 0.3
+    ip_city_weight = 0.2
+    ip_state_weight = 0.1
+    ip_distance_weight = 0.1
+    ip_max_km = 50.0
+
+    def __init__(self, min_address_score=0.7, min_ip_score=0.6, window_hours=24.0):
+        self.min_address_score = min_address_score
+        self.min_ip_score = min_ip_score
+        self.window = timedelta(hours=window_hours)
+        self.candidates = 0
+
+    def match_address(self, number, street, city, block):
+        """
+        :return: tuple: (address entry, score) or (None, None)
+        """
+        best, best_score = None, None
+        entries = block.addresses.get(number, ()) if number else ()
+        self.candidates += len(entries)
+
+        for entry in entries:
+            score = (self.number_weight + self.street_weight * token_similarity(street, entry[1]) +
+                     self.city_weight * agreement(city, entry[2]))
+
+            if best_score is None or score > best_score:
+                best, best_score = entry, score
+
+        if best_score is None or best_score < self.min_address_score:
+            return None, None
+
+        return best, round(best_score, 3)
+
+    def match_ipaddress(self, created, city, state, point, block):
+        """
+        :param point: tuple: (lat, lon) of the matched address, or None
+        :return: tuple: (IP address entry, score) or (None, None)
+        """
+        if created is None:
+            return None, None
+
+        lo = bisect_left(block.ip_dates, created - self.window)
+        hi = bisect_right(block.ip_dates, created + self.window, lo)
+        self.candidates += hi - lo
+        window = self.window.total_seconds()
+        best, best_score = None, None
+
+        for entry in block.ipaddresses[lo:hi]:
+            closeness = 1 - abs((entry[0] - created).total_seconds()) / window if window else 1.0
+
+            if point is None or entry[4] is None or entry[5] is None:
+                nearness = 0.5
+            else:
+                nearness = max(0.0, 1 - haversine_km(point[0], point[1], entry[4], entry[5]) / self.ip_max_km)
+
+            score = (self.ip_postal_weight + self.ip_time_weight * closeness +
+                     self.ip_city_weight * agreement(city, entry[2]) +
+                     self.ip_state_weight * agreement(state, entry[3]) +
+                     self.ip_distance_weight * nearness)
+
+            if best_score is None or score > best_score:
+                best, best_score = entry, score
+
+        if best_score is None or best_score < self.min_ip_score:
+            return None, None
+
+        return best, round(best_score, 3)
+
+    def match_person(self, person, block):
+        """
+        :param person: row with PERSON_COLUMNS
+        :param block: Block of the person's zip code
+        :return: dict: MatchLink columns
+        """
+        number, street = split_address_line(person.address1)
+        city = normalize_city(person.city)
+        address, address_score = self.match_address(number, street, city, block)
+        point = (address[3], address[4]) if address is not None and address[3] is not None else None
+        ipaddress, ipaddress_score = self.match_ipaddress(
+            person.created_date, city, normalize_state(person.state), point, block
+        )
+
+        return {
+            'person_id': person.id,
+            'address_id': address[0] if address is not None else None,
+            'address_score': address_score,
+            'ipaddress_id': ipaddress[1] if ipaddress is not None else None,
+            'ipaddress_score': ipaddress_score,
+            'postal_code': normalize_postcode(person.zip_code)
+        }
+
+
+def postcode_filter(column, codes):
+    """
+    Rows whose zip code starts with one of codes, ZIP+4 included
+    A range per code, so the zip code index is still used. Digits and '-'
+    sort before letters in binary and MySQL collations alike
+    :param column: zip code column
+    :param codes: five digit zip codes
+    :return: filter criteria
+    """
+    return sa.or_(*[sa.and_(column >= code, column < code + 'a') for code in codes])
+
+
+def load_blocks(codes, session):
+    """
+    Read the addresses and IP addresses of many zip codes at once
+    Stored zip codes are normalized to five digits, a ZIP+4 lands in the
+    block of its ZIP
+    :param codes: five digit zip codes
+    :param session:
+    :return: dict: zip code -> Block
+    """
+    codes = set(codes)
+    blocks = {}
+    ipaddresses = {}
+
+    for row in Address.select_rows(session, (postcode_filter(Address.postcode, codes),), ADDRESS_COLUMNS):
+        code = normalize_postcode(row.postcode)
+        if code in codes:
+            blocks.setdefault(code, Block()).add_address(row)
+
+    for row in IPAddress.select_rows(session, (postcode_filter(IPAddress.postal_code, codes),), IPADDRESS_COLUMNS):
+        code = normalize_postcode(row.postal_code)
+        if code in codes:
+            ipaddresses.setdefault(code, []).append(row)
+
+    for code, rows in ipaddresses.items():
+        blocks.setdefault(code, Block()).add_ipaddresses(rows)
+
+    return blocks
+
+
+def match_persons(mgr, matcher, block_size=100, rematch=False):
+    """
+    Match the persons without a link, or every person with rematch,
+    block_size zip codes at a time
+    :param mgr: DBManager
+    :param matcher: Matcher
+    :param block_size:
+    :param rematch:
+    :return: dict: counts and timings
+    """
+    session = mgr.session
+    codes = Person.get_match_blocks(session, rematch)
+    stats = {'zip_codes': len(codes), 'persons': 0, 'addresses_linked': 0, 'ipaddresses_linked': 0,
+             'candidates': 0, 'load_s': 0.0, 'match_s': 0.0, 'write_s': 0.0}
+    matcher.candidates = 0
+
+    for i in range(0, len(codes), block_size):
+        chunk = codes[i:i + block_size]
+        chunk_codes = set(chunk)
+        started = time.perf_counter()
+
+        filters = [postcode_filter(Person.zip_code, chunk)]
+        if not rematch:
+            filters.append(~sa.exists().where(MatchLink.person_id == Person.id))
+
+        persons = [person for person in Person.select_rows(session, filters, PERSON_COLUMNS)
+                   if normalize_postcode(person.zip_code) in chunk_codes]
+        blocks = load_blocks(chunk, session)
+        loaded = time.perf_counter()
+
+        empty = Block()
+        links = [matcher.match_person(person, blocks.get(normalize_postcode(person.zip_code), empty))
+                 for person in persons]
+        matched = time.perf_counter()
+
+        MatchLink.replace_links(links, [person.id for person in persons], session)
+        # a rematch clears the IP address of a person no longer matched to one
+        ipaddresses = [{'person_pk_id': link['person_id'], 'ipaddress_id': link['ipaddress_id']}
+                       for link in links if rematch or link['ipaddress_id'] is not None]
+        if ipaddresses:
+            Person.set_ipaddresses(ipaddresses, session)
+
+        stats['persons'] += len(persons)
+        stats['addresses_linked'] += sum(1 for link in links if link['address_id'] is not None)
+        stats['ipaddresses_linked'] += sum(1 for link in links if link['ipaddress_id'] is not None)
+        stats['load_s'] += loaded - started
+        stats['match_s'] += matched - loaded
+        stats['write_s'] += time.perf_counter() - matched
+
+    stats['candidates'] = matcher.candidates
+    stats['match_s_per_million_candidates'] = (
+        stats['match_s'] / matcher.candidates * 1000000 if matcher.candidates else None
+    )
+    return stats
+
+
+def main():
+    args = docopt(__doc__)
+
+    cfg = load_config(args['--config'])
+
+    mgr = DBManager.from_config(cfg.db)
+    matcher = Matcher(
+        float(args['--min-address-score']),
+        float(args['--min-ip-score']),
+        float(args['--window-hours'])
+    )
+
+    started = time.time()
+    stats = match_persons(mgr, matcher, int(args['--block-size']), args['--rematch'])
+    print('Matched {} persons in {:.1f}s: {}'.format(stats['persons'], time.time() - started, stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import falcon
+from falcon.media import BaseHandler
+from prospector.serializers import json_functions
+
+
+class JSONHandler(BaseHandler):
+    """
+    JSON media handler on a pluggable JSON library, orjson when installed
+    Dates, times and decimals are encoded the same way by every library
+    """
+
+    def __init__(self, library='auto'):
+        self.dumps, self.loads = json_functions(library)
+
+    def deserialize(self, stream, content_type, content_length):
+        return self.deserialize_bytes(stream.read())
+
+    async def deserialize_async(self, stream, content_type, content_length):
+        return self.deserialize_bytes(await stream.read())
+
+    def deserialize_bytes(self, data):
+        # same errors as falcon's own handler, so get_media() defaults still work
+        if not data:
+            raise falcon.MediaNotFoundError('JSON')
+
+        try:
+            return self.loads(data)
+        except ValueError as err:
+            raise falcon.MediaMalformedError('JSON') from err
+
+    def serialize(self, media, content_type):
+        return self.dumps(media)
+
+    async def serialize_async(self, media, content_type):
+        return self.dumps(media)
+
+
+def install_json_handler(app, library='auto'):
+    """
+    Serve and parse JSON of a falcon app with JSONHandler
+    :param app: falcon.API or falcon.asgi.App
+    :param library: auto, orjson or json
+    :return: JSONHandler
+    """
+    handler = JSONHandler(library)
+    app.req_options.media_handlers[falcon.MEDIA_JSON] = handler
+    app.resp_options.media_handlers[falcon.MEDIA_JSON] = handler
+    return handler
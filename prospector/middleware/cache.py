@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import time
+from datetime import datetime
+from functools import partial
+import falcon
+from prospector.serializers import dumps
+
+
+def not_modified(req, etag, last_modified):
+    """
+    Does the client already hold this representation
+    :return: bool
+    """
+    if_none_match = req.get_header('If-None-Match')
+
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags or 'W/' + etag in tags
+
+    if_modified_since = req.get_header('If-Modified-Since')
+
+    if if_modified_since:
+        try:
+            since = falcon.http_date_to_dt(if_modified_since)
+        except ValueError:
+            return False
+        return int(last_modified) <= (since - datetime(1970, 1, 1)).total_seconds()
+
+    return False
+
+
+class ResponseCacheMiddleware(object):
+    """
+    Cache serialized GET responses of resources with a cache_namespace
+    Sends ETag and Last-Modified and answers conditional GETs with 304.
+    Keys carry the namespace generation, so BaseResource.invalidate()
+    drops every cached response of the resource at once
+    :param cache: TTLCache or RedisCache
+    :param executor: runs the cache calls of a blocking cache in the ASGI app
+    """
+
+    def __init__(self, cache, executor=None):
+        self.cache = cache
+        self.executor = executor
+
+    def cache_key(self, req, namespace):
+        generation = self.cache.counter(namespace)
+        query = '&'.join(sorted(req.query_string.split('&'))) if req.query_string else ''
+        return 'response:{}:{}:{}?{}'.format(namespace, generation, req.path, query)
+
+    def process_resource(self, req, resp, resource, params):
+        namespace = getattr(resource, 'cache_namespace', None)
+
+        if req.method != 'GET' or namespace is None:
+            return
+
+        key = self.cache_key(req, namespace)
+        req.context['cache_key'] = key
+        entry = self.cache.get(key)
+
+        if entry is None:
+            return
+
+        req.context['cache_hit'] = True
+        self.send(req, resp, entry)
+        resp.complete = True
+
+    def process_response(self, req, resp, resource, req_succeeded):
+        key = req.context.get('cache_key')
+
+        if not key or req.context.get('cache_hit') or not req_succeeded:
+            return
+
+        if not str(resp.status).startswith('200') or resp.media is None or resp.stream is not None:
+            return
+
+        body = dumps(resp.media).decode('utf-8')
+        entry = {
+            'body': body,
+            'etag': '"{}"'.format(hashlib.sha1(body.encode('utf-8')).hexdigest()),
+            'last_modified': int(time.time())
+        }
+
+        self.cache.set(key, entry)
+        self.send(req, resp, entry)
+
+    async def run_async(self, method, *args):
+        # the in-process cache runs on the loop, Redis round trips on the executor
+        if not getattr(self.cache, 'blocking', True):
+            return method(*args)
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(method, *args))
+
+    async def process_resource_async(self, req, resp, resource, params):
+        await self.run_async(self.process_resource, req, resp, resource, params)
+
+    async def process_response_async(self, req, resp, resource, req_succeeded):
+        await self.run_async(self.process_response, req, resp, resource, req_succeeded)
+
+    def send(self, req, resp, entry):
+        resp.set_header('ETag', entry['etag'])
+        resp.set_header('Last-Modified', falcon.dt_to_http(datetime.utcfromtimestamp(entry['last_modified'])))
+        resp.media = None
+
+        if not_modified(req, entry['etag'], entry['last_modified']):
+            resp.status = falcon.HTTP_304
+            resp.data = None
+            return
+
+        resp.status = falcon.HTTP_200
+        resp.content_type = falcon.MEDIA_JSON
+        resp.data = entry['body'].encode('utf-8')
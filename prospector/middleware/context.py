@@ -45,3 +45,6 @@ class ContextMiddleware(object):
     """
     def process_request(self, req, resp):
         set_context(req, resp)
+
+    async def process_request_async(self, req, resp):
+        set_context(req, resp)
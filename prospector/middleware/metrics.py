@@ -0,0 +1,119 @@
+import os
+import time
+import falcon
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+from prospector.db.timing import start_db_timer, stop_db_timer
+
+# set PROMETHEUS_MULTIPROC_DIR before the workers fork to aggregate across them
+MULTIPROC_DIR = 'PROMETHEUS_MULTIPROC_DIR'
+
+REQUEST_LATENCY = Histogram(
+    'prospector_request_latency_seconds',
+    'Request latency by route',
+    ['method', 'route']
+)
+REQUEST_DB_TIME = Histogram(
+    'prospector_request_db_seconds',
+    'Time spent in SQLAlchemy per request by route',
+    ['method', 'route'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0)
+)
+REQUEST_COUNT = Counter(
+    'prospector_requests_total',
+    'Responses by route and status code',
+    ['method', 'route', 'status']
+)
+IN_FLIGHT = Gauge(
+    'prospector_requests_in_flight',
+    'Requests being handled',
+    multiprocess_mode='livesum'
+)
+POOL_CHECKED_OUT = Gauge(
+    'prospector_db_pool_checked_out',
+    'Database connections checked out of the pool',
+    multiprocess_mode='livesum'
+)
+POOL_OVERFLOW = Gauge(
+    'prospector_db_pool_overflow',
+    'Database connections opened beyond pool_size',
+    multiprocess_mode='livesum'
+)
+POOL_WAIT = Histogram(
+    'prospector_db_pool_wait_seconds',
+    'Time waited for a pooled database connection',
+    buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5, 1.0, 5.0, 30.0)
+)
+
+
+def route_of(req):
+    return getattr(req, 'uri_template', None) or 'unmatched'
+
+
+class MetricsMiddleware(object):
+    """
+    Record per-route latency, DB time, status codes and in-flight requests,
+    plus the connection pool state of the db manager when given one
+    """
+
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager
+
+        if db_manager is not None and hasattr(db_manager.engine.pool, 'on_wait'):
+            db_manager.engine.pool.on_wait = POOL_WAIT.observe
+
+    def process_request(self, req, resp):
+        req.context['metrics_started'] = time.perf_counter()
+        start_db_timer()
+        IN_FLIGHT.inc()
+
+    def process_response(self, req, resp, resource, req_succeeded):
+        started = req.context.get('metrics_started')
+
+        if started is None:
+            return
+
+        route = route_of(req)
+        REQUEST_LATENCY.labels(req.method, route).observe(time.perf_counter() - started)
+        # db_time is set by the ASGI app, its queries run on executor threads
+        REQUEST_DB_TIME.labels(req.method, route).observe(stop_db_timer() + req.context.get('db_time', 0.0))
+        REQUEST_COUNT.labels(req.method, route, str(resp.status).split(' ')[0]).inc()
+        IN_FLIGHT.dec()
+
+        if self.db_manager is not None:
+            stats = self.db_manager.pool_stats()
+            if 'checked_out' in stats:
+                POOL_CHECKED_OUT.set(stats['checked_out'])
+                POOL_OVERFLOW.set(max(0, stats['overflow']))
+
+    async def process_request_async(self, req, resp):
+        self.process_request(req, resp)
+
+    async def process_response_async(self, req, resp, resource, req_succeeded):
+        self.process_response(req, resp, resource, req_succeeded)
+
+
+class MetricsResource(object):
+    """
+    Prometheus text exposition of the service metrics
+    :return metrics
+    """
+
+    def on_get(self, req, resp):
+        if os.environ.get(MULTIPROC_DIR):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+
+        resp.status = falcon.HTTP_200
+        resp.content_type = CONTENT_TYPE_LATEST
+        resp.data = generate_latest(registry)
+
+
+def child_exit(server, worker):
+    """
+    Gunicorn hook, drop the live gauges of a dead worker
+    """
+    if os.environ.get(MULTIPROC_DIR):
+        multiprocess.mark_process_dead(worker.pid)
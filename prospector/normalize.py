@@ -0,0 +1,152 @@
+import hashlib
+import re
+from functools import lru_cache
+
+# USPS street suffix and directional abbreviations, the common ones
+STREET_ABBREVIATIONS = {
+    'ALLEY': 'ALY', 'AVENUE': 'AVE', 'AV': 'AVE', 'BOULEVARD': 'BLVD', 'BOUL': 'BLVD', 'CIRCLE': 'CIR',
+    'COURT': 'CT', 'COVE': 'CV', 'DRIVE': 'DR', 'EXPRESSWAY': 'EXPY', 'FREEWAY': 'FWY', 'HIGHWAY': 'HWY',
+    'LANE': 'LN', 'LOOP': 'LOOP', 'PARKWAY': 'PKWY', 'PKY': 'PKWY', 'PLACE': 'PL', 'PLAZA': 'PLZ',
+    'POINT': 'PT', 'ROAD': 'RD', 'ROUTE': 'RTE', 'SQUARE': 'SQ', 'STREET': 'ST', 'STR': 'ST',
+    'TERRACE': 'TER', 'TRAIL': 'TRL', 'TURNPIKE': 'TPKE', 'WAY': 'WAY',
+    'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
+    'NORTHEAST': 'NE', 'NORTHWEST': 'NW', 'SOUTHEAST': 'SE', 'SOUTHWEST': 'SW'
+}
+
+STATE_CODES = {
+    'ALABAMA': 'AL', 'ALASKA': 'AK', 'ARIZONA': 'AZ', 'ARKANSAS': 'AR', 'CALIFORNIA': 'CA', 'COLORADO': 'CO',
+    'CONNECTICUT': 'CT', 'DELAWARE': 'DE', 'DISTRICT OF COLUMBIA': 'DC', 'FLORIDA': 'FL', 'GEORGIA': 'GA',
+    'HAWAII': 'HI', 'IDAHO': 'ID', 'ILLINOIS': 'IL', 'INDIANA': 'IN', 'IOWA': 'IA', 'KANSAS': 'KS',
+    'KENTUCKY': 'KY', 'LOUISIANA': 'LA', 'MAINE': 'ME', 'MARYLAND': 'MD', 'MASSACHUSETTS': 'MA',
+    'MICHIGAN': 'MI', 'MINNESOTA': 'MN', 'MISSISSIPPI': 'MS', 'MISSOURI': 'MO', 'MONTANA': 'MT',
+    'NEBRASKA': 'NE', 'NEVADA': 'NV', 'NEW HAMPSHIRE': 'NH', 'NEW JERSEY': 'NJ', 'NEW MEXICO': 'NM',
+    'NEW YORK': 'NY', 'NORTH CAROLINA': 'NC', 'NORTH DAKOTA': 'ND', 'OHIO': 'OH', 'OKLAHOMA': 'OK',
+    'OREGON': 'OR', 'PENNSYLVANIA': 'PA', 'PUERTO RICO': 'PR', 'RHODE ISLAND': 'RI', 'SOUTH CAROLINA': 'SC',
+    'SOUTH DAKOTA': 'SD', 'TENNESSEE': 'TN', 'TEXAS': 'TX', 'UTAH': 'UT', 'VERMONT': 'VT', 'VIRGINIA': 'VA',
+    'WASHINGTON': 'WA', 'WEST VIRGINIA': 'WV', 'WISCONSIN': 'WI', 'WYOMING': 'WY'
+}
+
+UNIT_DESIGNATORS = frozenset([
+    'APT', 'APARTMENT', 'UNIT', 'STE', 'SUITE', 'NO', 'NUM', 'NUMBER', 'RM', 'ROOM', 'FL', 'FLOOR',
+    'BLDG', 'BUILDING', 'LOT', 'SPC', 'SPACE', 'TRLR', 'DEPT', 'OFC', 'OFFICE'
+])
+
+NON_WORD = re.compile(r'[^A-Z0-9]+')
+HOUSE_NUMBER = re.compile(r'^\s*(\d+)[A-Za-z]?\b[\s,]*(.*)$')
+
+
+def normalize_text(value):
+    """
+    Upper case words separated by single spaces, punctuation dropped
+    :param value: str or None
+    :return: str, empty for None
+    """
+    if value is None:
+        return ''
+
+    return NON_WORD.sub(' ', str(value).upper()).strip()
+
+
+@lru_cache(maxsize=65536)
+def normalize_street(street):
+    """
+    Street name with USPS suffix and directional abbreviations
+    '123 North Main Street.' and '123 N Main St' normalize the same
+    :param street: str or None
+    :return: str
+    """
+    return ' '.join(STREET_ABBREVIATIONS.get(word, word) for word in normalize_text(street).split())
+
+
+@lru_cache(maxsize=65536)
+def normalize_city(city):
+    return normalize_text(city)
+
+
+@lru_cache(maxsize=65536)
+def normalize_state(state):
+    """
+    Two letter state code of a state code or name
+    :param state: str or None
+    :return: str, empty when unknown
+    """
+    state = normalize_text(state)
+    return state if len(state) == 2 else STATE_CODES.get(state, '')
+
+
+def normalize_region(region):
+    """
+    Two letter state code of a US state, other regions as normalized text
+    :param region: str or None
+    :return: str
+    """
+    return normalize_state(region) or normalize_text(region)
+
+
+def normalize_postcode(postcode):
+    """
+    Five digit ZIP of a ZIP or ZIP+4
+    :param postcode: str, int or None
+    :return: str, empty when there are no five digits
+    """
+    digits = ''.join(char for char in str(postcode or '') if char.isdigit())
+    return digits[:5] if len(digits) >= 5 else ''
+
+
+def split_address_line(line):
+    """
+    House number and normalized street of a one line street address
+    :param line: str, like '123 Main St'
+    :return: tuple: (number str or '', street str)
+    """
+    match = HOUSE_NUMBER.match(line or '')
+
+    if match is None:
+        return '', normalize_street(line)
+
+    return match.group(1).lstrip('0') or '0', normalize_street(match.group(2))
+
+
+def normalize_number(number):
+    """
+    House number without leading zeros, '0012' and 12 normalize the same
+    :param number: str, int or None
+    :return: str
+    """
+    number = normalize_text(number).replace(' ', '')
+    return number.lstrip('0') or ('0' if number else '')
+
+
+def normalize_unit(unit):
+    """
+    Unit identifier without its designator, 'Apt 4B', 'Unit 4b' and '#4B' normalize the same
+    :param unit: str or None
+    :return: str
+    """
+    return ' '.join(word for word in normalize_text(unit).split() if word not in UNIT_DESIGNATORS)
+
+
+def address_key(number, street, unit, city, region, postcode):
+    """
+    Canonical form of an address, every field normalized
+    Regions that aren't a US state and postcodes that aren't a ZIP are kept
+    as normalized text
+    :return: str
+    """
+    return '|'.join((
+        normalize_number(number),
+        normalize_street(street),
+        normalize_unit(unit),
+        normalize_city(city),
+        normalize_region(region),
+        normalize_postcode(postcode) or normalize_text(postcode)
+    ))
+
+
+def address_fingerprint(number, street, unit, city, region, postcode):
+    """
+    Fixed size hash of address_key, equal for the same address however it was spelled
+    :return: str: 32 hex characters
+    """
+    key = address_key(number, street, unit, city, region, postcode)
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
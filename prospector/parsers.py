@@ -0,0 +1,134 @@
+import re
+from html.parser import HTMLParser
+
+RESULT_TABLE_CLASS = 'Tableresultborder'
+
+
+class TableDone(Exception):
+    pass
+
+
+class ResultTableParser(HTMLParser):
+    """
+    Incremental parser that only builds the address check result table
+    Everything before the table is tokenized and dropped, and parsing stops
+    as soon as the table closes, so the rest of the page is never read
+    :return rows
+    """
+
+    def __init__(self, table_class=RESULT_TABLE_CLASS):
+        super(ResultTableParser, self).__init__(convert_charrefs=True)
+        self.table_class = table_class
+        self.rows = []
+        self.done = False
+        self._depth = 0
+        self._row = None
+        self._cell = None
+
+    def feed(self, data):
+        if self.done:
+            return
+
+        if isinstance(data, bytes):
+            data = data.decode('utf-8', 'replace')
+
+        try:
+            super(ResultTableParser, self).feed(data)
+        except TableDone:
+            self.done = True
+
+    def handle_starttag(self, tag, attrs):
+        if not self._depth:
+            if tag == 'table' and self.table_class in (dict(attrs).get('class') or '').split():
+                self._depth = 1
+            return
+
+        if tag == 'table':
+            self._depth += 1
+        elif tag == 'tr' and self._depth == 1:
+            # a table nested in a cell is text of that cell
+            self._close_row()
+            self._row = []
+        elif tag == 'td' and self._row is not None and self._depth == 1:
+            self._close_cell()
+            self._cell = []
+        elif tag == 'br' and self._cell is not None:
+            # the lines of a cell stay apart, like 123 Main St<br>Springfield
+            self._cell.append(' ')
+
+    def handle_endtag(self, tag):
+        if not self._depth:
+            return
+
+        if tag == 'table':
+            self._depth -= 1
+            if not self._depth:
+                self._close_row()
+                raise TableDone()
+        elif tag == 'td' and self._depth == 1:
+            self._close_cell()
+        elif tag == 'tr' and self._depth == 1:
+            self._close_row()
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def _close_cell(self):
+        if self._cell is not None:
+            self._row.append(''.join(self._cell).strip())
+            self._cell = None
+
+    def _close_row(self):
+        self._close_cell()
+        if self._row is not None:
+            self.rows.append(self._row)
+            self._row = None
+
+
+def parse_result_table(doc):
+    """
+    Cell text of every row in the result table, one list per row
+    :param doc: str or bytes
+    :return: list of lists, empty when the page has no result table
+    """
+    parser = ResultTableParser()
+    parser.feed(doc)
+    return parser.rows
+
+
+def _field_name(label):
+    return re.sub(r'[^a-z0-9]+', '_', label.lower()).strip('_')
+
+
+def parse_owner_records(doc):
+    """
+    Owner records from the result table
+    Label/value rows are collected into a record, a blank row or a repeated
+    label starts the next record
+    :param doc: str or bytes
+    :return: list of dicts
+    """
+    records = []
+    record = {}
+
+    for row in parse_result_table(doc):
+        cells = [cell for cell in row if cell]
+
+        if len(cells) < 2:
+            if record:
+                records.append(record)
+                record = {}
+            continue
+
+        field = _field_name(cells[0])
+        if field in record:
+            records.append(record)
+            record = {}
+
+        record[field] = ' '.join(cells[1:])
+
+    if record:
+        records.append(record)
+
+    return records
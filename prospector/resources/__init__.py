@@ -1,3 +1,70 @@
+import falcon
+from datetime import datetime
+
+DATE_FORMATS = ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d')
+
+
+def parse_date(value):
+    """
+    Parse an ISO 8601 date or datetime string from a request body
+    :param value: str
+    :return: datetime
+    """
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value[:19], fmt)
+        except (TypeError, ValueError):
+            continue
+
+    raise falcon.HTTPBadRequest(
+        'Invalid date',
+        '{} is not an ISO 8601 date'.format(value)
+    )
+
+
 class BaseResource(object):
-    def __init__(self, db_manager):
+    default_page_size = 100
+    max_page_size = 1000
+    cache_namespace = None
+
+    def __init__(self, db_manager, cache=None):
         self.db = db_manager
+        self.cache = cache
+
+    def invalidate(self):
+        """
+        Drop every cached response of this resource
+        :return: none
+        """
+        if self.cache is not None and self.cache_namespace:
+            self.cache.incr(self.cache_namespace)
+
+    def list_models(self, req, resp, model, key='result', filters=()):
+        """
+        Keyset paginated list of a model
+        ?limit=<n>&after=<id> pages on id, ?stream=true streams NDJSON
+        :return: none
+        """
+        after = req.get_param_as_int('after')
+        limit = req.get_param_as_int('limit')
+
+        if limit is not None and limit < 1:
+            raise falcon.HTTPBadRequest(
+                'Invalid limit',
+                'limit must be a positive integer'
+            )
+
+        if req.get_param_as_bool('stream'):
+            resp.status = falcon.HTTP_200
+            resp.content_type = 'application/x-ndjson'
+            resp.stream = model.serializer().ndjson(model.iter_rows(self.db.session, after, limit, filters=filters))
+            return
+
+        limit = min(limit or self.default_page_size, self.max_page_size)
+        rows = model.get_page_rows(self.db.session, after, limit, filters=filters)
+
+        resp.status = falcon.HTTP_200
+        resp.media = {
+            key: model.serializer().to_dicts(rows),
+            'next': rows[-1].id if len(rows) == limit else None
+        }
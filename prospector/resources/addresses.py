@@ -0,0 +1,88 @@
+import falcon
+from prospector.db import models
+from prospector.resources import BaseResource
+
+
+class AddressResource(BaseResource):
+    """
+    The Address Resource
+    ?lat=<lat>&lon=<lon>&radius_km=<km> lists the nearest addresses first,
+    ?bbox=<south>,<west>,<north>,<east> lists the addresses inside a box
+    :return addresses
+    """
+    cache_namespace = 'address'
+    max_radius_km = 100.0
+
+    def on_get(self, req, resp):
+        lat = req.get_param_as_float('lat', min_value=-90.0, max_value=90.0)
+        lon = req.get_param_as_float('lon', min_value=-180.0, max_value=180.0)
+        bbox = req.get_param('bbox')
+
+        if lat is not None or lon is not None:
+            self.get_radius(req, resp, lat, lon)
+        elif bbox is not None:
+            self.get_bbox(req, resp, bbox)
+        else:
+            self.list_models(req, resp, models.Address)
+
+    def get_limit(self, req):
+        limit = req.get_param_as_int('limit', min_value=1)
+        return min(limit or self.default_page_size, self.max_page_size)
+
+    def get_radius(self, req, resp, lat, lon):
+        radius_km = req.get_param_as_float('radius_km', required=True, min_value=0.0,
+                                           max_value=self.max_radius_km)
+
+        if lat is None or lon is None:
+            raise falcon.HTTPBadRequest(
+                'Invalid point',
+                'lat and lon are both required'
+            )
+
+        if radius_km <= 0:
+            raise falcon.HTTPBadRequest(
+                'Invalid radius',
+                'radius_km must be greater than 0'
+            )
+
+        found = models.Address.within_radius(lat, lon, radius_km, self.db.session, limit=self.get_limit(req))
+        serializer = models.Address.serializer()
+        results = []
+
+        for row, distance in found:
+            result = serializer.to_dict(row)
+            result['distance_km'] = round(distance, 3)
+            results.append(result)
+
+        resp.status = falcon.HTTP_200
+        resp.media = {
+            'result': results
+        }
+
+    def get_bbox(self, req, resp, bbox):
+        try:
+            south, west, north, east = [float(value) for value in bbox.split(',')]
+        except ValueError:
+            raise falcon.HTTPBadRequest(
+                'Invalid bbox',
+                'bbox is south,west,north,east'
+            )
+
+        if not (-90.0 <= south <= north <= 90.0 and -180.0 <= west <= 180.0 and -180.0 <= east <= 180.0):
+            raise falcon.HTTPBadRequest(
+                'Invalid bbox',
+                'bbox is south,west,north,east in degrees, south <= north'
+            )
+
+        if south == north or west == east:
+            raise falcon.HTTPBadRequest(
+                'Invalid bbox',
+                'bbox must have an area, south < north and west != east'
+            )
+
+        rows = models.Address.within_bbox(south, west, north, east, self.db.session, limit=self.get_limit(req))
+
+        resp.status = falcon.HTTP_200
+        resp.media = {
+            'result': models.Address.serializer().to_dicts(rows)
+        }
@@ -0,0 +1,255 @@
+import json
+import zlib
+import falcon
+import jsonschema
+from sqlalchemy.exc import DBAPIError
+from prospector.resources import BaseResource
+
+READ_SIZE = 64 * 1024
+
+
+class BodyTooLarge(ValueError):
+    pass
+
+
+def read_chunks(stream, size=READ_SIZE):
+    while True:
+        chunk = stream.read(size)
+
+        if not chunk:
+            break
+
+        yield chunk
+
+
+def gunzip_chunks(chunks, size=READ_SIZE):
+    """
+    Inflate gzip data in pieces of at most size bytes, so a small body
+    can't inflate all at once. Every member of a multi-member body is
+    inflated, a body ending inside a member raises zlib.error
+    :param chunks: iterable of bytes
+    :return: generator of bytes
+    """
+    inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    started = False
+
+    for data in chunks:
+        while data:
+            started = True
+            piece = inflate.decompress(data, size)
+
+            if piece:
+                yield piece
+
+            if inflate.eof:
+                # the next member starts in the unused data or the next chunk
+                data = inflate.unused_data
+                inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                started = False
+            else:
+                data = inflate.unconsumed_tail
+
+        # output held back by the size limit
+        while started and not inflate.eof:
+            piece = inflate.decompress(b'', size)
+            if not piece:
+                break
+            yield piece
+
+    if started and not inflate.eof:
+        raise zlib.error('gzip body ends inside a member')
+
+
+def body_chunks(stream, gzipped=False, size=READ_SIZE, max_size=None):
+    """
+    Read a request body in chunks, inflating it on the fly when gzipped
+    :param stream: file like object with read(size)
+    :param gzipped: body is gzip compressed
+    :param max_size: most bytes read, after inflating, BodyTooLarge past it
+    :return: generator of bytes
+    """
+    chunks = read_chunks(stream, size)
+    total = 0
+
+    if gzipped:
+        chunks = gunzip_chunks(chunks, size)
+
+    for chunk in chunks:
+        total += len(chunk)
+
+        if max_size is not None and total > max_size:
+            raise BodyTooLarge('Body larger than {} bytes{}'.format(max_size, ' inflated' if gzipped else ''))
+
+        yield chunk
+
+
+def ndjson_records(chunks, max_line=None):
+    """
+    Split NDJSON into numbered lines, blank lines are skipped
+    A line longer than max_line bytes is dropped and reported as an error
+    :param chunks: iterable of bytes
+    :param max_line: most bytes in a line, None for no limit
+    :return: generator of tuple: (line number, bytes or None, error message or None)
+    """
+    buffered = bytearray()
+    number = 0
+    # dropping the rest of a line too long
+    dropping = False
+
+    for chunk in chunks:
+        start = 0
+
+        while start <= len(chunk):
+            end = chunk.find(b'\n', start)
+            stop = len(chunk) if end < 0 else end
+
+            if not dropping:
+                buffered += chunk[start:stop]
+
+                if max_line is not None and len(buffered) > max_line:
+                    yield number + 1, None, 'Line longer than {} bytes'.format(max_line)
+                    buffered.clear()
+                    dropping = True
+
+            if end < 0:
+                break
+
+            number += 1
+
+            if not dropping and buffered.strip():
+                yield number, bytes(buffered), None
+
+            buffered.clear()
+            dropping = False
+            start = end + 1
+
+    if not dropping and buffered.strip():
+        yield number + 1, bytes(buffered), None
+
+
+class BulkResource(BaseResource):
+    """
+    Bulk load NDJSON, one record per line, optionally gzip encoded
+    Each line is validated against the schema of the single record POST
+    and valid rows are inserted in batched transactions. Bad lines are
+    reported by line number, they never reject the rest of the upload
+    """
+    model = None
+    schema = None
+    batch_size = 1000
+    max_errors = 1000
+    max_line_bytes = 1024 * 1024
+    # after inflating a gzip body
+    max_body_bytes = 512 * 1024 * 1024
+    # read the body from bounded_stream, the ASGI app must not parse it as JSON
+    streams_body = True
+
+    def __init__(self, db_manager, cache=None):
+        super(BulkResource, self).__init__(db_manager, cache)
+        self.validator = jsonschema.validators.validator_for(self.schema)(
+            self.schema, format_checker=jsonschema.FormatChecker()
+        )
+
+    # callable mapping a validated record to column values, set with staticmethod
+    # it raises ValueError or falcon.HTTPError to reject the line
+    to_row = None
+
+    def on_post(self, req, resp):
+        encoding = (req.get_header('Content-Encoding') or '').lower()
+
+        if encoding not in ('', 'identity', 'gzip'):
+            raise falcon.HTTPUnsupportedMediaType(
+                'Unsupported Content-Encoding',
+                'Send NDJSON as is or gzip encoded'
+            )
+
+        report = {'received': 0, 'inserted': 0, 'failed': 0, 'errors': []}
+        batch = []
+
+        chunks = body_chunks(req.bounded_stream, encoding == 'gzip', max_size=self.max_body_bytes)
+
+        try:
+            for number, line, error in ndjson_records(chunks, self.max_line_bytes):
+                report['received'] += 1
+
+                if error is not None:
+                    self.add_error(report, number, error)
+                    continue
+
+                row = self.parse_line(number, line, report)
+
+                if row is not None:
+                    batch.append((number, row))
+
+                if len(batch) >= self.batch_size:
+                    self.insert_batch(batch, report)
+                    batch = []
+        except zlib.error as err:
+            # keep what was read before the corrupt block
+            self.add_error(report, report['received'] + 1, 'Invalid gzip body: {}'.format(str(err)))
+        except BodyTooLarge as err:
+            # keep what was read before the limit
+            self.add_error(report, report['received'] + 1, str(err))
+
+        if batch:
+            self.insert_batch(batch, report)
+
+        if report['inserted']:
+            self.invalidate()
+
+        report['errors_truncated'] = report['failed'] > len(report['errors'])
+        resp.status = falcon.HTTP_200
+        resp.media = report
+
+    def parse_line(self, number, line, report):
+        try:
+            record = json.loads(line.decode('utf-8'))
+        except ValueError as err:
+            self.add_error(report, number, 'Invalid JSON: {}'.format(str(err)))
+            return None
+
+        error = jsonschema.exceptions.best_match(self.validator.iter_errors(record))
+
+        if error is not None:
+            self.add_error(report, number, error.message)
+            return None
+
+        try:
+            return self.to_row(record)
+        except ValueError as err:
+            self.add_error(report, number, str(err))
+        except falcon.HTTPError as err:
+            self.add_error(report, number, err.description or err.title)
+
+        return None
+
+    def insert_batch(self, batch, report):
+        """
+        Insert a batch in one transaction, when the database rejects it
+        retry its rows one by one to find the bad lines
+        :return: none
+        """
+        table = self.model.__table__
+        session = self.db.session
+
+        try:
+            with session.begin():
+                session.execute(table.insert(), [row for number, row in batch])
+            report['inserted'] += len(batch)
+            return
+        except DBAPIError:
+            pass
+
+        for number, row in batch:
+            try:
+                with session.begin():
+                    session.execute(table.insert(), [row])
+                report['inserted'] += 1
+            except DBAPIError as err:
+                self.add_error(report, number, str(err.orig))
+
+    def add_error(self, report, number, message):
+        report['failed'] += 1
+
+        if len(report['errors']) < self.max_errors:
+            report['errors'].append({'line': number, 'error': message})
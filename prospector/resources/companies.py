@@ -11,15 +11,10 @@ class CompanyResource(BaseResource):
     The Company Resource
     :return company
     """
+    cache_namespace = 'company'
 
-    def on_get(self, req, resp, id):
-        data = models.Company.get_list(self.db.session)
-        company = data.as_dict()
-
-        resp.status = falcon.HTTP_200
-        resp.media = {
-            'result': company
-        }
+    def on_get(self, req, resp, id=None):
+        self.list_models(req, resp, models.Company)
 
     @validate(load_schema('company_schema'))
     def on_post(self, req, resp):
@@ -41,6 +36,8 @@ class CompanyResource(BaseResource):
                 'Error: {}'.format(str(err))
             )
 
+        self.invalidate()
+
         resp.status = falcon.HTTP_201
         resp.media = {
             'id': model.id
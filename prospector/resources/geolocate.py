@@ -0,0 +1,39 @@
+import falcon
+from falcon.media.validators.jsonschema import validate
+from prospector.schemas import load_schema
+
+
+class GeoLocateResource(object):
+    """
+    The GeoLocate Resource
+    :return location
+    """
+
+    def __init__(self, geo_cache):
+        self.geo = geo_cache
+
+    def on_get(self, req, resp, ip=None):
+        if ip is None:
+            raise falcon.HTTPBadRequest(
+                'Missing IP Address',
+                'GET /geolocate/<ip> or POST a list of ips to /geolocate'
+            )
+
+        location = self.geo.lookup(ip)
+
+        if location is None:
+            raise falcon.HTTPNotFound()
+
+        resp.status = falcon.HTTP_200
+        resp.media = {
+            'result': location
+        }
+
+    @validate(load_schema('geolocate_schema'))
+    def on_post(self, req, resp):
+        locations = self.geo.lookup_many(req.media.get('ips'))
+
+        resp.status = falcon.HTTP_200
+        resp.media = {
+            'result': locations
+        }
@@ -1,41 +1,105 @@
+import ipaddress
 import falcon
 from falcon.media.validators.jsonschema import validate
 from sqlalchemy.exc import IntegrityError
 from prospector.db import models
-from prospector.resources import BaseResource
+from prospector.resources import BaseResource, parse_date
+from prospector.resources.bulk import BulkResource
 from prospector.schemas import load_schema
 
 
+def ipaddress_fields(record):
+    """
+    IPAddress fields of a request record
+    :param record: dict validated against ipaddress_schema
+    :return: dict
+    """
+    ipaddress.ip_address(record.get('ip'))
+
+    return {
+        'created_date': parse_date(record.get('created_date')),
+        'ip': record.get('ip'),
+        'city': record.get('city'),
+        'time_zone': record.get('time_zone'),
+        'area_code': record.get('area_code'),
+        'metro_code': record.get('metro_code'),
+        'dma_code': record.get('dma_code'),
+        'postal_code': record.get('postal_code'),
+        'region': record.get('region'),
+        'region_name': record.get('region_name'),
+        'latitude': record.get('latitude'),
+        'longitude': record.get('longitude')
+    }
+
+
+def ipaddress_row(record):
+    """
+    IPAddress column values of a bulk record
+    :param record: dict validated against ipaddress_schema
+    :return: dict
+    """
+    row = ipaddress_fields(record)
+    row['ip_packed'] = row['ip']
+    return row
+
+
 class IPAddressResource(BaseResource):
     """
     The IPAddress Resource
     :return ip
     """
+    cache_namespace = 'ipaddress'
+
+    def on_get(self, req, resp, ip=None):
+        if ip is not None:
+            self.get_ip(req, resp, ip)
+            return
+
+        cidr = req.get_param('cidr')
+        start = req.get_param('start')
+        end = req.get_param('end')
+
+        try:
+            if cidr:
+                filters = models.IPAddress.cidr_filter(cidr)
+            elif start or end:
+                filters = models.IPAddress.range_filter(start, end)
+            else:
+                filters = ()
+        except ValueError as err:
+            raise falcon.HTTPBadRequest(
+                'Invalid IP Address',
+                'Error: {}'.format(str(err))
+            )
 
-    def on_get(self, req, resp, ip):
-        ips = models.IPAddress.get_list(self.db.session)
-        address = ips.as_dict()
+        self.list_models(req, resp, models.IPAddress, filters=filters)
+
+    def get_ip(self, req, resp, ip):
+        try:
+            row = models.IPAddress.get_row_by_ip(ipaddress.ip_address(ip), self.db.session)
+        except ValueError as err:
+            raise falcon.HTTPBadRequest(
+                'Invalid IP Address',
+                'Error: {}'.format(str(err))
+            )
+
+        if row is None:
+            raise falcon.HTTPNotFound()
 
         resp.status = falcon.HTTP_200
         resp.media = {
-            'result': address
+            'result': models.IPAddress.serializer().to_dict(row)
         }
 
     @validate(load_schema('ipaddress_schema'))
     def on_post(self, req, resp):
-        model = models.IPAddress(
-            ip=req.media.get('ipaddress'),
-            city=req.media.get('city'),
-            time_zone=req.media.get('time_zone'),
-            area_code=req.media.get('area-code'),
-            metro_code=req.media.get('metro_code'),
-            dma_code=req.media.get('dma_code'),
-            postal_code=req.media.get('postal_code'),
-            region=req.media.get('region'),
-            region_name=req.media.get('region_name'),
-            latitude=-req.media.get('latitude'),
-            longitude=req.media.get('longitude')
-        )
+        try:
+            model = models.IPAddress(**ipaddress_fields(req.media))
+        except ValueError as err:
+            raise falcon.HTTPBadRequest(
+                'Invalid IP Address',
+                'Error: {}'.format(str(err))
+            )
 
         try:
             model.save(self.db.session)
@@ -45,7 +109,20 @@ class IPAddressResource(BaseResource):
                 'Error: {}'.format(str(err))
             )
 
+        self.invalidate()
+
         resp.status = falcon.HTTP_201
         resp.media = {
             'id': model.id
         }
+
+
+class IPAddressBulkResource(BulkResource):
+    """
+    Bulk load IPAddresses from NDJSON
+    :return report
+    """
+    cache_namespace = 'ipaddress'
+    model = models.IPAddress
+    schema = load_schema('ipaddress_schema')
+    to_row = staticmethod(ipaddress_row)
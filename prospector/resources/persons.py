@@ -2,38 +2,60 @@ import falcon
 from falcon.media.validators.jsonschema import validate
 from sqlalchemy.exc import IntegrityError
 from prospector.db import models
-from prospector.resources import BaseResource
+from prospector.resources import BaseResource, parse_date
+from prospector.resources.bulk import BulkResource
 from prospector.schemas import load_schema
 
 
+def person_fields(record):
+    """
+    Person fields of a request record
+    :param record: dict validated against person_schema
+    :return: dict
+    """
+    return {
+        'ipaddress_id': record.get('ipaddress_id'),
+        'created_date': parse_date(record.get('created_date')),
+        'first_name': record.get('first_name'),
+        'last_name': record.get('last_name'),
+        'email': record.get('email'),
+        'cell_phone': record.get('cell_phone'),
+        'address1': record.get('address1'),
+        'address2': record.get('address2'),
+        'city': record.get('city'),
+        'state': record.get('state'),
+        'zip_code': record.get('zip_code')
+    }
+
+
 class PersonResource(BaseResource):
     """
     The Person Resource
     :return person
     """
+    cache_namespace = 'person'
+
+    def on_get(self, req, resp, person_id=None):
+        if person_id is None:
+            self.list_models(req, resp, models.Person, key='person')
+            return
+
+        try:
+            row = models.Person.get_person_row(int(person_id), self.db.session)
+        except ValueError:
+            raise falcon.HTTPNotFound()
 
-    def on_get(self, req, resp):
-        person = models.Person.get_person_list(self.db.sdession)
-        person = person.as_dict()
+        if row is None:
+            raise falcon.HTTPNotFound()
 
         resp.status = falcon.HTTP_200
         resp.media = {
-            'person': person
+            'person': models.Person.serializer().to_dict(row)
         }
 
     @validate(load_schema('person_schema'))
     def on_post(self, req, resp):
-        model = models.Person(
-            first_name=req.media.get('first-name'),
-            last_name=req.media.get('last-name'),
-            email=req.media.get('email'),
-            cell_phone=req.media.get('cell-phone'),
-            address1=req.media.get('address1'),
-            address2=req.media.get('address2'),
-            city=req.media.get('city'),
-            state=req.media.get('state'),
-            zip_code=req.media.get('zip_code')
-        )
+        model = models.Person(**person_fields(req.media))
 
         try:
             model.save(self.db.session)
@@ -43,7 +65,20 @@ class PersonResource(BaseResource):
                 'Error: {}'.format(str(err))
             )
 
+        self.invalidate()
+
         resp.status = falcon.HTTP_201
         resp.media = {
             'id': model.id
         }
+
+
+class PersonBulkResource(BulkResource):
+    """
+    Bulk load Persons from NDJSON
+    :return report
+    """
+    cache_namespace = 'person'
+    model = models.Person
+    schema = load_schema('person_schema')
+    to_row = staticmethod(person_fields)
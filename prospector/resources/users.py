@@ -13,12 +13,11 @@ class UserResource(BaseResource):
     """
 
     def on_get(self, req, resp):
-        user = models.User.get_user_list(self.db.sdession)
-        user = user.as_dict()
+        users = models.User.get_user_list(self.db.session)
 
         resp.status = falcon.HTTP_200
         resp.media = {
-            'user': user
+            'user': models.User.serializer().to_dicts(users)
         }
 
     @validate(load_schema('user_schema'))
@@ -0,0 +1,111 @@
+import json
+import operator
+from datetime import date, datetime, time
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_LIBRARIES = ('auto', 'orjson', 'json')
+
+
+def to_json(value):
+    """
+    JSON encoding of the types our models return beyond the JSON natives
+    Dates and times become ISO 8601 strings, decimals become numbers
+    :param value: object
+    :return: JSON serializable value
+    """
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+
+    if isinstance(value, Decimal):
+        return float(value)
+
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+
+    raise TypeError('{} is not JSON serializable'.format(type(value).__name__))
+
+
+def json_functions(library='auto'):
+    """
+    dumps and loads of a JSON library, both produce or accept bytes
+    :param library: auto, orjson or json, auto picks orjson when installed
+    :return: tuple: (dumps, loads)
+    """
+    if library not in JSON_LIBRARIES:
+        raise ValueError('Unknown JSON library {}, use one of {}'.format(library, ', '.join(JSON_LIBRARIES)))
+
+    if library == 'orjson' or (library == 'auto' and orjson is not None):
+        if orjson is None:
+            raise ValueError('orjson is not installed')
+
+        return lambda obj: orjson.dumps(obj, default=to_json), orjson.loads
+
+    encoder = json.JSONEncoder(default=to_json, ensure_ascii=False, separators=(',', ':'))
+    return lambda obj: encoder.encode(obj).encode('utf-8'), json.loads
+
+
+dumps, loads = json_functions()
+
+
+class Serializer(object):
+    """
+    Precompiled serializer of one model
+    Fields are read with a single item or attrgetter, so ORM models and Core
+    result rows serialize the same way
+    :param fields: sequence of (output key, attribute name)
+    """
+
+    def __init__(self, fields):
+        self.keys = tuple(key for key, attr in fields)
+        attrs = [attr for key, attr in fields]
+        attr_getter = operator.attrgetter(*attrs)
+        item_getter = operator.itemgetter(*attrs)
+
+        if len(attrs) == 1:
+            attr_getter = (lambda get: lambda obj: (get(obj),))(attr_getter)
+            item_getter = (lambda get: lambda obj: (get(obj),))(item_getter)
+
+        def values(obj):
+            # loaded ORM columns sit in the instance dict, skip the descriptors
+            state = getattr(obj, '__dict__', None)
+
+            if state is not None:
+                try:
+                    return item_getter(state)
+                except KeyError:
+                    pass
+
+            return attr_getter(obj)
+
+        self.values = values
+
+    def to_dict(self, obj):
+        return dict(zip(self.keys, self.values(obj)))
+
+    def to_dicts(self, objs):
+        keys = self.keys
+        values = self.values
+        return [dict(zip(keys, values(obj))) for obj in objs]
+
+    def dumps(self, obj):
+        return dumps(self.to_dict(obj))
+
+    def dumps_many(self, objs):
+        return dumps(self.to_dicts(objs))
+
+    def ndjson(self, objs):
+        """
+        One JSON document per line, serialized as the rows come in
+        :param objs: iterable of models or rows
+        :return: generator of bytes
+        """
+        keys = self.keys
+        values = self.values
+
+        for obj in objs:
+            yield dumps(dict(zip(keys, values(obj)))) + b'\n'
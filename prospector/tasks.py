@@ -1,23 +1,23 @@
-import aumbry
 import celery
-import re
 import requests
 import time
 from datetime import datetime
 from prospector.db.models import IPAddress, Person, Address, ZipCode
 from prospector.db.manager import DBManager
-import GeoIP
-import reverse_geocoder as rg
+from prospector.cache import build_lookup_cache
+from prospector.db.timing import instrument_engine
+from prospector.instrumentation import TaskStats, connect_signals
+from prospector.db.lookups import TableSignature, ZipCentroidIndex, ZipCodeIndex
+from prospector.geo import GeoIPCache, LazyGeoIP
+from prospector.client import HTTPClient
+from prospector.normalize import normalize_region
+from prospector.parsers import parse_owner_records, parse_result_table
+from celery import signals
 from celery.schedules import crontab
 from celery.utils.log import get_task_logger
-from prospector.config import AppConfig
+from prospector.config import load_config
 from sqlalchemy import exc
 from random import randint
-from bs4 import BeautifulSoup
-
-# database config
-cfg = aumbry.load(aumbry.FILE, AppConfig, {'CONFIG_FILE_PATH': '../config/config.yaml'})
-mgr = DBManager(cfg.db.connection)
 
 app = celery.Celery(
     'tasks',
@@ -28,8 +28,101 @@ app = celery.Celery(
 # logger
 logger = get_task_logger(__name__)
 
-# open the geo data file once and store it in cache memory
-gi = GeoIP.open('/var/lib/geoip/GeoLiteCity.dat', GeoIP.GEOIP_INDEX_CACHE | GeoIP.GEOIP_CHECK_CACHE)
+
+class lazy(object):
+    """
+    Build an attribute on first access and keep it on the instance
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+
+        value = obj.__dict__[self.func.__name__] = self.func(obj)
+        return value
+
+
+class TaskResources(object):
+    """
+    Config, database, GeoIP and HTTP resources of a task process
+    Nothing is opened at import time, every resource is built on first use
+    and dropped again in each forked worker process
+    """
+
+    @lazy
+    def cfg(self):
+        return load_config()
+
+    @lazy
+    def mgr(self):
+        mgr = DBManager.from_config(self.cfg.db)
+        instrument_engine(mgr.engine)
+        return mgr
+
+    @lazy
+    def task_stats(self):
+        return TaskStats.from_url(self.cfg.tasks.stats_redis_url)
+
+    @lazy
+    def zip_index(self):
+        # worker-local zip code index, reloaded when the zipcodes table changes
+        return ZipCodeIndex()
+
+    @lazy
+    def zip_signature(self):
+        # keys cached zip code lookups, so a table change is seen without loading the index
+        return TableSignature()
+
+    @lazy
+    def zip_centroids(self):
+        # worker-local nearest zip code by coordinates, for addresses without city and region
+        return ZipCentroidIndex(max_distance_km=self.cfg.tasks.zipcode_max_distance_km)
+
+    @lazy
+    def lookups(self):
+        # GeoIP, reverse geocode and zip code lookups, shared by every worker when lookup_cache_url is set
+        return build_lookup_cache(self.cfg.tasks)
+
+    @lazy
+    def geo_cache(self):
+        # memoize lookups, our traffic repeats the same IPs heavily
+        return GeoIPCache(LazyGeoIP(), lookups=self.lookups)
+
+    @lazy
+    def http_client(self):
+        # shared pooled client for the property owner lookups
+        return HTTPClient(
+            timeout=(3.05, self.cfg.tasks.http_timeout),
+            retries=self.cfg.tasks.http_retries,
+            rate_limit=self.cfg.tasks.http_rate_limit,
+            workers=self.cfg.tasks.http_workers,
+            headers={'user-agent': 'SimplePythonFoo()', 'content-type': 'text/html'}
+        )
+
+    def reset(self):
+        mgr = self.__dict__.get('mgr')
+        if mgr is not None:
+            # leave the parent's connections alone, the engine is rebuilt on next use
+            mgr.after_fork()
+
+        self.__dict__.clear()
+
+
+res = TaskResources()
+
+# queue wait, runtime and DB time per task, summarized by prospector.instrumentation
+connect_signals(lambda: res.task_stats)
+
+
+@signals.worker_process_init.connect
+def reset_resources(**kwargs):
+    # never share the parent's connections with a forked worker
+    res.reset()
+
 
 # celery beat
 app.conf.beat_schedule = {
@@ -45,39 +138,61 @@ app.conf.beat_schedule = {
 
 
 def get_location(ip_addr):
-    gi_lookup = gi.record_by_addr(ip_addr)
+    gi_lookup = res.geo_cache.lookup(ip_addr)
     return gi_lookup
 
 
 def reverse_geo_code(coordinates):
     """
     Reverse GeoCode from Coordinates
-    :param coordinates: int: x, int y
+    :param coordinates: tuple: (lat, lon) or a list of them for a batch lookup
     :return: location
     """
+    import reverse_geocoder as rg
     location = rg.search(coordinates, mode=1)
     return location
 
 
-def parse_address_loopkup(doc):
+def cached_reverse_geo_code(coordinates):
     """
-    Return a soupified data object from web scrape
-    :param doc:
-    :return: data
+    Reverse GeoCode a list of coordinates through the lookup cache
+    Coordinates are rounded to 5 decimals, about a meter, and geocoded as rounded
+    :param coordinates: list of (lat, lon)
+    :return: list of locations
     """
+    points = [(round(float(lat), 5), round(float(lon), 5)) for lat, lon in coordinates]
+    return res.lookups.get_many('reverse_geocode', points, reverse_geo_code)
 
-    pattern = re.compile(r'\s+')
-    soup = BeautifulSoup(doc, 'html.parser')
-    data = []
-    table = soup.find('table', attrs={'class': 'Tableresultborder'})
-    rows = table.find_all('tr')
 
-    for row in rows:
-        cols = row.find_all('td')
-        cols = [ele.text.strip() for ele in cols]
-        data.append([ele for ele in cols if cols])
+def lookup_zipcodes(places):
+    """
+    Zip codes of (city, region) pairs through the lookup cache
+    Keys carry the zipcodes table signature, a changed table starts over
+    with new keys. The zip index is only loaded when a pair misses the cache
+    :param places: list of (city, region)
+    :return: list of postal codes or None
+    """
+    signature = res.zip_signature.get(res.mgr.session)
 
-    return data
+    def compute(keys):
+        if res.zip_index.signature != signature:
+            res.zip_index.load(res.mgr.session)
+        return [res.zip_index.lookup(city, region) for city, region in keys]
+
+    return res.lookups.get_many(
+        'zipcode:{}:{}'.format(*signature),
+        [(city.strip().lower(), normalize_region(region)) for city, region in places],
+        compute
+    )
+
+
+def parse_address_loopkup(doc):
+    """
+    Return the result table rows from web scrape
+    :param doc:
+    :return: data
+    """
+    return parse_result_table(doc)
 
 
 @app.task
@@ -87,31 +202,82 @@ def coordinates_to_address(addr_pk_id):
     :param addr_pk_id:
     :return: addr_pk_id
     """
-    rec = Address.get_addr(addr_pk_id, mgr.session)
+    rec = Address.get_addr(addr_pk_id, res.mgr.session)
+    fields = (rec.city, rec.district, rec.region)
+
+    # check the existing fields before paying for the lookup
+    if all(fields):
+        logger.info('Data exists for record {}.  Skipping...'.format(str(addr_pk_id)))
+        return addr_pk_id
+
+    # processed is the zip code flag, the zip code task may still resolve it by city
+    if rec.lat is None or rec.lon is None:
+        logger.info('Address record {} has no coordinates.  Skipping...'.format(str(addr_pk_id)))
+        return addr_pk_id
+
     coordinates = (rec.lat, rec.lon)
-    location = reverse_geo_code(coordinates)
+    location = cached_reverse_geo_code([coordinates])
 
     if location is not None:
         state = location[0]['admin1']
         city = location[0]['name']
         county = location[0]['admin2']
-        country = location[0]['cc']
-        fields = (rec.city, rec.district, rec.region)
 
-        if all(fields):
-            logger.info('Data exists for record {}.  Skipping...'.format(str(addr_pk_id)))
-        else:
-            rec.city = city
-            rec.district = county
-            rec.region = state
-            rec.save(mgr.session)
-            logger.info('Address record {} was updated with City: {}, State: {} and County: {}'.format(
-                addr_pk_id, city, state, county
-            ))
+        rec.city = city
+        rec.district = county
+        rec.region = state
+        rec.save(res.mgr.session)
+        logger.info('Address record {} was updated with City: {}, State: {} and County: {}'.format(
+            addr_pk_id, city, state, county
+        ))
 
     return addr_pk_id
 
 
+@app.task
+def coordinates_to_addresses(addr_pk_ids):
+    """
+    Reverse geocode a chunk of addresses with a single rg.search call
+    Rows with city, district and region already filled are never geocoded
+    :param addr_pk_ids: list
+    :return: int: rows updated
+    """
+
+    started = time.time()
+
+    try:
+        # rows without coordinates are left out, untouched
+        addr_list = Address.get_geocode_chunk(addr_pk_ids, res.mgr.session)
+
+        if not addr_list:
+            logger.info('Nothing to geocode in {} records.  Skipping...'.format(str(len(addr_pk_ids))))
+            return 0
+
+        coordinates = [(addr.lat, addr.lon) for addr in addr_list]
+        locations = cached_reverse_geo_code(coordinates)
+
+        Address.set_locations([
+            {
+                'addr_pk_id': addr.id,
+                'city': location['name'],
+                'district': location['admin2'],
+                'region': location['admin1']
+            }
+            for addr, location in zip(addr_list, locations)
+        ], res.mgr.session)
+
+    except exc.SQLAlchemyError as db_err:
+        logger.critical('Could not update geocode chunk: {}'.format(str(db_err)))
+        return 0
+
+    elapsed = time.time() - started
+    logger.info('Reverse geocoded {} of {} addresses in {:.3f}s ({:.0f} rows/sec)'.format(
+        len(addr_list), len(addr_pk_ids), elapsed, len(addr_list) / elapsed if elapsed else 0
+    ))
+
+    return len(addr_list)
+
+
 @app.task
 def update_zipcode(addr_pk_id):
     """
@@ -121,7 +287,7 @@ def update_zipcode(addr_pk_id):
     """
 
     try:
-        addr = Address.get_addr(addr_pk_id, mgr.session)
+        addr = Address.get_addr(addr_pk_id, res.mgr.session)
 
         if addr:
             addr_fields = (addr.city, addr.region, addr.postcode)
@@ -129,8 +295,8 @@ def update_zipcode(addr_pk_id):
             # check the existing address fields
             if all(addr_fields):
                 try:
-                    addr.processed = 1
-                    addr.save(mgr.session)
+                    addr.mark_processed()
+                    addr.save(res.mgr.session)
                     logger.info('All address data exists for Addr: {}, skipping...'.format(str(addr_pk_id)))
 
                 except exc.SQLAlchemyError as db_err:
@@ -139,21 +305,27 @@ def update_zipcode(addr_pk_id):
             # address fields missing, query the zip code database for matching data
             else:
                 try:
-                    data = ZipCode.query_for_code(addr.city, addr.region, mgr.session)
+                    postal_code = lookup_zipcodes([(addr.city, addr.region)])[0] if addr.city and addr.region else None
+                    confidence = None
+
+                    if not postal_code:
+                        res.zip_centroids.refresh(res.mgr.session)
+                        postal_code, confidence = res.zip_centroids.assign([addr]).get(addr.id, (None, None))
 
-                    if data:
+                    if postal_code:
                         try:
-                            addr.postcode = data.postal_code
-                            addr.processed = 1
-                            addr.save(mgr.session)
-                            logger.info('Addr ID: {} updated with zip code: {}'.format(str(addr.id), str(data.postal_code)))
+                            addr.postcode = postal_code
+                            addr.postcode_confidence = confidence
+                            addr.mark_processed()
+                            addr.save(res.mgr.session)
+                            logger.info('Addr ID: {} updated with zip code: {}'.format(str(addr.id), str(postal_code)))
 
                         except exc.SQLAlchemyError as db_err:
                             logger.critical('Could not save record: {}'.format(str(db_err)))
 
                     else:
-                        addr.processed = 1
-                        addr.save(mgr.session)
+                        addr.mark_processed()
+                        addr.save(res.mgr.session)
                         logger.info('Address zip code not found for: {}.  Marking Processed'.format(str(addr.id)))
 
                 except exc.SQLAlchemyError as db_err:
@@ -169,6 +341,86 @@ def update_zipcode(addr_pk_id):
     return addr_pk_id
 
 
+@app.task
+def update_zipcodes(addr_pk_ids):
+    """
+    Take a chunk of addresses, resolve their zip codes from the zip index
+    and write postcodes and processed flags back in a single UPDATE
+    Addresses the city and region can't resolve get the nearest zip code
+    centroid to their coordinates, all of them in one KD-tree query
+    :param addr_pk_ids: list
+    :return: int: rows processed
+    """
+
+    started = time.time()
+
+    try:
+        addr_list = Address.get_addr_chunk(addr_pk_ids, res.mgr.session)
+        pending = [addr for addr in addr_list if not addr.postcode]
+        named = [addr for addr in pending if addr.city and addr.region]
+        codes = dict(zip((addr.id for addr in named), lookup_zipcodes([(addr.city, addr.region) for addr in named])))
+
+        postcodes = {}
+        unresolved = []
+        for addr in pending:
+            code = codes.get(addr.id)
+            if code:
+                postcodes[addr.id] = code
+            else:
+                unresolved.append(addr)
+
+        confidences = {}
+        if unresolved:
+            res.zip_centroids.refresh(res.mgr.session)
+            for addr_pk_id, (code, confidence) in res.zip_centroids.assign(unresolved).items():
+                postcodes[addr_pk_id] = code
+                confidences[addr_pk_id] = confidence
+
+        Address.set_postcodes(postcodes, [addr.id for addr in addr_list], res.mgr.session, confidences)
+
+    except exc.SQLAlchemyError as db_err:
+        logger.critical('Could not update zip code chunk: {}'.format(str(db_err)))
+        return 0
+
+    elapsed = time.time() - started
+    logger.info('Zip code chunk of {} addresses, {} zip codes ({} by location) in {:.3f}s ({:.0f}/sec)'.format(
+        len(addr_list), len(postcodes), len(confidences), elapsed, len(addr_list) / elapsed if elapsed else 0
+    ))
+
+    return len(addr_list)
+
+
+def property_owner_request(addr):
+    """
+    Address check lookup request for an address
+    :param addr: Address
+    :return: dict: HTTPClient.get() arguments
+    """
+    return {
+        'url': res.cfg.tasks.owner_lookup_url,
+        'params': [
+            ('LuAd', 'Listware Online'), ('email', ''), ('exprbox', ''), ('suites', ''),
+            ('address', ''), ('address2', ''), ('city', ''), ('state', ''), ('zip', ''),
+            ('dragbox', '{} {} {} {} {}'.format(addr.number, addr.street, addr.city,
+                                                addr.region, addr.postcode))
+        ]
+    }
+
+
+def handle_property_owner(addr_pk_id, r):
+    if isinstance(r, requests.RequestException):
+        logger.info('API Call returned an error: {}'.format(str(r)))
+
+    elif r.status_code == 200:
+        owners = parse_owner_records(r.content)
+        logger.info('Address check for Addr: {} returned {} owner records: {}'.format(
+            str(addr_pk_id), len(owners), owners
+        ))
+
+    else:
+        logger.info('Data scraping call returned status code: {}'.format(str(r.status_code)))
+
+
 @app.task
 def get_property_owner(addr_pk_id):
     """
@@ -177,48 +429,77 @@ def get_property_owner(addr_pk_id):
     :return: none
     """
 
-    addr = Address.get_addr(addr_pk_id, mgr.session)
-    api_method = 'GET'
-    hdr = {'user-agent': 'SimplePythonFoo()', 'content-type': 'text/html'}
-    m_url = 'https://www.melissa.com/lookups/addresscheck.asp?LuAd=Listware+Online&email=&exprbox=&suites=&address=&' \
-            'address2=&city=&state=&zip=&dragbox={}+{}+{}+{}+{}'.format(addr.number, addr.street, addr.city,
-                                                                        addr.region, addr.postcode)
+    addr = Address.get_addr(addr_pk_id, res.mgr.session)
 
     try:
-        r = requests.request(api_method, m_url, headers=hdr)
-
-        if r.status_code == 200:
-            html_doc = r.content
-            # data = parse_address_loopkup(html_doc)
-            print(html_doc)
+        r = res.http_client.get(**property_owner_request(addr))
+    except requests.RequestException as http_err:
+        r = http_err
 
-        else:
-            logger.info('Data scraping call returned status code: {}'.format(str(r.status_code)))
-
-    except requests.HTTPError as http_err:
-        logger.info('API Call returned an error: {}'.format(str(http_err)))
+    handle_property_owner(addr_pk_id, r)
 
     # return the addr_pk_id
     return addr_pk_id
 
 
+@app.task
+def get_property_owners(addr_pk_ids):
+    """
+    Retrieve the property owners for a chunk of addresses concurrently,
+    rate limited per host by the shared client
+    :param addr_pk_ids: list
+    :return: int: lookups made
+    """
+
+    started = time.time()
+    addr_list = Address.get_addrs(addr_pk_ids, res.mgr.session)
+    responses = res.http_client.get_many([property_owner_request(addr) for addr in addr_list])
+
+    for addr, r in zip(addr_list, responses):
+        handle_property_owner(addr.id, r)
+
+    elapsed = time.time() - started
+    logger.info('Property owner lookups for {} addresses in {:.3f}s'.format(len(addr_list), elapsed))
+
+    return len(addr_list)
+
+
 @app.task
 def get_addr_for_update():
     """
-    Get the records with incomplete addresses
-    :param addr_pk_id:
-    :return: none
+    Claim the records with incomplete addresses and queue them in chunks
+    :return: int: addresses queued
     """
 
-    addr_list = Address.get_update_list(mgr.session)
+    addr_pk_ids = Address.claim_update_list(res.mgr.session, res.cfg.tasks.claim_lease_seconds)
+    chunk_size = res.cfg.tasks.zipcode_chunk_size
     counter = 0
 
-    for addr in addr_list:
-        update_zipcode.delay(addr.id)
+    for i in range(0, len(addr_pk_ids), chunk_size):
+        update_zipcodes.delay(addr_pk_ids[i:i + chunk_size])
         counter += 1
 
-    logger.info('Air dropped {} into the update queue'.format(str(counter)))
-    return counter
+    logger.info('Air dropped {} addresses in {} chunks into the update queue'.format(
+        str(len(addr_pk_ids)), str(counter)
+    ))
+    return len(addr_pk_ids)
+
+
+@app.task
+def get_ip_for_geo_locate(ip_addr):
+    """
+    GeoIP locate an IP address, or a list of them in one batch
+    :param ip_addr: str or list
+    :return: location or list of locations in input order
+    """
+
+    if isinstance(ip_addr, (list, tuple)):
+        locations = res.geo_cache.lookup_many(ip_addr)
+    else:
+        locations = get_location(ip_addr)
+
+    logger.info('GeoIP cache stats: {}'.format(res.geo_cache.stats))
+    return locations
 
 
 @app.task
@@ -19,19 +19,26 @@ setup(
         'Programming Language :: Python :: 3.4'
     ],
     keywords='falcon api celery',
-    packages=find_packages(exclude=['contrib', 'docs', 'test']),
+    packages=find_packages(exclude=['contrib', 'docs', 'test', 'benchmarks']),
     install_requires=[
-        'falcon>=1.4.1',
+        'falcon>=3.0.0',
         'gunicorn>=19.9.0',
         'celery>=4.2.1',
-        'redis>=3.0.1'
+        'redis>=3.0.1',
         'docopt>=0.6.2',
         'jsonschema>=2.5.1',
         'mysql-connector>=2.1.6',
-        'sqlalchemy>=1.2.16',
+        'sqlalchemy>=1.4',
         'aumbry[yaml]>=0.7.0',
-        'reverse_geocoder>=1.5.1'
+        'reverse_geocoder>=1.5.1',
+        'numpy>=1.11.0',
+        'scipy>=0.17.0',
+        'prometheus_client>=0.5.0'
     ],
+    extras_require={
+        'async': ['uvicorn>=0.15.0'],
+        'fast': ['orjson>=3.0.0']
+    },
     package_data={},
     data_files=[],
     entry_points={